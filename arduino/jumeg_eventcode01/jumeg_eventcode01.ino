@@ -11,8 +11,19 @@
  * update 05.12.2017 
  * add button for sending startcode manually
  * --- v1.02 23.02.2018
- * update 23.02.2018 
+ * update 23.02.2018
  * bug fixes
+ * --- v1.03 10.2026
+ * vendor id: read complete 7 byte frame, no delay after reply
+ * send DEVICE_READY (0x11) at end of setup
+ * switch off with ack flag: 112,1,0,0,0,0,0 -> reply ACK (0x06)
+ * seq: reset duration before reading a new seq
+ * seq stream: unlimited sequences, double buffered chunks with credit flow control
+ * schedule: whole block uploaded once, played against micros()
+ * clock ping with micros() reply, optional edge ack with micros() of every TTL change
+ * switch on at device time: 218, fired in Timer5 IRQ
+ * protocol v2: sync, length, CRC, resync after a corrupted frame, negotiated with 219
+ * baudrate negotiation: 220 trial / confirm, 221 burst test echo, fall back without confirm
  *---------------------------------------------
  * TTL Output 16bit
  * 4D MEG system first  8bit labeld as eventcode 0-255
@@ -44,6 +55,10 @@
   switch-off eventcode
   -> send command via usb programmer port: 112,0
      will switch off TTL eventcode set to zero
+  -> 112,1,0,0,0,0,0 switch off and reply ACK (0x06) e.g. before closing the port
+
+  ready:
+  -> after reset (setup done) the arduino sends DEVICE_READY (0x11)
 
   sending sequence of event [1,2,4] and trigger codes [5,6,7] for 1024ms each
      211,12,0,3,0,0,1,0,2,0,4,0,0,5,0,6,0,7
@@ -51,6 +66,48 @@
      12: number of bytes
      last 4 bytes duration in ms
 
+  streaming a sequence of unlimited length, duration 10 ms each code
+     212,0,0,10,0,0,0                 start stream, 4 bytes duration in ms
+     213,n,last,0,0,0,0,data[n]       chunk of n bytes (max 64): eventcode,triggercode,...
+                                      last=1 for the final chunk
+     two chunk buffers: the host starts with 2 credits, the arduino replies
+     SEQ_CREDIT (0x12) for each played chunk, SEQ_UNDERRUN (0x14) if it has to wait
+     for a chunk and SEQ_DONE (0x04) after the last code
+
+  schedule of a whole block, entries: onset_ms u32,eventcode u8,triggercode u8,duration_ms u16
+     214,n0,n1,k0,k1,k2,k3,entries[n] upload n entries (max 384) 8 bytes each at index k -> reply ACK (0x06)
+                                      k=0 starts a new schedule, k>0 adds entries (v2 uploads in chunks)
+     215,0,0,dt0,dt1,dt2,dt3          start playback after delay dt in ms
+                                      reply SCHEDULE_DONE (0x13) after the last code
+     onsets are relative to the start, max 71 min (micros() overflow)
+
+  clock sync and edge timestamps
+     216,id,0,0,0,0,0                 ping -> reply PONG: 0x16,id,micros b0..b3
+     217,1,0,0,0,0,0                  enable edge ack (217,0,... disable)
+                                      reply EDGE for every change of the TTL output:
+                                      0x17,eventcode,triggercode,micros b0..b3
+
+  switch on at device time T (micros()), duration 200 ms
+     218,255,0,200,0,0,0,T0,T1,T2,T3  11 bytes, fired at the first Timer5 tick >= T
+                                      one pending code, a new 218 replaces it, 112 cancels it
+
+  protocol v2, negotiated by the host with a v1 frame
+     219,2,0,0,0,0,0                  -> reply ACK, all following frames are v2 frames
+     v2 frame: 0xA5,0x5A,len0,len1,crc8(len),body[len],crc0,crc1
+       body  : a v1 frame incl. payload e.g. 111,255,1,0,4,0,0 (max 129 bytes)
+       crc8  : _crc8_ccitt_update over len0,len1; crc: _crc_xmodem_update over body
+     header or CRC error -> frame dropped, reply NAK (0x15), parser hunts for the next sync
+     missing bytes       -> frame dropped after the inter-byte timeout, reply NAK
+     219,1,... in a v2 frame or 7 x 123 (vendor id) -> back to v1
+
+  baudrate negotiation, the host tries the fastest rate first
+     220,0,0,b0,b1,b2,b3              trial: reply ACK at the old rate, switch to baudrate b0..b3
+                                      NAK if the UBRR rounding error of the rate is > BAUD_MAX_ERROR_PERMILLE
+                                      no confirm within BAUD_TRIAL_MS -> back to the old rate
+     221,n,0,0,0,0,0,data[n]          burst test at the trial rate -> reply BAUD_ECHO (0x18),data[n]
+     220,1,0,b0,b1,b2,b3              confirm the trial rate -> reply ACK at the new rate
+     220,2,0,b0,b1,b2,b3              switch without trial e.g. back to BAUDRATE before close
+
   checking for vendor id for getting the correct arduino connection:
   e.g /dev/ttyACM[0...N]???
      123,123,123,123,123,123,123,0
@@ -63,10 +120,23 @@ char data_buffer[122] = {};
 
 #include <TimerFive.h>
 #include <DirectIO.h>
+#include <util/crc16.h>
 
 #define BAUDRATE 115200
 #define TIMER5_INTERVALL_US 200
 #define SEQ_MAX_DATA_COUNTS 122
+#define SEQ_CHUNK_BYTES 64 // stream chunk: 32 codes (eventcode,triggercode)
+#define SCHEDULE_MAX_ENTRIES 384 // 3 kB SRAM
+
+#define PROTOCOL_SYNC0 0xA5
+#define PROTOCOL_SYNC1 0x5A
+#define V2_MAX_BODY (7 + SEQ_MAX_DATA_COUNTS) // 211 seq is the longest body
+#define V2_BYTE_TIMEOUT_US 2000               // drop an incomplete v2 frame
+
+#define BAUD_MIN 9600
+#define BAUD_MAX 2000000
+#define BAUD_MAX_ERROR_PERMILLE 25 // 115200 @ 16 MHz: 2.1 %
+#define BAUD_TRIAL_MS 500
 
 #define START_CODE 128
 #define START_CODE_DURATION_MS 200;
@@ -104,10 +174,71 @@ static const uint8_t eventcode_switch_on  = 111;
 static const uint8_t eventcode_switch_off = 112;
 static const uint8_t eventcode_vendor_id  = 123;
 static const uint8_t eventcode_seq        = 211;
+static const uint8_t eventcode_seq_stream = 212;
+static const uint8_t eventcode_seq_chunk  = 213;
+static const uint8_t schedule_load        = 214;
+static const uint8_t schedule_start       = 215;
+static const uint8_t clock_ping           = 216;
+static const uint8_t edge_ack             = 217;
+static const uint8_t eventcode_switch_on_at = 218;
+static const uint8_t protocol             = 219;
+static const uint8_t baudrate             = 220;
+static const uint8_t baud_test            = 221;
 };
 
 static const CMD_KEYS CmdKeys;
 
+//--- single byte replies
+struct REPLY_KEYS{
+static const uint8_t device_ready = 0x11; // DC1
+static const uint8_t ack          = 0x06;
+static const uint8_t seq_credit   = 0x12; // DC2 chunk buffer is free
+static const uint8_t seq_underrun = 0x14; // DC4 stream waits for a chunk
+static const uint8_t seq_done     = 0x04; // EOT last stream code done
+static const uint8_t schedule_done= 0x13; // DC3 last schedule code done
+static const uint8_t pong         = 0x16; // SYN packet: pong,id,micros
+static const uint8_t edge         = 0x17; // ETB packet: edge,eventcode,triggercode,micros
+static const uint8_t nak          = 0x15; // NAK v2 frame dropped, baudrate not supported
+static const uint8_t baud_echo    = 0x18; // CAN packet: baud_echo,data[n] burst test
+};
+
+static const REPLY_KEYS ReplyKeys;
+
+//-------------------------------------------------------
+// edge log: micros() of each TTL change, send from loop
+// log_edge is called from Timer5 IRQ and from check_serialEvent
+//-------------------------------------------------------
+#define EDGE_LOG_SIZE 16
+
+struct EdgeEntry{
+  uint8_t  eventcode;
+  uint8_t  triggercode;
+  uint32_t t;
+};
+
+volatile EdgeEntry edge_log[EDGE_LOG_SIZE];
+volatile uint8_t   edge_head = 0;
+volatile uint8_t   edge_tail = 0;
+bool               edge_ack  = false;
+volatile uint16_t  edge_last = 0;
+
+void log_edge(uint8_t ec,uint8_t tr){
+     if ( !edge_ack ){ return; }
+     uint8_t sreg = SREG;
+     cli();
+     uint16_t code = ec | ( (uint16_t) tr << 8 );
+     uint8_t  next = ( edge_head + 1 ) % EDGE_LOG_SIZE;
+     if ( ( code != edge_last ) && ( next != edge_tail ) ) // full: drop
+        {
+         edge_log[edge_head].eventcode   = ec;
+         edge_log[edge_head].triggercode = tr;
+         edge_log[edge_head].t           = micros();
+         edge_head = next;
+         edge_last = code;
+        }
+     SREG = sreg;
+}
+
 //-------------------------------------------------------
 // EventCode Class
 //-------------------------------------------------------
@@ -151,6 +282,7 @@ class EventCode{
         
        _portEVENT_CODE   = eventcode;   // set eventcode bit0-7
        _portTRIGGER_CODE = triggercode; // set trigger code/bits
+       log_edge(eventcode,triggercode);
        
        _time_end    = (unsigned long) micros() + duration * 1000;
        isOn         = true;
@@ -170,6 +302,7 @@ class EventCode{
   void SwitchOff(){
      _portEVENT_CODE   = clear_code ;  // set eventcode bit0-7
      _portTRIGGER_CODE = clear_code ;  // set trigger code/bits
+     log_edge(0,0);
      _time_end         = 0;
      isOn              = false; 
      digitalWrite(PIN_STATUS,LOW);
@@ -226,6 +359,7 @@ public:
            _portEVENT_CODE   = data[data_index];   // set eventcode bit0-7
            data_index++;
            _portTRIGGER_CODE = data[data_index];  // set trigger code/bits
+           log_edge(data[data_index-1],data[data_index]);
            _time_end    = (unsigned long) micros() + duration * 1000;
            isOn         = true;
            digitalWrite(PIN_STATUS,HIGH);
@@ -248,6 +382,7 @@ public:
   void Reset(){
      _portEVENT_CODE   = clear_code ;  // set eventcode bit0-7
      _portTRIGGER_CODE = clear_code ;  // set trigger code/bits
+     log_edge(0,0);
      _time_end         = 0;
      isOn              = false; 
      data_counts       = 0;
@@ -259,13 +394,251 @@ public:
 };// end of EventCodeSeq cls
 
 
+//-------------------------------------------------------
+// EventCodeStream Class
+// sequence of unlimited length in two chunk buffers
+// a played buffer is returned to the host as credit
+//-------------------------------------------------------
+class EventCodeStream{
+
+   volatile unsigned long  _time_end;   // end time of eventcode 
+  
+//--- init DirectIO Event Ccode ports C; 
+   OutputPort<PORT_C> _portEVENT_CODE; 
+//--- init DirectIO Trigger Code ports A;
+   OutputPort<PORT_A> _portTRIGGER_CODE;
+
+public:
+  unsigned long duration;         // duration of each code
+  unsigned long default_duration; 
+  
+  char             data[2][SEQ_CHUNK_BYTES];
+  volatile uint8_t data_counts[2]; // bytes in buffer, 0 -> buffer is free
+  volatile uint8_t play_buffer;
+  volatile uint8_t play_index;
+  uint8_t          write_buffer;
+  
+  volatile bool    isOn;           // stream is running
+  volatile bool    isWaiting;      // underrun, wait for next chunk
+  bool             last_chunk;     // last chunk received
+  volatile uint8_t credits;        // free buffers to report, send from loop
+  volatile bool    done;           // last code done, send from loop
+  volatile bool    underrun;       // report underrun from loop
+
+ EventCodeStream(){
+     _time_end        = 0;
+     duration         = 0;
+     default_duration = 15;
+     data_counts[0]   = 0;
+     data_counts[1]   = 0;
+     play_buffer      = 0;
+     play_index       = 0;
+     write_buffer     = 0;
+     isOn             = false;
+     isWaiting        = false;
+     last_chunk       = false;
+     credits          = 0;
+     done             = false;
+     underrun         = false;
+    }// end of EventCodeStream
+
+ void Next(){
+      if ( play_index + 1 < data_counts[play_buffer] ){
+           _portEVENT_CODE   = data[play_buffer][play_index];   // set eventcode bit0-7
+           _portTRIGGER_CODE = data[play_buffer][play_index+1]; // set trigger code/bits
+           log_edge(data[play_buffer][play_index],data[play_buffer][play_index+1]);
+           play_index += 2;
+           _time_end   = (unsigned long) micros() + duration * 1000;
+           isWaiting   = false;
+           digitalWrite(PIN_STATUS,HIGH);
+           return;
+         }
+    //--- buffer played -> credit for the host, switch buffer
+      if ( data_counts[play_buffer] > 0 ){ data_counts[play_buffer] = 0; credits++; }
+      play_buffer ^= 1;
+      play_index   = 0;
+      if ( data_counts[play_buffer] > 0 ){ Next(); return; }
+      if ( last_chunk ){ Stop(); done = true; return; }
+    //--- underrun: switch off, continue with the next chunk
+      _portEVENT_CODE   = clear_code;
+      _portTRIGGER_CODE = clear_code;
+      log_edge(0,0);
+      if ( !isWaiting ){ underrun = true; }
+      isWaiting = true;
+  }// end of Next
+
+  void Update(){
+    if ( ( isOn == true ) && ( isWaiting == false ) )
+     { 
+      if ( (unsigned long) micros() > (unsigned long)_time_end )
+        { Next(); }
+     }
+   }// end of Update
+
+  void Stop(){
+     _portEVENT_CODE   = clear_code ;
+     _portTRIGGER_CODE = clear_code ;
+     log_edge(0,0);
+     _time_end         = 0;
+     isOn              = false;
+     isWaiting         = false;
+     digitalWrite(PIN_STATUS,LOW);
+   } // end of Stop
+
+  void Start(unsigned long dt){
+     Stop();
+     data_counts[0] = 0;
+     data_counts[1] = 0;
+     play_buffer    = 0;
+     play_index     = 0;
+     write_buffer   = 0;
+     last_chunk     = false;
+     credits        = 0;
+     done           = false;
+     underrun       = false;
+     duration       = dt;
+     if ( duration == 0 ){ duration = default_duration; }
+   } // end of Start
+
+  static const uint8_t clear_code = 0;
+};// end of EventCodeStream cls
+
+
+//-------------------------------------------------------
+// EventCodeSchedule Class
+// entries with onset relative to the start time
+// played in Timer5 IRQ, no host interaction till done
+//-------------------------------------------------------
+struct ScheduleEntry{
+  uint32_t onset_ms;
+  uint8_t  eventcode;
+  uint8_t  triggercode;
+  uint16_t duration_ms;
+};
+
+class EventCodeSchedule{
+
+   volatile unsigned long  _time_start; // micros() of onset 0
+   volatile unsigned long  _time_end;   // end of the current code relative to start
+  
+//--- init DirectIO Event Ccode ports C; 
+   OutputPort<PORT_C> _portEVENT_CODE; 
+//--- init DirectIO Trigger Code ports A;
+   OutputPort<PORT_A> _portTRIGGER_CODE;
+
+public:
+  ScheduleEntry    entries[SCHEDULE_MAX_ENTRIES];
+  uint16_t         counts;
+  volatile uint16_t index;
+  volatile bool    isOn;       // schedule is running
+  volatile bool    codeOn;     // code of an entry is set
+  volatile bool    done;       // last code done, send from loop
+
+ EventCodeSchedule(){
+     _time_start = 0;
+     _time_end   = 0;
+     counts      = 0;
+     index       = 0;
+     isOn        = false;
+     codeOn      = false;
+     done        = false;
+    }// end of EventCodeSchedule
+
+  void Start(unsigned long delay_ms){
+     Stop();
+     index       = 0;
+     done        = false;
+     _time_start = (unsigned long) micros() + delay_ms * 1000;
+     isOn        = ( counts > 0 );
+   } // end of Start
+
+  void Update(){
+    if ( isOn == false ) { return; }
+    unsigned long dt = (unsigned long) micros() - _time_start; // overflow safe
+    if ( (long) dt < 0 ) { return; } // start delay
+    
+    if ( codeOn && ( dt > _time_end ) )
+       {
+        _portEVENT_CODE   = clear_code;
+        _portTRIGGER_CODE = clear_code;
+        log_edge(0,0);
+        codeOn = false;
+        digitalWrite(PIN_STATUS,LOW);
+       }
+    if ( ( index < counts ) && ( dt >= entries[index].onset_ms * 1000UL ) )
+       {
+        _portEVENT_CODE   = entries[index].eventcode;
+        _portTRIGGER_CODE = entries[index].triggercode;
+        log_edge(entries[index].eventcode,entries[index].triggercode);
+        _time_end = ( entries[index].onset_ms + (unsigned long) entries[index].duration_ms ) * 1000UL;
+        codeOn    = true;
+        index++;
+        digitalWrite(PIN_STATUS,HIGH);
+       }
+    if ( ( index >= counts ) && !codeOn )
+       { isOn = false; done = true; }
+   }// end of Update
+
+  void Stop(){
+     _portEVENT_CODE   = clear_code ;
+     _portTRIGGER_CODE = clear_code ;
+     log_edge(0,0);
+     isOn              = false;
+     codeOn            = false;
+     digitalWrite(PIN_STATUS,LOW);
+   } // end of Stop
+
+  static const uint8_t clear_code = 0;
+};// end of EventCodeSchedule cls
+
+
+//-------------------------------------------------------
+// EventCodeAt Class
+// one pending switch on at device time, fired in Timer5 IRQ
+//-------------------------------------------------------
+class EventCodeAt{
+public:
+  volatile bool isPending;
+  uint8_t       eventcode;
+  uint8_t       triggercode;
+  unsigned long duration;
+  unsigned long time_at;   // micros()
+
+ EventCodeAt(){
+     isPending   = false;
+     eventcode   = 0;
+     triggercode = 0;
+     duration    = 0;
+     time_at     = 0;
+    }// end of EventCodeAt
+
+  bool Due(){ // overflow safe
+     return ( isPending && ( (long)( (unsigned long) micros() - time_at ) >= 0 ) );
+   }// end of Due
+};// end of EventCodeAt cls
+
 
 //--- init eventcode class
-EventCode    eventcode;
-EventCodeSeq eventcode_seq;
+EventCodeAt       eventcode_at;
+EventCode         eventcode;
+EventCodeSeq      eventcode_seq;
+EventCodeStream   eventcode_stream;
+EventCodeSchedule eventcode_schedule;
 
 void EventCodeHandler(){
-  if (eventcode_seq.isOn==true)
+  if ( eventcode_at.Due() )
+     {
+      eventcode_at.isPending = false;
+      eventcode.eventcode    = eventcode_at.eventcode;
+      eventcode.triggercode  = eventcode_at.triggercode;
+      eventcode.duration     = eventcode_at.duration;
+      eventcode.SwitchOn();
+     }
+  if (eventcode_schedule.isOn==true)
+     { eventcode_schedule.Update(); }
+  else if (eventcode_stream.isOn==true)
+     { eventcode_stream.Update(); }
+  else if (eventcode_seq.isOn==true)
      { eventcode_seq.Update(); }
   else{ eventcode.Update(); }
   }
@@ -288,6 +661,8 @@ void setup() {
  Timer5.disablePwm(45);
  Timer5.disablePwm(46);
  Timer5.attachInterrupt( EventCodeHandler ); 
+//--- announce readiness, host waits for this byte instead of sleeping
+ Serial.write(ReplyKeys.device_ready);
 } // end of setup
 
 //---------------------------------------------
@@ -297,6 +672,9 @@ void loop() {
      if (digitalRead( PIN_START_CODE ) and (!eventcode.isOn))
         { send_start_code(); }
      check_serialEvent();// e.g use with IRQ
+     report_stream();
+     report_edges();
+     check_baudrate();
      //eventcode.Update(); // use with Timer5 IRQ
       
 } // end of loop
@@ -311,62 +689,393 @@ void send_start_code(){
      eventcode.SwitchOn();
 }        
 
+//---------------------------------------------
+// report_stream  
+// send credits / underrun / done of the seq stream, set in Timer5 IRQ
+//---------------------------------------------
+void report_stream(){
+     while ( eventcode_stream.credits > 0 )
+       { noInterrupts();
+         eventcode_stream.credits--;
+         interrupts();
+         Serial.write(ReplyKeys.seq_credit);
+       }
+     if ( eventcode_stream.underrun ){ eventcode_stream.underrun = false; Serial.write(ReplyKeys.seq_underrun); }
+     if ( eventcode_stream.done     ){ eventcode_stream.done     = false; Serial.write(ReplyKeys.seq_done);     }
+     if ( eventcode_schedule.done   ){ eventcode_schedule.done   = false; Serial.write(ReplyKeys.schedule_done); }
+}
+
+//---------------------------------------------
+// report_edges  
+// send micros() of TTL changes logged by log_edge
+//---------------------------------------------
+void report_edges(){
+     uint8_t  pkt[7];
+     uint32_t t;
+     while ( edge_tail != edge_head )
+       {
+        noInterrupts();
+        pkt[0] = ReplyKeys.edge;
+        pkt[1] = edge_log[edge_tail].eventcode;
+        pkt[2] = edge_log[edge_tail].triggercode;
+        t      = edge_log[edge_tail].t;
+        edge_tail = ( edge_tail + 1 ) % EDGE_LOG_SIZE;
+        interrupts();
+        for(uint8_t k=0;k<4;k++){ pkt[3+k] = ( t >> (k*8) ) & 0xFF; }
+        Serial.write(pkt,7);
+       }
+}
+
+//---------------------------------------------
+// command input v1 / v2
+// v1: command bytes are read from Serial
+// v2: from the checked frame body in cmd_buf
+//---------------------------------------------
+uint8_t       protocol = 1;
+uint8_t       cmd_buf[V2_MAX_BODY];
+uint16_t      cmd_len  = 0;
+uint16_t      cmd_pos  = 0;
+uint8_t       v2_state = 0; // 0: sync0, 1: sync1, 2,3: len, 4: header crc, 5: body, 6,7: crc
+uint8_t       v2_hdr[2];
+uint16_t      v2_crc;
+uint16_t      v2_rx_crc;
+uint8_t       v2_vid   = 0; // run of vendor id bytes
+unsigned long v2_t_last= 0;
+
+int cmd_read(){
+    if ( protocol == 2 ){ return ( cmd_pos < cmd_len ) ? cmd_buf[cmd_pos++] : 0; }
+    return Serial.read();
+}
+
+size_t cmd_read_bytes(char *buf,size_t n){
+    if ( protocol == 2 ){
+       for(size_t k=0;k<n;k++){ buf[k] = cmd_read(); }
+       return n;
+      }
+    return Serial.readBytes( buf,n );
+}
+
+void v2_drop(){
+     v2_state = 0;
+     Serial.write(ReplyKeys.nak);
+}
+
+//---------------------------------------------
+// v2_parse
+// feed one byte, true if cmd_buf holds a checked frame body
+//---------------------------------------------
+bool v2_parse(uint8_t b){
+     uint8_t hcrc;
+     v2_t_last = micros();
+     switch( v2_state ){
+       case 0:
+            if ( b == PROTOCOL_SYNC0 ){ v2_state = 1; v2_vid = 0; }
+            else if ( b == CmdKeys.eventcode_vendor_id )
+               { //--- port discovery: 7 x vendor id -> back to v1
+                 if ( ++v2_vid >= 7 ){ v2_vid = 0; protocol = 1; Serial.println(CmdKeys.eventcode_vendor_id); }
+               }
+            else { v2_vid = 0; }
+            return false;
+       case 1:
+            if ( b == PROTOCOL_SYNC1 ){ v2_state = 2; }
+            else if ( b != PROTOCOL_SYNC0 ){ v2_state = 0; }
+            return false;
+       case 2:
+            v2_hdr[0] = b; v2_state = 3;
+            return false;
+       case 3:
+            v2_hdr[1] = b; v2_state = 4;
+            return false;
+       case 4:
+            hcrc = _crc8_ccitt_update( _crc8_ccitt_update(0,v2_hdr[0]),v2_hdr[1] );
+            cmd_len = v2_hdr[0] | ( (uint16_t) v2_hdr[1] << 8 );
+            if ( ( b != hcrc ) || ( cmd_len == 0 ) || ( cmd_len > V2_MAX_BODY ) ){ v2_drop(); return false; }
+            cmd_pos  = 0;
+            v2_crc   = 0;
+            v2_state = 5;
+            return false;
+       case 5:
+            cmd_buf[cmd_pos++] = b;
+            v2_crc = _crc_xmodem_update(v2_crc,b);
+            if ( cmd_pos >= cmd_len ){ v2_state = 6; }
+            return false;
+       case 6:
+            v2_rx_crc = b; v2_state = 7;
+            return false;
+       case 7:
+            v2_rx_crc |= ( (uint16_t) b << 8 );
+            if ( v2_rx_crc != v2_crc ){ v2_drop(); return false; }
+            v2_state = 0;
+            cmd_pos  = 0;
+            return true;
+      }
+     v2_state = 0;
+     return false;
+}
+
+//---------------------------------------------
+// baudrate negotiation
+// a trial rate without confirm falls back to the old rate:
+// the host can not reach the Arduino at a rate that failed the burst test
+//---------------------------------------------
+unsigned long baud_current = BAUDRATE;
+unsigned long baud_prev    = BAUDRATE;
+unsigned long baud_trial_t = 0;
+bool          baud_trial   = false;
+
+bool baud_ok(unsigned long baud){
+     unsigned long ubrr,real,err;
+     if ( ( baud < BAUD_MIN ) || ( baud > BAUD_MAX ) ){ return false; }
+     ubrr = ( F_CPU / 4 / baud - 1 ) / 2; // HardwareSerial::begin with U2X
+     real = F_CPU / 8 / ( ubrr + 1 );
+     err  = ( real > baud ) ? real - baud : baud - real;
+     return ( err * 1000UL / baud ) <= BAUD_MAX_ERROR_PERMILLE;
+}
+
+void set_baudrate(unsigned long baud){
+     Serial.flush(); // ACK is send at the old rate
+     Serial.end();
+     Serial.begin(baud);
+     baud_current = baud;
+     v2_state     = 0;
+}
+
+void check_baudrate(){
+     if ( baud_trial && ( (unsigned long)( millis() - baud_trial_t ) > BAUD_TRIAL_MS ) )
+        {
+         baud_trial = false;
+         set_baudrate(baud_prev);
+        }
+}
+
 //---------------------------------------------
 // check_serialEvents  
 //---------------------------------------------
 void check_serialEvent(){
-uint8_t cmd;
-uint8_t i;
-bool VENDOR_ID_REQUEST;
-
+if ( protocol == 2 )
+   {
+    while ( Serial.available() > 0 )
+      {
+       if ( v2_parse( Serial.read() ) )
+          {
+           execute_cmd( cmd_read() );
+           Serial.flush();
+          }
+      }
+    //--- incomplete frame e.g. a lost byte: drop, resync on the next frame
+    if ( ( v2_state > 0 ) && ( (unsigned long)( micros() - v2_t_last ) > V2_BYTE_TIMEOUT_US ) )
+       { v2_drop(); }
+    return;
+   }
 while ( Serial.available() >=7 )
  {  
-   cmd = Serial.read();
+   execute_cmd( Serial.read() );
+   Serial.flush();
+ }// while serial
+}// end of check_serialEvent
+
+//---------------------------------------------
+// execute_cmd  
+//---------------------------------------------
+void execute_cmd(uint8_t cmd){
+uint8_t i;
+uint8_t counts;
+uint8_t flags;
+uint8_t wb;
+uint16_t n;
+uint16_t k0;
+uint8_t  ping[6];
+unsigned long t_ping;
+unsigned long dt;
+unsigned long baud;
+bool VENDOR_ID_REQUEST;
 
    switch( cmd ){
      
       case CmdKeys.eventcode_switch_on : // 111,255,255,dtD0,dtD1,dtD2,dtD3
-           eventcode.eventcode     = Serial.read();
-           eventcode.triggercode   = Serial.read();
+           eventcode.eventcode     = cmd_read();
+           eventcode.triggercode   = cmd_read();
            eventcode.duration      = 0;
-           for(i=0;i<4;i++){eventcode.duration |= ((unsigned long) Serial.read() << (i*8));}
+           for(i=0;i<4;i++){eventcode.duration |= ((unsigned long) cmd_read() << (i*8));}
            eventcode.SwitchOn();
            break;
            
-      case CmdKeys.eventcode_switch_off : // 112,0,0,0,0,0,0
+      case CmdKeys.eventcode_switch_off : // 112,ack,0,0,0,0,0
            eventcode.SwitchOff();
+           if ( eventcode_stream.isOn ){ eventcode_stream.Stop(); }
+           if ( eventcode_schedule.isOn ){ noInterrupts(); eventcode_schedule.Stop(); interrupts(); }
+           eventcode_at.isPending = false;
+           if ( cmd_read() == 1 ){ Serial.write(ReplyKeys.ack); }
+           for(i=2;i<7;i++){ cmd_read(); }
            break;
            
       case CmdKeys.eventcode_vendor_id:// 123,123,123,123,123,123,123,0
            VENDOR_ID_REQUEST=true;
-           for (i=1;i<6;i++)
+           for (i=1;i<7;i++) // read the complete 7 byte frame
              {
-               if ( CmdKeys.eventcode_vendor_id != Serial.read())
+               if ( CmdKeys.eventcode_vendor_id != cmd_read())
                   { Serial.println(99);  VENDOR_ID_REQUEST=false;break;}
-             } // for                     
-           if ( VENDOR_ID_REQUEST== true){ Serial.println(CmdKeys.eventcode_vendor_id);delay(1000); }
+             } // for
+           if ( VENDOR_ID_REQUEST== true)
+              { Serial.println(CmdKeys.eventcode_vendor_id);
+               //--- drop a partial vendor id frame e.g. received during bootloader reset, no delay
+                while ( Serial.peek() == CmdKeys.eventcode_vendor_id ){ Serial.read(); }
+              }
            break;
       
       case CmdKeys.eventcode_seq: //211,10,0,0,0,0,1,0,2,0,3,0,4,0,5,0
            eventcode_seq.Reset();
-           eventcode_seq.data_counts = Serial.read(); // max 128
-           Serial.read(); // dummy 
-           for(i=0;i<4;i++){eventcode_seq.duration |= ((unsigned long) Serial.read() << (i*8));}
+           eventcode_seq.data_counts = cmd_read(); // max 128
+           cmd_read(); // dummy 
+           eventcode_seq.duration = 0; // was or'ed with the duration of the previous seq
+           for(i=0;i<4;i++){eventcode_seq.duration |= ((unsigned long) cmd_read() << (i*8));}
           
            if (eventcode_seq.data_counts > SEQ_MAX_DATA_COUNTS )
               { eventcode_seq.data_counts = SEQ_MAX_DATA_COUNTS;}
-           Serial.readBytes( eventcode_seq.data, eventcode_seq.data_counts); 
+           cmd_read_bytes( eventcode_seq.data, eventcode_seq.data_counts); 
           
            if (eventcode_seq.duration == 0 )
             { eventcode_seq.duration = eventcode_seq.default_duration;}
            
            eventcode_seq.SendSEQ();
            break;
+
+      case CmdKeys.eventcode_seq_stream: // 212,0,0,dt0,dt1,dt2,dt3
+           cmd_read(); // dummy
+           cmd_read(); // dummy
+           dt = 0;
+           for(i=0;i<4;i++){ dt |= ((unsigned long) cmd_read() << (i*8)); }
+           noInterrupts();
+           eventcode_stream.Start(dt);
+           interrupts();
+           break;
+
+      case CmdKeys.eventcode_seq_chunk: // 213,counts,last,0,0,0,0,data[counts]
+           counts = cmd_read();
+           flags  = cmd_read();
+           for(i=0;i<4;i++){ cmd_read(); } // dummy
+           if ( counts > SEQ_CHUNK_BYTES ){ counts = SEQ_CHUNK_BYTES; }
+           wb = eventcode_stream.write_buffer;
+           if ( eventcode_stream.data_counts[wb] > 0 ) // no credit, drop chunk
+              { cmd_read_bytes( data_buffer, counts ); break; }
+           cmd_read_bytes( eventcode_stream.data[wb], counts );
+           noInterrupts();
+           eventcode_stream.data_counts[wb] = counts;
+           eventcode_stream.write_buffer   ^= 1;
+           if ( flags & 1 ){ eventcode_stream.last_chunk = true; }
+           if ( !eventcode_stream.isOn )
+              { eventcode_stream.isOn = true; eventcode_stream.Next(); }
+           else if ( eventcode_stream.isWaiting )
+              { eventcode_stream.Next(); }
+           interrupts();
+           break;
+
+      case CmdKeys.schedule_load: // 214,n0,n1,k0,k1,k2,k3,entries[n]
+           n  = cmd_read();
+           n |= ( (uint16_t) cmd_read() << 8 );
+           k0 = cmd_read();
+           k0|= ( (uint16_t) cmd_read() << 8 );
+           for(i=0;i<2;i++){ cmd_read(); } // dummy
+           noInterrupts();
+           eventcode_schedule.Stop();
+           interrupts();
+           if ( k0 == 0 ){ eventcode_schedule.counts = 0; } // new schedule, else add a chunk
+           for(uint16_t k=k0;k<k0+n;k++)
+              {
+               if ( k < SCHEDULE_MAX_ENTRIES )
+                  { cmd_read_bytes( (char *) &eventcode_schedule.entries[k],sizeof(ScheduleEntry) );
+                    if ( k >= eventcode_schedule.counts ){ eventcode_schedule.counts = k + 1; }
+                  }
+               else
+                  { cmd_read_bytes( data_buffer,sizeof(ScheduleEntry) ); } // drop
+              }
+           Serial.write(ReplyKeys.ack);
+           break;
+
+      case CmdKeys.eventcode_switch_on_at: // 218,ec,tr,dt0,dt1,dt2,dt3,T0,T1,T2,T3
+           noInterrupts();
+           eventcode_at.isPending = false;
+           interrupts();
+           eventcode_at.eventcode   = cmd_read();
+           eventcode_at.triggercode = cmd_read();
+           eventcode_at.duration    = 0;
+           for(i=0;i<4;i++){ eventcode_at.duration |= ((unsigned long) cmd_read() << (i*8)); }
+           cmd_read_bytes( data_buffer,4 ); // T may still be on the wire
+           eventcode_at.time_at = 0;
+           for(i=0;i<4;i++){ eventcode_at.time_at |= ((unsigned long)(uint8_t) data_buffer[i] << (i*8)); }
+           noInterrupts();
+           eventcode_at.isPending = true;
+           interrupts();
+           break;
+
+      case CmdKeys.clock_ping: // 216,id,0,0,0,0,0 -> pong,id,micros
+           t_ping = micros();
+           ping[0] = ReplyKeys.pong;
+           ping[1] = cmd_read();
+           for(i=0;i<5;i++){ cmd_read(); } // dummy
+           for(i=0;i<4;i++){ ping[2+i] = ( t_ping >> (i*8) ) & 0xFF; }
+           Serial.write(ping,6);
+           break;
+
+      case CmdKeys.edge_ack: // 217,enable,0,0,0,0,0
+           edge_ack  = ( cmd_read() == 1 );
+           for(i=0;i<5;i++){ cmd_read(); } // dummy
+           edge_last = 0xFFFF; // report the current output
+           break;
+
+      case CmdKeys.protocol: // 219,version,0,0,0,0,0 -> ACK, switch protocol
+           n = cmd_read();
+           for(i=0;i<5;i++){ cmd_read(); } // dummy
+           if ( ( n == 1 ) || ( n == 2 ) )
+              {
+               Serial.write(ReplyKeys.ack);
+               Serial.flush();
+               protocol = n;
+               v2_state = 0;
+               v2_vid   = 0;
+              }
+           break;
+
+      case CmdKeys.baudrate: // 220,mode,0,b0,b1,b2,b3 -> ACK / NAK
+           flags = cmd_read();
+           cmd_read(); // dummy
+           baud = 0;
+           for(i=0;i<4;i++){ baud |= ((unsigned long) cmd_read() << (i*8)); }
+           if ( flags == 1 ) // confirm
+              {
+               if ( baud_trial && ( baud == baud_current ) ){ baud_trial = false; Serial.write(ReplyKeys.ack); }
+               else { Serial.write(ReplyKeys.nak); }
+               break;
+              }
+           if ( !baud_ok(baud) ){ Serial.write(ReplyKeys.nak); break; }
+           Serial.write(ReplyKeys.ack);
+           if ( !baud_trial ){ baud_prev = baud_current; } // a new trial keeps the confirmed rate
+           baud_trial   = ( flags == 0 );
+           baud_trial_t = millis();
+           set_baudrate(baud);
+           break;
+
+      case CmdKeys.baud_test: // 221,n,0,0,0,0,0,data[n] -> baud_echo,data[n]
+           counts = cmd_read();
+           for(i=0;i<5;i++){ cmd_read(); } // dummy
+           if ( counts > SEQ_MAX_DATA_COUNTS ){ counts = SEQ_MAX_DATA_COUNTS; }
+           cmd_read_bytes( data_buffer,counts );
+           baud_trial_t = millis(); // host is alive
+           Serial.write(ReplyKeys.baud_echo);
+           Serial.write( (uint8_t *) data_buffer,counts );
+           break;
+
+      case CmdKeys.schedule_start: // 215,0,0,dt0,dt1,dt2,dt3
+           cmd_read(); // dummy
+           cmd_read(); // dummy
+           dt = 0;
+           for(i=0;i<4;i++){ dt |= ((unsigned long) cmd_read() << (i*8)); }
+           noInterrupts();
+           eventcode_schedule.Start(dt);
+           interrupts();
+           break;
            
      } // end switch
-     
-     Serial.flush();
-   }// while serial
-}// end of check_serialEvent
+}// end of execute_cmd
 
 
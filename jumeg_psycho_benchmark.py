@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+latency and throughput benchmarks for the JuMEG eventcode stack
+
+runs headless: the Arduino is a pty stand-in (JuMEG_Psycho_PtyDevice)
+or the firmware emulator (JuMEG_Psycho_Emulator, --emulate),
+PsychoPy is replaced by minimal fake modules for the present() loop
+
+ python jumeg_psycho_benchmark.py --out bench_2026-10.json
+ python jumeg_psycho_benchmark.py --out bench_new.json --compare bench_2026-10.json
+ python jumeg_psycho_benchmark.py --benchmarks import
+
+per benchmark:
+  latency percentiles [us], commands/sec,
+  alloc_blocks_per_call: net allocated memory blocks per call (gc disabled)
+  alloc_peak_bytes     : tracemalloc peak per call
+import: import time of a module in a fresh interpreter, max RSS and
+        heavy modules loaded (numpy, psychopy, asyncio)
+
+update 10.2026 fb
+"""
+
+import os,sys,gc,json,time,types,platform,argparse,tracemalloc,subprocess
+from contextlib import contextmanager
+
+from jumeg_psycho_frame     import JuMEG_Psycho_FrameEncoder,numpy_frame
+from jumeg_psycho_pty       import JuMEG_Psycho_PtyDevice
+from jumeg_psycho_emulator  import JuMEG_Psycho_Emulator
+from jumeg_psycho_eventcode import JuMEG_Psycho_EventCode
+from jumeg_psycho_wait      import percentile
+
+__version__='2026-10-18-001'
+
+PERCENTILES = (50,90,99,99.9)
+HEAVY_MODULES = ("numpy","psychopy","asyncio","serial")
+IMPORT_MODULES= ("jumeg_psycho_frame","jumeg_psycho_eventcode","jumeg_psycho_group","jumeg_stim")
+
+
+def measure(fct,n=10000,warmup=200,allocs=True):
+    """
+    call fct() n times
+
+    :param fct   : callable without arguments
+    :param n     : number of calls
+    :param warmup: calls before measuring
+    :param allocs: measure allocations in extra runs
+    :return:
+      dict with latency statistics [us], calls_per_sec and allocations
+    """
+    for i in range(warmup):
+        fct()
+    dt   = [0] * n
+    tnow = time.perf_counter_ns
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        t_start = tnow()
+        for i in range(n):
+            t0 = tnow()
+            fct()
+            dt[i] = tnow() - t0
+        t_total = tnow() - t_start
+    finally:
+        if gc_was_enabled:
+           gc.enable()
+
+    dt.sort()
+    res = dict( n=n,
+                mean_us = sum(dt) / n * 1.0e-3,
+                min_us  = dt[0] * 1.0e-3,
+                max_us  = dt[-1] * 1.0e-3,
+                calls_per_sec = n / (t_total * 1.0e-9) )
+    for p in PERCENTILES:
+        res["p{}_us".format(p)] = percentile(dt,p) * 1.0e-3
+    if allocs:
+       res.update( allocations(fct,n=min(n,1000)) )
+    return res
+
+
+def allocations(fct,n=1000):
+    """
+    :return:
+      dict alloc_blocks_per_call, alloc_peak_bytes
+    """
+    gc.collect()
+    gc.disable()
+    try:
+        b0 = sys.getallocatedblocks()
+        for i in range(n):
+            fct()
+        blocks = (sys.getallocatedblocks() - b0) / n
+    finally:
+        gc.enable()
+
+    tracemalloc.start()
+    try:
+        peak = 0
+        for i in range(min(n,100)):
+            tracemalloc.reset_peak()
+            cur0 = tracemalloc.get_traced_memory()[0]
+            fct()
+            peak = max(peak,tracemalloc.get_traced_memory()[1] - cur0)
+    finally:
+        tracemalloc.stop()
+    return dict(alloc_blocks_per_call=blocks,alloc_peak_bytes=peak)
+
+
+_IMPORT_SCRIPT = """
+import sys,time,json,resource
+t0 = time.perf_counter_ns()
+import {module}
+dt = time.perf_counter_ns() - t0
+print(json.dumps(dict(dt_ns=dt,maxrss_kb=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                      heavy=[m for m in {heavy!r} if m in sys.modules])))
+"""
+
+
+def import_time(module,n=5):
+    """
+    import <module> in <n> fresh interpreters, cwd and sys.path of this process
+
+    :return:
+      dict with import time statistics [us], max RSS [kB], heavy modules loaded by the import
+    """
+    env = dict(os.environ,PYTHONPATH=os.pathsep.join(p for p in sys.path if p))
+    dt,rss,heavy = [],[],[]
+    for i in range(n):
+        out = subprocess.run([sys.executable,"-c",_IMPORT_SCRIPT.format(module=module,heavy=HEAVY_MODULES)],
+                             capture_output=True,text=True,env=env,check=True)
+        r = json.loads(out.stdout.strip().splitlines()[-1])
+        dt.append(r["dt_ns"])
+        rss.append(r["maxrss_kb"])
+        heavy = r["heavy"]
+    dt.sort()
+    res = dict( n=n,
+                mean_us = sum(dt) / n * 1.0e-3,
+                min_us  = dt[0] * 1.0e-3,
+                max_us  = dt[-1] * 1.0e-3,
+                calls_per_sec = n / (sum(dt) * 1.0e-9),
+                maxrss_kb = max(rss),
+                heavy_modules = heavy )
+    for p in PERCENTILES:
+        res["p{}_us".format(p)] = percentile(dt,p) * 1.0e-3
+    return res
+
+
+#--- fake PsychoPy for the present() loop
+def fake_psychopy():
+    """
+    minimal psychopy, visual, core, event modules
+    flip() returns at once, waitKeys() returns the IOD toggle key
+
+    :return:
+      dict module name -> module
+    """
+    core = types.ModuleType("psychopy.core")
+    class Clock(object):
+        def __init__(self):
+            self._t0 = time.perf_counter()
+        def getTime(self):
+            return time.perf_counter() - self._t0
+        def reset(self):
+            self._t0 = time.perf_counter()
+    core.Clock   = Clock
+    core.getTime = time.perf_counter
+    core.wait    = time.sleep
+    core.quit    = lambda: None
+
+    event = types.ModuleType("psychopy.event")
+    event.getKeys     = lambda *args,**kwargs: []
+    event.waitKeys    = lambda *args,**kwargs: ["8"]
+    event.clearEvents = lambda *args,**kwargs: None
+
+    visual = types.ModuleType("psychopy.visual")
+    class Window(object):
+        def __init__(self,size=(1920,1200),color=(-1.0,-1.0,-1.0),**kwargs):
+            self.size  = size
+            self.color = color
+            self.mouseVisible = True
+            self._on_flip = []
+        def callOnFlip(self,fct,*args,**kwargs):
+            self._on_flip.append( (fct,args,kwargs) )
+        def flip(self,clearBuffer=True):
+            t = time.perf_counter()
+            while self._on_flip:
+                  fct,args,kwargs = self._on_flip.pop(0)
+                  fct(*args,**kwargs)
+            return t
+        def close(self):
+            pass
+    class Rect(object):
+        def __init__(self,win,**kwargs):
+            self.win = win
+        def setAutoDraw(self,v):
+            pass
+        def draw(self):
+            pass
+    visual.Window = Window
+    visual.Rect   = Rect
+
+    psychopy = types.ModuleType("psychopy")
+    psychopy.core,psychopy.event,psychopy.visual = core,event,visual
+    return {"psychopy":psychopy,"psychopy.core":core,"psychopy.event":event,"psychopy.visual":visual}
+
+
+@contextmanager
+def mocked_psychopy():
+    """ import jumeg_stim with fake psychopy modules """
+    names = list( fake_psychopy().items() ) + [("jumeg_stim",None)]
+    saved = { k: sys.modules.get(k) for k,_ in names }
+    for k,m in names:
+        if m is None:
+           sys.modules.pop(k,None)
+        else:
+           sys.modules[k] = m
+    try:
+        import jumeg_stim
+        yield jumeg_stim
+    finally:
+        for k,m in saved.items():
+            if m is None:
+               sys.modules.pop(k,None)
+            else:
+               sys.modules[k] = m
+
+
+class JuMEG_Psycho_Benchmark(object):
+    """
+    benchmark suite, results as dict / JSON
+
+    Example:
+    --------
+     from jumeg_psycho_benchmark import JuMEG_Psycho_Benchmark
+     bench = JuMEG_Psycho_Benchmark(n=5000)
+     res   = bench.run()
+     bench.save("bench.json")
+    """
+    def __init__(self,n=10000,eventcode=16,duration_ms=200,seq=None,emulate=False,verbose=True):
+        super().__init__()
+        self.n           = n
+        self.eventcode   = eventcode
+        self.duration_ms = duration_ms
+        self.seq         = seq if seq is not None else [1,2,4,8,16,32,64,128]
+        self.emulate     = emulate
+        self.verbose     = verbose
+        self.device      = None
+        self.results     = dict()
+
+    def _open(self,**kwargs):
+        evc = JuMEG_Psycho_EventCode(**kwargs)
+        evc.find_port = False
+        if not evc.open(port=self.device.port,reset=False):
+           raise RuntimeError("ERROR can not open pty stand-in: {}".format(self.device.port))
+        return evc
+
+   #--- benchmarks
+    def bench_encode(self):
+        enc = JuMEG_Psycho_FrameEncoder()
+        c,d = self.eventcode,self.duration_ms
+        return { "encode_numpy"  : measure(lambda: numpy_frame(c,d),n=self.n),
+                 "encode_cached" : measure(lambda: enc.switch_on(c,d),n=self.n),
+                 "encode_uncached": measure(lambda: enc.encode(111,c,d),n=self.n) }
+
+    def bench_send(self):
+        evc = self._open()
+        try:
+            c,d = self.eventcode,self.duration_ms
+            res = measure(lambda: evc.send(c,d),n=self.n)
+        finally:
+            evc.close()
+        return {"send_sync": res}
+
+    def bench_sendSeq(self):
+        evc = self._open()
+        try:
+            res = measure(lambda: evc.sendSeq(self.seq),n=max(1,self.n // 10))
+        finally:
+            evc.close()
+        return {"sendSeq_sync": res}
+
+    def bench_send_async(self):
+        evc = self._open(async_mode=True,async_queue_size=self.n * 4)
+        try:
+            c,d = self.eventcode,self.duration_ms
+            res = measure(lambda: evc.send(c,d),n=self.n,allocs=False)
+           #--- throughput: enqueue n frames, wait till written
+            t0 = time.perf_counter()
+            for i in range(self.n):
+                evc.send(c,d)
+            evc.sender.wait(timeout=60.0)
+            res["written_per_sec"] = self.n / (time.perf_counter() - t0)
+           #--- writer timestamps
+            recs  = list(evc.sender.records)[-self.n:]
+            queue = sorted( (r.t_write_start - r.t_enqueue) * 1.0e-3 for r in recs )
+            write = sorted( (r.t_write_done - r.t_write_start) * 1.0e-3 for r in recs )
+            for p in PERCENTILES:
+                res["queue_p{}_us".format(p)] = percentile(queue,p)
+                res["write_p{}_us".format(p)] = percentile(write,p)
+        finally:
+            evc.close()
+        return {"send_async": res}
+
+    def bench_import(self):
+        """ import time of the trigger-only modules, no device needed """
+        return { "import_" + m: import_time(m,n=max(1,min(self.n // 1000,10))) for m in IMPORT_MODULES }
+
+    def bench_present(self):
+        with mocked_psychopy() as jumeg_stim:
+             evc   = self._open()
+             try:
+                 stim  = jumeg_stim.JuMEGStim(EventCode=evc)
+                 stim.ExitKeys = []
+                 code  = self.eventcode
+                 def _present():
+                     with stim.present(eventcode=code):
+                          pass
+                 res = measure(_present,n=max(1,self.n // 10))
+             finally:
+                 evc.close()
+        return {"present": res}
+
+    def run(self,benchmarks=("encode","send","sendSeq","send_async","present","import")):
+        """
+        run benchmarks against a pty stand-in
+
+        :param benchmarks: names of bench_<name> methods
+        :return:
+          results dict
+        """
+        self.results = dict( meta=self.meta() )
+        self.device  = JuMEG_Psycho_Emulator() if self.emulate else JuMEG_Psycho_PtyDevice()
+        self.device.start()
+        try:
+            for name in benchmarks:
+                if self.verbose:
+                   print("---> benchmark: {}".format(name))
+                try:
+                    res = getattr(self,"bench_" + name)()
+                except Exception as e:
+                    res = { name: {"error": "{}: {}".format(type(e).__name__,e)} }
+                self.results.update(res)
+                if self.verbose:
+                   for k,v in res.items():
+                       print(self._format(k,v))
+        finally:
+            self.device.stop()
+        if self.emulate:
+           self.results["device"] = dict( commands=len(self.device.commands),rx_overflows=self.device.rx_overflows,
+                                          rx_max_level=self.device.rx_max_level )
+        return self.results
+
+    def meta(self):
+        import jumeg_psycho_eventcode
+        return dict( time=time.strftime("%Y-%m-%dT%H:%M:%S"),python=platform.python_version(),
+                     platform=platform.platform(),eventcode_version=jumeg_psycho_eventcode.__version__,
+                     benchmark_version=__version__,n=self.n,emulate=self.emulate )
+
+    def _format(self,name,v):
+        if "error" in v:
+           return " --> {:<16}: ERROR {}".format(name,v["error"])
+        if "heavy_modules" in v:
+           return " --> {:<30}: p50 {:9.0f} us  max {:9.0f} us  RSS {:7d} kB  loads: {}".format(
+                  name,v["p50_us"],v["max_us"],v["maxrss_kb"],",".join(v["heavy_modules"]) or "-")
+        return " --> {:<16}: p50 {:9.2f} us  p99 {:9.2f} us  max {:9.2f} us  {:10.0f} calls/s  {:5.1f} blocks/call".format(
+               name,v["p50_us"],v["p99_us"],v["max_us"],v["calls_per_sec"],v.get("alloc_blocks_per_call",float("nan")))
+
+    def save(self,fname):
+        """ save results as JSON """
+        with open(fname,"w") as fd:
+             json.dump(self.results,fd,indent=2)
+        return fname
+
+
+def compare(old,new,keys=("p50_us","p99_us"),tolerance=1.25):
+    """
+    regressions between two result dicts or JSON files
+
+    :param old      : baseline results or JSON file
+    :param new      : new results or JSON file
+    :param keys     : metrics to compare
+    :param tolerance: ratio new/old regarded as regression
+    :return:
+      list of (benchmark,key,old,new,ratio)
+    """
+    if isinstance(old,str):
+       with open(old) as fd:
+            old = json.load(fd)
+    if isinstance(new,str):
+       with open(new) as fd:
+            new = json.load(fd)
+    reg = []
+    for name,v in new.items():
+        if name in ("meta","device") or name not in old:
+           continue
+        for k in keys:
+            a,b = old[name].get(k),v.get(k)
+            if a and b and b / a > tolerance:
+               reg.append( (name,k,a,b,b / a) )
+    return reg
+
+
+def main(argv=None):
+    opt = argparse.ArgumentParser(description="JuMEG eventcode latency & throughput benchmark")
+    opt.add_argument("-n",type=int,default=10000,help="calls per benchmark")
+    opt.add_argument("--out",default=None,help="save results as JSON")
+    opt.add_argument("--compare",default=None,help="baseline JSON, report regressions")
+    opt.add_argument("--emulate",action="store_true",help="use the firmware emulator as device")
+    opt.add_argument("--benchmarks",default="encode,send,sendSeq,send_async,present,import")
+    args = opt.parse_args(argv)
+
+    bench = JuMEG_Psycho_Benchmark(n=args.n,emulate=args.emulate)
+    bench.run(benchmarks=args.benchmarks.split(","))
+    if args.out:
+       print("---> save results: {}".format(bench.save(args.out)))
+    if args.compare:
+       reg = compare(args.compare,bench.results)
+       for r in reg:
+           print(" --> REGRESSION {}.{}: {:.2f} -> {:.2f} ({:.2f}x)".format(*r))
+       return 1 if reg else 0
+    return 0
+
+
+if __name__ == "__main__":
+   sys.exit( main() )
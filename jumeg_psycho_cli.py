@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+command line tool for the JuMEG Arduino eventcode box
+trigger-only: no psychopy, no numpy
+
+ python jumeg_psycho_cli.py find
+ python jumeg_psycho_cli.py send 16 -d 100
+ python jumeg_psycho_cli.py send 16+512 --repeat 10 --isi 0.5
+ python jumeg_psycho_cli.py seq 1 2 4 8 16 -d 10
+ python jumeg_psycho_cli.py stream 1 2 4 8 16 32 64 128 --repeat 100 -d 5
+ python jumeg_psycho_cli.py cmd "111,16,100;211,10,1,2,4" --schedule
+ python jumeg_psycho_cli.py start
+ python jumeg_psycho_cli.py off
+ python jumeg_psycho_cli.py ping -n 32
+
+codes: eventcode + triggercode<<8, e.g. 16+512 or 0x210
+
+update 10.2026 fb
+"""
+
+import sys,time,argparse
+
+from jumeg_psycho_eventcode import JuMEG_Psycho_EventCode
+
+__version__='2026-10-18-001'
+
+
+def parse_code(v):
+    """ "16", "0x10", "16+512" -> int """
+    return sum( int(c,0) for c in str(v).split("+") )
+
+
+def get_args(argv=None):
+    opt = argparse.ArgumentParser(description="JuMEG Arduino eventcode box")
+    opt.add_argument("-p","--port",default=None,help="serial port, default: find port via vendor id")
+    opt.add_argument("-b","--baudrate",type=int,default=115200)
+    opt.add_argument("--baudrate-max",type=int,default=0,help="negotiate the fastest baudrate up to this rate e.g. 2000000, default 0: off")
+    opt.add_argument("--pattern",default='/dev/ttyACM[0-9]*',help="port pattern for the port discovery")
+    opt.add_argument("--no-reset",action="store_true",help="do not reset a running Arduino on open")
+    opt.add_argument("--journal",default=None,help="journal file, every sent code is logged")
+    opt.add_argument("-v","--verbose",action="store_true")
+    sub = opt.add_subparsers(dest="command",required=True)
+
+    sub.add_parser("find",help="find the Arduino port")
+    sub.add_parser("off",help="switch off")
+
+    p = sub.add_parser("start",help="send the startcode")
+    p.add_argument("-d","--duration",type=int,default=-1,help="duration in ms")
+
+    p = sub.add_parser("send",help="send one eventcode")
+    p.add_argument("code",type=parse_code)
+    p.add_argument("-d","--duration",type=int,default=-1,help="duration in ms")
+    p.add_argument("--repeat",type=int,default=1)
+    p.add_argument("--isi",type=float,default=0.5,help="inter stimulus interval in s")
+
+    for name,txt in (("seq","send a sequence, max 61 codes"),("stream","stream a sequence of any length")):
+        p = sub.add_parser(name,help=txt)
+        p.add_argument("codes",type=parse_code,nargs="+")
+        p.add_argument("-d","--duration",type=int,default=-1,help="duration of each code in ms")
+        p.add_argument("--repeat",type=int,default=1,help="repeat the codes")
+
+    p = sub.add_parser("cmd",help="command list e.g. \"111,16,100;112\"")
+    p.add_argument("cmd_str")
+    p.add_argument("--schedule",action="store_true",help="upload as schedule, played by the Arduino")
+
+    p = sub.add_parser("ping",help="clock sync, round trip statistics")
+    p.add_argument("-n",type=int,default=16,help="number of pings")
+    return opt.parse_args(argv)
+
+
+def _duration(v,default):
+    return default if v == -1 else v
+
+
+def run(evc,args):
+    """ execute the sub command on an open connection, returns exit code """
+    t_done = 0.0 # close() switches off, wait till the codes are played
+    if args.command == "find":
+       print("---> Arduino@Port: {} baudrate: {} protocol: v{}".format(evc.ComPort,evc.baudrate_active,evc.protocol))
+    elif args.command == "off":
+       evc.sendSwitchOff()
+    elif args.command == "start":
+       evc.sendStartCode(duration_ms=args.duration)
+       t_done = _duration(args.duration,evc.duration_ms) * 1.0e-3
+    elif args.command == "send":
+       for i in range(args.repeat):
+           if i:
+              time.sleep(args.isi)
+           evc.send(eventcode=args.code,duration_ms=args.duration)
+       t_done = _duration(args.duration,evc.duration_ms) * 1.0e-3
+    elif args.command == "seq":
+       evc.sendSeq(seq=args.codes * args.repeat,duration_seq_ms=args.duration)
+       t_done = min(len(args.codes) * args.repeat,61) * _duration(args.duration,evc.duration_seq_ms) * 1.0e-3
+    elif args.command == "stream":
+       if evc.sendSeqStream(seq=args.codes * args.repeat,duration_seq_ms=args.duration) is None:
+          return 1
+    elif args.command == "cmd":
+       for c in args.cmd_str.split(";") if not args.schedule else [args.cmd_str]:
+           evc.sendCmdList(c,as_schedule=args.schedule)
+       if args.schedule and not evc.waitSchedule():
+          return 1
+    elif args.command == "ping":
+       res = evc.syncClock(n=args.n)
+       if not res:
+          return 1
+       print("---> clock: offset {offset_us:.1f} us drift {drift_ppm:.2f} ppm".format(**res))
+       print("  -> RTT [us] p50: {rtt_p50_us:.1f} p99: {rtt_p99_us:.1f} max: {rtt_max_us:.1f}".format(**res))
+    if t_done:
+       time.sleep(t_done + 0.001)
+    return 0
+
+
+def main(argv=None):
+    args = get_args(argv)
+    evc  = JuMEG_Psycho_EventCode(baudrate=args.baudrate,verbose=args.verbose,journal=args.journal)
+    evc.port_pattern = args.pattern
+    evc.baudrate_max = args.baudrate_max
+    evc.baudrate_negotiate = args.baudrate_max > args.baudrate
+    if args.port:
+       evc.find_port = False
+    if not evc.open(port=args.port,reset=not args.no_reset):
+       print("---> ERROR can not connect Arduino: {}".format(args.port or args.pattern))
+       return 1
+    try:
+        return run(evc,args)
+    finally:
+        evc.close()
+
+
+if __name__ == "__main__":
+   sys.exit( main() )
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+host - Arduino clock synchronisation
+
+NTP-style: the host sends a ping at t_send, the Arduino replies its micros() t_dev,
+the host receives at t_recv; t_dev is taken at the midpoint (t_send + t_recv) / 2
+offset and drift are a linear regression over the pings with the shortest round trip
+
+device times are micros() in us (32 bit, wraps after 71.6 min, unwrapped here),
+host times are time.monotonic_ns()
+
+Example:
+--------
+ evc.syncClock(n=32)
+ evc.clock.to_host_ns(t_dev_us)   # device edge time -> host time
+ evc.clock.to_device_us(t_ns)     # host time -> device time e.g. send_at()
+ evc.clock.rtt_stats()
+
+update 10.2026 fb
+"""
+
+import time
+from collections import deque
+
+from jumeg_psycho_wait import percentile
+
+__version__='2026-10-18-001'
+
+MICROS_WRAP = 1 << 32
+
+
+class JuMEG_Psycho_ClockSync(object):
+    """
+    offset / drift estimator device clock vs host clock
+
+    :param window  : number of pings used for the fit
+    :param quantile: only pings with a round trip <= this quantile are used for the fit
+    :param history : number of round trip times kept for the statistics
+    """
+    def __init__(self,window=64,quantile=0.5,history=4096):
+        super().__init__()
+        self.quantile = quantile
+        self._samples = deque(maxlen=window) # (t_mid_ns,t_dev_us,rtt_ns)
+        self._rtt     = deque(maxlen=history)
+        self.clear()
+   #---
+    @property
+    def isSynced(self): return self._slope is not None
+   #---
+    @property
+    def offset_us(self):
+        """ device time - host time at host time now in us """
+        if not self.isSynced:
+           return float("nan")
+        t = time.monotonic_ns()
+        return self.to_device_us(t) - t * 1.0e-3
+   #---
+    @property
+    def drift_ppm(self):
+        """ device clock rate - host clock rate in ppm """
+        if not self.isSynced:
+           return float("nan")
+        return (self._slope * 1.0e3 - 1.0) * 1.0e6
+   #---
+    @property
+    def samples(self): return self._samples
+
+    def clear(self):
+        self._samples.clear()
+        self._rtt.clear()
+        self._ref_ns    = None
+        self._slope     = None # us / ns
+        self._intercept = None # us at _ref_ns
+        self._last_dev  = None
+
+    def unwrap(self,t_dev_raw,t_host_ns=None):
+        """
+        32 bit micros() -> continuous device time in us
+
+        :param t_dev_raw: micros() from the Arduino
+        :param t_host_ns: host time close to t_dev_raw <now>, used to pick the wrap
+        """
+        if self.isSynced:
+           pred = self.to_device_us(time.monotonic_ns() if t_host_ns is None else t_host_ns)
+        elif self._last_dev is not None:
+           pred = self._last_dev
+        else:
+           return float(t_dev_raw)
+        k = round( (pred - t_dev_raw) / MICROS_WRAP )
+        return float(t_dev_raw + k * MICROS_WRAP)
+
+    def add(self,t_send_ns,t_dev_raw,t_recv_ns):
+        """
+        add one ping
+
+        :param t_send_ns: host time before the ping was written
+        :param t_dev_raw: micros() in the PONG
+        :param t_recv_ns: host time the PONG was read
+        :return:
+          round trip time in us
+        """
+        rtt   = t_recv_ns - t_send_ns
+        t_mid = t_send_ns + rtt // 2
+        t_dev = self.unwrap(t_dev_raw,t_mid)
+        self._last_dev = t_dev
+        self._samples.append( (t_mid,t_dev,rtt) )
+        self._rtt.append(rtt * 1.0e-3)
+        self.fit()
+        return rtt * 1.0e-3
+
+    def fit(self):
+        """ least squares fit t_dev = intercept + slope * (t_host - ref) on the short round trip pings """
+        if not self._samples:
+           return False
+        rtt_max = percentile([s[2] for s in self._samples],self.quantile * 100.0)
+        sel = [s for s in self._samples if s[2] <= rtt_max]
+        ref = sel[-1][0]
+        xs  = [s[0] - ref for s in sel]
+        ys  = [s[1] for s in sel]
+        n   = len(sel)
+        mx  = sum(xs) / n
+        my  = sum(ys) / n
+        sxx = sum( (x - mx) ** 2 for x in xs )
+        if n < 2 or xs[-1] - min(xs) < 1.0e9: # < 1 s spread, no drift estimate
+           slope = 1.0e-3
+        else:
+           slope = sum( (x - mx) * (y - my) for x,y in zip(xs,ys) ) / sxx
+        self._ref_ns    = ref
+        self._slope     = slope
+        self._intercept = my - slope * mx
+        return True
+
+    def to_device_us(self,t_host_ns):
+        """ host time.monotonic_ns() -> device micros() unwrapped """
+        return self._intercept + self._slope * (t_host_ns - self._ref_ns)
+
+    def to_host_ns(self,t_dev_us):
+        """ device micros() unwrapped -> host time.monotonic_ns() """
+        return int( self._ref_ns + (t_dev_us - self._intercept) / self._slope )
+
+    def rtt_stats(self):
+        """
+        :return:
+          dict: pings, round trip time mean/p50/p99/max in us
+        """
+        rtt = list(self._rtt)
+        return { "pings"   : len(rtt),
+                 "rtt_mean_us": sum(rtt) / len(rtt) if rtt else float("nan"),
+                 "rtt_p50_us" : percentile(rtt,50),
+                 "rtt_p99_us" : percentile(rtt,99),
+                 "rtt_max_us" : max(rtt) if rtt else float("nan") }
@@ -0,0 +1,512 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+shared eventcode daemon for the JuMEG Arduino eventcode box
+
+the daemon owns the serial port: one open / reset at daemon start,
+clients connect to a Unix domain socket (SOCK_SEQPACKET) in a few ms,
+several stimulus processes share one box
+
+message: 16 byte header MSG + payload, client -> daemon and daemon -> client
+   op u8, flags u8 (reply: status), code u16, duration u32 (reply: value), t_ns i64
+   t_ns: client time.monotonic_ns() at send, CLOCK_MONOTONIC is shared by all processes:
+         the daemon measures the latency of every client without clock sync,
+         a reply echoes t_ns of its request
+
+   OP_HELLO  : payload client name                    -> reply
+   OP_SEND   : code, duration                         -> reply with FLAG_ACK after the write, value: latency us
+   OP_FRAME  : payload pre-encoded v1 frame           -> reply with FLAG_ACK after the write, value: latency us
+   OP_SEND_AT: code, duration, t_ns target time       -> reply with FLAG_ACK, value: device time us & 0xFFFFFFFF
+   OP_LOCK   : duration max hold time in ms, 0: till unlock   -> reply ST_OK or ST_BUSY
+   OP_UNLOCK :                                                -> reply
+   OP_PING   :                                                -> reply, value: daemon receive latency us
+   OP_STATS  :                                                -> reply, payload json: per client statistics
+   OP_SYNC   : code number of pings, clock sync of the daemon -> reply, payload json: syncClock result
+
+arbitration: frames of all clients go in arrival order into the writer thread of the box;
+   a client holding the lock sends exclusively, sends of other clients are rejected (ST_BUSY),
+   the lock is released by OP_UNLOCK, after the hold time or when the client disconnects
+replies of the box (ACK, PONG, ...) are not forwarded, a client can not upload a schedule
+or stream a sequence via the daemon
+
+Example:
+--------
+ # daemon, keeps running
+ python jumeg_psycho_daemon.py --socket /tmp/jumeg_evc.sock
+
+ # experiment script, also as EventCode in JuMEGStim
+ from jumeg_psycho_daemon import JuMEG_Psycho_EventCodeClient
+ evc = JuMEG_Psycho_EventCodeClient(path="/tmp/jumeg_evc.sock",name="audio")
+ evc.open()
+ evc.send(16,100)
+ evc.send(32,100,ack=True)
+  -> latency client -> write done in us
+ print(evc.stats())
+ evc.close()
+
+update 10.2026 fb
+"""
+
+import os,sys,json,time,struct,socket,selectors,tempfile,threading,argparse
+from collections import deque
+from warnings import warn
+
+from jumeg_psycho_frame import JuMEG_Psycho_FrameEncoder,FRAME_SIZE
+from jumeg_psycho_wait  import percentile
+
+__version__='2026-10-18-001'
+
+DEFAULT_SOCKET = os.path.join(os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir(),"jumeg_psycho_eventcode.sock")
+MSG            = struct.Struct("<BBHIq") # op, flags / status, code, duration / value, t_ns => 16 bytes
+MSG_MAX_SIZE   = 65536
+
+OP_HELLO,OP_SEND,OP_FRAME,OP_SEND_AT,OP_LOCK,OP_UNLOCK,OP_PING,OP_STATS,OP_SYNC = range(1,10)
+FLAG_ACK = 1
+ST_OK,ST_BUSY,ST_ERROR = range(3)
+
+
+class _Client(object):
+    """ daemon side state of one connected client """
+    def __init__(self,sock,history=4096):
+        self.sock    = sock
+        self.name    = "fd{}".format(sock.fileno())
+        self.lock    = threading.Lock() # replies from the loop and the writer thread
+        self.n       = 0
+        self.busy    = 0
+        self.t_recv  = deque(maxlen=history) # us, client send -> daemon receive
+        self.t_write = deque(maxlen=history) # us, client send -> write done
+
+    def reply(self,op,status,value,t_ns,payload=b""):
+        try:
+            with self.lock:
+                 self.sock.send( MSG.pack(op,status,0,int(value) & 0xFFFFFFFF,t_ns) + payload )
+        except OSError:
+            pass # client gone
+
+    def stats(self):
+        r,w = list(self.t_recv),list(self.t_write)
+        return {"n":self.n,"busy":self.busy,
+                "recv_p50_us":percentile(r,50),"recv_p99_us":percentile(r,99),"recv_max_us":max(r) if r else float("nan"),
+                "write_p50_us":percentile(w,50),"write_p99_us":percentile(w,99),"write_max_us":max(w) if w else float("nan")}
+
+
+class JuMEG_Psycho_EventCodeDaemon(object):
+    """
+    owns one JuMEG_Psycho_EventCode (async_mode) and serves clients on a Unix domain socket
+
+    :param path  : socket path <DEFAULT_SOCKET>
+    :param evc   : open JuMEG_Psycho_EventCode, None: a new one is opened with <kwargs> in start()
+    :param sync_n: number of pings for the clock sync at start, 0: no sync
+    :param kwargs: parameter for a new JuMEG_Psycho_EventCode e.g. port, baudrate, journal
+    """
+    def __init__(self,path=DEFAULT_SOCKET,evc=None,sync_n=16,verbose=False,**kwargs):
+        super().__init__()
+        self.path     = path
+        self.sync_n   = sync_n
+        self.verbose  = verbose
+        self._kwargs  = kwargs
+        self._evc     = evc
+        self._sock    = None
+        self._sel     = None
+        self._clients = dict()
+        self._thread  = None
+        self._running = False
+        self._owner   = None # client holding the lock
+        self._owner_t_end = 0
+   #---
+    @property
+    def evc(self): return self._evc
+   #---
+    @property
+    def isRunning(self): return self._running
+   #---
+    @property
+    def clients(self): return list(self._clients.values())
+
+    def stats(self):
+        """ per client statistics, latencies in us """
+        return { c.name: c.stats() for c in self._clients.values() }
+
+   #--- start / stop
+    def open(self):
+        """ open the box (if not done) and bind the socket """
+        kw    = dict(self._kwargs)
+        port  = kw.pop("port",None)
+        reset = kw.pop("reset",None)
+        if self._evc is None:
+           from jumeg_psycho_eventcode import JuMEG_Psycho_EventCode
+           self._evc = JuMEG_Psycho_EventCode(async_mode=True,**kw)
+           if port:
+              self._evc.find_port = False
+        if not self._evc.isConnected and not self._evc.open(port=port,reset=reset):
+           warn("---> ERROR daemon can not connect Arduino\n")
+           return False
+        self._evc.async_mode = True
+        if self.sync_n:
+           self._evc.syncClock(n=self.sync_n)
+        self._bind()
+        return True
+
+    def _bind(self):
+        if os.path.exists(self.path):
+           try: # a running daemon answers, a stale socket file is removed
+               s = socket.socket(socket.AF_UNIX,socket.SOCK_SEQPACKET)
+               s.connect(self.path)
+               s.close()
+               raise RuntimeError("ERROR daemon already running on socket: {}".format(self.path))
+           except (ConnectionRefusedError,FileNotFoundError):
+               os.remove(self.path)
+        self._sock = socket.socket(socket.AF_UNIX,socket.SOCK_SEQPACKET)
+        self._sock.bind(self.path)
+        self._sock.listen(16)
+        self._sock.setblocking(False)
+        self._sel = selectors.DefaultSelector()
+        self._sel.register(self._sock,selectors.EVENT_READ,None)
+        print("---> daemon: Arduino {} on socket: {}".format(self._evc.ComPort,self.path))
+
+    def start(self):
+        """ open and serve in a background thread """
+        if self._running:
+           return True
+        if not self.open():
+           return False
+        self._running = True
+        self._thread  = threading.Thread(target=self._serve,name="JuMEG_Psycho_EventCodeDaemon",daemon=True)
+        self._thread.start()
+        return True
+
+    def serve_forever(self):
+        """ open and serve in this thread till stop() or KeyboardInterrupt """
+        if not self.open():
+           return False
+        self._running = True
+        try:
+            self._serve()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.close()
+        return True
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None and self._thread is not threading.current_thread():
+           self._thread.join(2.0)
+        self._thread = None
+
+    def close(self):
+        """ stop serving, disconnect clients, close the box """
+        self.stop()
+        for c in list(self._clients.values()):
+            self._drop(c)
+        if self._sel:
+           self._sel.close()
+           self._sel = None
+        if self._sock:
+           self._sock.close()
+           self._sock = None
+           try:
+               os.remove(self.path)
+           except OSError:
+               pass
+        if self._evc is not None and self._evc.isConnected:
+           self._evc.close()
+
+   #--- loop
+    def _serve(self):
+        while self._running:
+              for key,_ in self._sel.select(timeout=0.1):
+                  if key.data is None:
+                     self._accept()
+                  else:
+                     self._read(key.data)
+              if self._owner is not None and self._owner_t_end and time.monotonic_ns() > self._owner_t_end:
+                 self._owner = None
+        self._running = False
+
+    def _accept(self):
+        try:
+            sock,_ = self._sock.accept()
+        except OSError:
+            return
+        c = _Client(sock)
+        self._clients[sock.fileno()] = c
+        self._sel.register(sock,selectors.EVENT_READ,c)
+
+    def _drop(self,c):
+        if self._owner is c:
+           self._owner = None
+        self._clients.pop(c.sock.fileno(),None)
+        try:
+            self._sel.unregister(c.sock)
+        except (KeyError,ValueError):
+            pass
+        if self.verbose:
+           print(" --> daemon: client {} disconnected: {}".format(c.name,c.stats()))
+        c.sock.close()
+
+    def _read(self,c):
+        try:
+            msg = c.sock.recv(MSG_MAX_SIZE)
+        except OSError:
+            msg = b""
+        t_recv = time.monotonic_ns()
+        if len(msg) < MSG.size:
+           self._drop(c)
+           return
+        op,flags,code,duration,t_ns = MSG.unpack_from(msg)
+        c.t_recv.append( (t_recv - t_ns) * 1.0e-3 )
+        self._dispatch(c,op,flags,code,duration,t_ns,msg[MSG.size:],t_recv)
+
+    def _busy(self,c):
+        """ lock held by another client """
+        return self._owner is not None and self._owner is not c
+
+    def _write_done(self,c,op,flags,t_ns):
+        """ writer thread callback: latency client send -> write done """
+        def done(rec):
+            dt = (rec.t_write_done - t_ns) * 1.0e-3
+            c.t_write.append(dt)
+            if flags & FLAG_ACK:
+               c.reply(op,ST_ERROR if rec.error else ST_OK,dt,t_ns)
+        return done
+
+    def _dispatch(self,c,op,flags,code,duration,t_ns,payload,t_recv):
+        evc = self._evc
+        if op in (OP_SEND,OP_FRAME,OP_SEND_AT):
+           c.n += 1
+           if self._busy(c):
+              c.busy += 1
+              if flags & FLAG_ACK:
+                 c.reply(op,ST_BUSY,0,t_ns)
+              return
+           if op == OP_SEND:
+              evc.sendFrame( evc.encode(eventcode=code,duration_ms=duration),callback=self._write_done(c,op,flags,t_ns) )
+           elif op == OP_FRAME:
+              if len(payload) < FRAME_SIZE:
+                 c.reply(op,ST_ERROR,0,t_ns)
+                 return
+              evc.sendFrame(payload,callback=self._write_done(c,op,flags,t_ns))
+           else:
+              t_at  = struct.unpack_from("<q",payload)[0] if len(payload) >= 8 else t_ns
+              t_dev = evc.send_at(eventcode=code,t_ns=t_at,duration_ms=duration)
+              if flags & FLAG_ACK:
+                 c.reply(op,ST_ERROR if t_dev is None else ST_OK,t_dev or 0,t_ns)
+        elif op == OP_HELLO:
+           c.name = payload.decode("utf-8","replace") or c.name
+           if self.verbose:
+              print(" --> daemon: client connected: {}".format(c.name))
+           c.reply(op,ST_OK if evc.isConnected else ST_ERROR,evc.duration_ms,t_ns)
+        elif op == OP_PING:
+           c.reply(op,ST_OK,(t_recv - t_ns) * 1.0e-3,t_ns)
+        elif op == OP_LOCK:
+           if self._busy(c):
+              c.busy += 1
+              c.reply(op,ST_BUSY,0,t_ns)
+              return
+           self._owner       = c
+           self._owner_t_end = t_recv + duration * 1000000 if duration else 0
+           c.reply(op,ST_OK,0,t_ns)
+        elif op == OP_UNLOCK:
+           if self._owner is c:
+              self._owner = None
+           c.reply(op,ST_OK,0,t_ns)
+        elif op == OP_STATS:
+           c.reply(op,ST_OK,len(self._clients),t_ns,json.dumps(self.stats()).encode())
+        elif op == OP_SYNC:
+           res = evc.syncClock(n=code or 16) # blocks the daemon loop for n pings
+           c.reply(op,ST_OK if res else ST_ERROR,0,t_ns,json.dumps(res).encode())
+        else:
+           c.reply(op,ST_ERROR,0,t_ns)
+
+
+class JuMEG_Psycho_EventCodeClient(object):
+    """
+    client of JuMEG_Psycho_EventCodeDaemon, send API of JuMEG_Psycho_EventCode,
+    can be used as EventCode in JuMEGStim
+
+    :param path       : socket path of the daemon <DEFAULT_SOCKET>
+    :param name       : client name in the daemon statistics
+    :param duration_ms: default duration
+    :param timeout    : reply timeout in s
+    """
+    def __init__(self,path=DEFAULT_SOCKET,name=None,duration_ms=200,startcode=128,timeout=1.0):
+        super().__init__()
+        self.path        = path
+        self.name        = name or "{}:{}".format(os.path.basename(sys.argv[0]) or "python",os.getpid())
+        self.duration_ms = duration_ms
+        self.startcode   = startcode
+        self.timeout     = timeout
+        self._sock       = None
+        self._lock       = threading.Lock()
+        self._encoder    = JuMEG_Psycho_FrameEncoder()
+   #---
+    @property
+    def isConnected(self): return self._sock is not None
+   #---
+    @property
+    def encoder(self): return self._encoder
+
+    def open(self):
+        """ connect to the daemon, no serial open, no reset """
+        if self._sock is not None:
+           return True
+        try:
+            self._sock = socket.socket(socket.AF_UNIX,socket.SOCK_SEQPACKET)
+            self._sock.connect(self.path)
+        except OSError as e:
+            warn("---> ERROR can not connect eventcode daemon: {} => {}\n".format(self.path,e))
+            self._sock = None
+            return False
+        status,_,_ = self._request(OP_HELLO,payload=self.name.encode())
+        if status != ST_OK:
+           warn("---> WARNING eventcode daemon: Arduino not connected\n")
+        return True
+
+    def close(self):
+        if self._sock is not None:
+           self._sock.close()
+           self._sock = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self,*args):
+        self.close()
+
+    def _send(self,op,flags=0,code=0,duration=0,payload=b"",t_ns=None):
+        if t_ns is None:
+           t_ns = time.monotonic_ns()
+        self._sock.send( MSG.pack(op,flags,code & 0xFFFF,duration & 0xFFFFFFFF,t_ns) + payload )
+        return t_ns
+
+    def _request(self,op,code=0,duration=0,payload=b"",flags=FLAG_ACK):
+        """
+        send and wait for the reply
+        :return:
+          status,value,payload   status None on timeout
+        """
+        if self._sock is None:
+           return None,0,b""
+        with self._lock:
+             t_ns  = self._send(op,flags,code,duration,payload)
+             t_end = time.monotonic() + self.timeout
+             while True:
+                   dt = t_end - time.monotonic()
+                   if dt <= 0:
+                      return None,0,b""
+                   self._sock.settimeout(dt)
+                   try:
+                       msg = self._sock.recv(MSG_MAX_SIZE)
+                   except socket.timeout:
+                       return None,0,b""
+                   finally:
+                       self._sock.settimeout(None)
+                   if len(msg) < MSG.size:
+                      return None,0,b""
+                   rop,status,_,value,rt = MSG.unpack_from(msg)
+                   if rop == op and rt == t_ns: # skip late replies of timed out requests
+                      return status,value,msg[MSG.size:]
+
+    def _duration(self,duration_ms):
+        return self.duration_ms if duration_ms == -1 else duration_ms
+
+    def send(self,eventcode=0,duration_ms=-1,ack=False):
+        """
+        :param ack: wait till the daemon wrote the frame
+        :return:
+          ack: latency client -> write done in us, None on error / busy; else None
+        """
+        if not ack:
+           self._send(OP_SEND,0,eventcode or 0,self._duration(duration_ms))
+           return None
+        status,value,_ = self._request(OP_SEND,eventcode or 0,self._duration(duration_ms))
+        return value if status == ST_OK else None
+
+    def sendEventCode(self,eventcode=0,duration_ms=-1):
+        self.send(eventcode=eventcode,duration_ms=duration_ms)
+
+    def sendStartCode(self,startcode=None,duration_ms=-1):
+        self.send(eventcode=startcode or self.startcode,duration_ms=duration_ms)
+
+    def encode(self,eventcode=0,duration_ms=-1):
+        """ pre-encoded switch-on frame for sendFrame() """
+        return self._encoder.switch_on(eventcode or 0,self._duration(duration_ms))
+
+    def sendFrame(self,frame,callback=None,ack=False):
+        """ pre-encoded v1 frame e.g. encode() or encoder.switch_off, <callback> is ignored """
+        if not ack:
+           self._send(OP_FRAME,payload=bytes(frame))
+           return None
+        status,value,_ = self._request(OP_FRAME,payload=bytes(frame))
+        return value if status == ST_OK else None
+
+    def sendSwitchOff(self):
+        self.sendFrame(self._encoder.switch_off)
+
+    def send_at(self,eventcode=0,t_ns=None,duration_ms=-1,callback=None):
+        """
+        switch on at host time <t_ns> time.monotonic_ns(), the daemon converts with its clock sync
+        :return:
+          target device time in us (32 bit), None if the daemon clock is not synced
+        """
+        status,value,_ = self._request(OP_SEND_AT,eventcode or 0,self._duration(duration_ms),
+                                       payload=struct.pack("<q",time.monotonic_ns() if t_ns is None else t_ns))
+        return value if status == ST_OK else None
+
+    def syncClock(self,n=16,interval=0.005,timeout=None):
+        """ clock sync of the daemon, blocks the daemon for <n> pings, returns syncClock result dict """
+        status,_,payload = self._request(OP_SYNC,n)
+        return json.loads(payload) if status == ST_OK else None
+
+    def lock(self,hold_ms=0):
+        """
+        exclusive use of the box, sends of other clients are rejected
+        :param hold_ms: lock is released after <hold_ms>, 0: till unlock() or close()
+        :return:
+          True if locked
+        """
+        return self._request(OP_LOCK,duration=hold_ms)[0] == ST_OK
+
+    def unlock(self):
+        return self._request(OP_UNLOCK)[0] == ST_OK
+
+    def ping(self):
+        """
+        :return:
+          round trip client -> daemon -> client in us, None on timeout
+        """
+        t0 = time.monotonic_ns()
+        status,_,_ = self._request(OP_PING)
+        return (time.monotonic_ns() - t0) * 1.0e-3 if status == ST_OK else None
+
+    def stats(self):
+        """ per client statistics of the daemon, latencies in us """
+        status,_,payload = self._request(OP_STATS)
+        return json.loads(payload) if status == ST_OK else None
+
+
+def get_args(argv=None):
+    opt = argparse.ArgumentParser(description="JuMEG Arduino eventcode daemon")
+    opt.add_argument("-s","--socket",default=DEFAULT_SOCKET,help="Unix domain socket path")
+    opt.add_argument("-p","--port",default=None,help="serial port, default: find port via vendor id")
+    opt.add_argument("-b","--baudrate",type=int,default=115200)
+    opt.add_argument("--no-reset",action="store_true",help="do not reset a running Arduino on open")
+    opt.add_argument("--journal",default=None,help="journal file, every sent code is logged")
+    opt.add_argument("--sync",type=int,default=16,help="pings for the clock sync at start, 0: off")
+    opt.add_argument("-v","--verbose",action="store_true")
+    return opt.parse_args(argv)
+
+
+def main(argv=None):
+    args = get_args(argv)
+    kw   = dict(baudrate=args.baudrate,journal=args.journal,verbose=args.verbose,reset=not args.no_reset)
+    if args.port:
+       kw["port"] = args.port
+    daemon = JuMEG_Psycho_EventCodeDaemon(path=args.socket,sync_n=args.sync,verbose=args.verbose,**kw)
+    return 0 if daemon.serve_forever() else 1
+
+
+if __name__ == "__main__":
+   sys.exit( main() )
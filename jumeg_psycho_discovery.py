@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+find the JuMEG Arduino eventcode box
+
+ 1. warm start: match the cached device identity (USB VID/PID/serial from sysfs)
+                and open exactly this port
+ 2. cold start: probe all candidate ports concurrently with a timeout-based
+                vendor-ID handshake (123,123,123,123,123,123,123 -> "123")
+
+sysfs: /sys/class/tty/ttyACM0/device -> USB interface, idVendor/idProduct/serial in the parent USB device
+
+the cache also keeps the negotiated baudrate per device (USB identity or port),
+a box kept running (reset=False) at a negotiated rate is probed at this rate too
+
+update 10.2026 fb
+"""
+
+import os,glob,json,time,threading
+from concurrent.futures import ThreadPoolExecutor
+from warnings import warn
+
+import serial
+
+from jumeg_psycho_frame import DEVICE_READY
+
+__version__='2026-10-18-001'
+
+#--- USB vendor ids: Arduino LLC, Arduino SRL, FTDI, WCH CH340
+ARDUINO_USB_VENDOR_IDS = ("2341","2a03","0403","1a86")
+SYSFS_TTY_PATH         = "/sys/class/tty"
+CACHE_FILE             = os.path.join(os.path.expanduser("~"),".cache","jumeg","jumeg_psycho_eventcode.json")
+
+
+def hold_dtr(ser):
+    """
+    clear HUPCL on an open port: DTR stays asserted after close,
+    the next open does not toggle DTR and does not reset the Arduino
+
+    :param ser: open serial.Serial
+    :return:
+      True on success
+    """
+    try:
+        import termios
+        attr = termios.tcgetattr(ser.fd)
+        attr[2] &= ~termios.HUPCL
+        termios.tcsetattr(ser.fd,termios.TCSANOW,attr)
+    except Exception as e: # ImportError (no POSIX), termios.error
+        warn(" --> WARNING can not hold DTR: {}".format(e))
+        return False
+    return True
+
+
+def usb_info(port):
+    """
+    read USB identity of a tty port from sysfs
+
+    :param port: e.g. /dev/ttyACM0
+    :return:
+      dict with keys: vid,pid,serial,manufacturer,product or None
+    """
+    dev = os.path.join(SYSFS_TTY_PATH,os.path.basename(port),"device")
+    if not os.path.exists(dev):
+       return None
+    path = os.path.realpath(dev)
+   #--- walk up from USB interface to USB device
+    while path and path != os.path.sep:
+          if os.path.isfile(os.path.join(path,"idVendor")):
+             info = dict()
+             for k,f in (("vid","idVendor"),("pid","idProduct"),("serial","serial"),("manufacturer","manufacturer"),("product","product")):
+                 try:
+                     with open(os.path.join(path,f)) as fd:
+                          info[k] = fd.read().strip()
+                 except OSError:
+                     info[k] = None
+             return info
+          path = os.path.dirname(path)
+    return None
+
+
+class JuMEG_Psycho_PortDiscovery(object):
+    """
+    parallel, sleep-free port discovery with persistent device cache
+
+    Example:
+    --------
+     from jumeg_psycho_discovery import JuMEG_Psycho_PortDiscovery
+     disc = JuMEG_Psycho_PortDiscovery()
+     port,ser = disc.find()
+    """
+    def __init__(self,**kwargs):
+        super().__init__()
+        self.port_pattern   = '/dev/ttyACM[0-9]*'
+        self.baudrate       = 115200
+        self.vendor_id_code = 123
+        self.vendor_id_frame= bytes([123]*7)
+        self.timeout        = 3.0  # s, covers the bootloader reset after open
+        self.retry_interval = 0.25 # s, resend vendor id frame
+        self.cache_file     = CACHE_FILE
+        self.use_cache      = True
+        self.use_sysfs      = True
+        self.reset          = True # False: keep DTR asserted, see hold_dtr()
+        self.max_workers    = 8
+        self.verbose        = False
+        self._update_from_kwargs(**kwargs)
+
+    def _update_from_kwargs(self,**kwargs):
+        for k in ("port_pattern","baudrate","vendor_id_code","vendor_id_frame","timeout","retry_interval",
+                  "cache_file","use_cache","use_sysfs","reset","max_workers","verbose"):
+            setattr(self,k,kwargs.get(k,getattr(self,k)))
+
+   #--- cache
+    def load_cache(self):
+        """
+        :return:
+          cached device identity dict or None
+        """
+        if not self.use_cache:
+           return None
+        try:
+            with open(self.cache_file) as fd:
+                 return json.load(fd).get("last")
+        except (OSError,ValueError):
+            return None
+
+    def save_cache(self,port):
+        """ save identity of <port> as last good device """
+        if not self.use_cache:
+           return False
+        identity = dict(port=port)
+        info = usb_info(port) if self.use_sysfs else None
+        if info:
+           identity.update(info)
+        return self._update_cache(last=identity)
+
+    def device_key(self,port):
+        """
+        :return:
+          key of the device on <port> in the cache: vid:pid:serial from sysfs, else the port
+        """
+        info = usb_info(port) if self.use_sysfs else None
+        if info and info.get("vid"):
+           return "{}:{}:{}".format(info.get("vid"),info.get("pid"),info.get("serial"))
+        return port
+
+    def load_baudrate(self,port):
+        """
+        :return:
+          negotiated baudrate of the device on <port> or None
+        """
+        if not self.use_cache:
+           return None
+        try:
+            with open(self.cache_file) as fd:
+                 return json.load(fd).get("baudrate",dict()).get(self.device_key(port))
+        except (OSError,ValueError,AttributeError):
+            return None
+
+    def save_baudrate(self,port,baudrate):
+        """ save the negotiated <baudrate> of the device on <port> """
+        if not self.use_cache:
+           return False
+        rates = dict()
+        try:
+            with open(self.cache_file) as fd:
+                 rates = json.load(fd).get("baudrate",dict())
+        except (OSError,ValueError,AttributeError):
+            pass
+        rates[self.device_key(port)] = int(baudrate)
+        return self._update_cache(baudrate=rates)
+
+    def _update_cache(self,**kwargs):
+        """ update keys in the cache file, atomic replace """
+        try:
+            data = dict()
+            if os.path.isfile(self.cache_file):
+               with open(self.cache_file) as fd:
+                    data = json.load(fd)
+            data.update(kwargs)
+            os.makedirs(os.path.dirname(self.cache_file),exist_ok=True)
+            tmp = self.cache_file + ".tmp"
+            with open(tmp,"w") as fd:
+                 json.dump(data,fd,indent=2)
+            os.replace(tmp,self.cache_file)
+        except (OSError,ValueError) as e:
+            warn(" --> WARNING can not write device cache: {} => {}".format(self.cache_file,e))
+            return False
+        return True
+
+   #--- ports
+    def candidates(self):
+        """
+        all ports matching <port_pattern>, ranked: Arduino-like USB vendor ids first,
+        then ports without USB info, then other vendor ids e.g. CP210x 10c4 clone bridges
+
+        :return:
+          list of ports
+        """
+        ports = sorted( glob.glob(self.port_pattern) )
+        if not self.use_sysfs:
+           return ports
+        first,other,last = [],[],[]
+        for p in ports:
+            info = usb_info(p)
+            if info is None:
+               other.append(p)
+            elif (info.get("vid") or "").lower() in ARDUINO_USB_VENDOR_IDS:
+               first.append(p)
+            else:
+               last.append(p)
+        return first + other + last
+
+    def cached_port(self,ports=None):
+        """
+        port matching the cached device identity
+        USB serial number wins over port name, port names change on replug
+
+        :return:
+          port or None
+        """
+        identity = self.load_cache()
+        if not identity:
+           return None
+        if ports is None:
+           ports = glob.glob(self.port_pattern)
+        if self.use_sysfs and identity.get("vid"):
+           for p in ports:
+               info = usb_info(p)
+               if not info:
+                  continue
+               if info.get("vid") == identity.get("vid") and info.get("pid") == identity.get("pid"):
+                  if identity.get("serial") is None or info.get("serial") == identity.get("serial"):
+                     return p
+           return None
+        if identity.get("port") in ports:
+           return identity.get("port")
+        return None
+
+   #--- handshake
+    def handshake(self,ser,abort=None):
+        """
+        vendor id handshake on an open port
+        the vendor id frame is resend every <retry_interval> until the Arduino
+        answers or <timeout> is reached, no fixed sleeps
+        the DEVICE_READY byte after a bootloader reset triggers an immediate resend
+
+        :param ser  : open serial.Serial
+        :param abort: threading.Event, stop e.g. another port was found
+        :return:
+          True if the Arduino answered with the vendor id
+        """
+        timeout  = ser.timeout
+        ser.timeout = 0.02
+        reply    = str(self.vendor_id_code).encode()
+        buf      = b""
+        t_end    = time.monotonic() + self.timeout
+        t_send   = 0.0
+        port     = ser.port
+        try:
+            while time.monotonic() < t_end:
+                  if abort is not None and abort.is_set():
+                     break
+                  if time.monotonic() >= t_send:
+                     ser.write(self.vendor_id_frame)
+                     t_send = time.monotonic() + self.retry_interval
+                  data = ser.read(max(1,ser.in_waiting))
+                  if DEVICE_READY in data:
+                     data   = data.replace(DEVICE_READY,b"")
+                     t_send = 0.0
+                  buf += data
+                  lines = buf.split(b"\n")
+                  buf   = lines.pop()
+                  if any( l.strip() == reply for l in lines ):
+                     ser.reset_input_buffer()
+                     ser.timeout = timeout
+                     if self.verbose:
+                        print(" --> probe {}: found vendor id {}".format(port,self.vendor_id_code))
+                     return True
+        except (serial.SerialException,OSError) as e:
+            if self.verbose:
+               print(" --> probe {}: {}".format(port,e))
+        ser.timeout = timeout
+        return False
+
+    def handshake_cached(self,ser,abort=None):
+        """
+        vendor id handshake at <baudrate>, a box kept running (reset=False)
+        may still run at its negotiated baudrate from the cache: second handshake at this rate
+
+        :param ser  : open serial.Serial, <ser.baudrate> is the rate of the box on success
+        :param abort: threading.Event, stop e.g. another port was found
+        :return:
+          True if the Arduino answered with the vendor id
+        """
+        if self.handshake(ser,abort=abort):
+           return True
+        baudrate = None if self.reset else self.load_baudrate(ser.port)
+        if not baudrate or baudrate == ser.baudrate or (abort is not None and abort.is_set()):
+           return False
+        try:
+            ser.baudrate = baudrate
+        except (serial.SerialException,OSError,ValueError):
+            return False
+        return self.handshake(ser,abort=abort)
+
+    def probe(self,port,abort=None):
+        """
+        open port and run the vendor id handshake
+
+        :param port : port
+        :param abort: threading.Event, stop probing e.g. another port was found
+        :return:
+          open serial.Serial or None
+        """
+        try:
+            ser = serial.Serial(port,int(self.baudrate),timeout=0.02,write_timeout=1.0)
+        except (serial.SerialException,OSError,ValueError) as e:
+            if self.verbose:
+               print(" --> probe {}: can not open: {}".format(port,e))
+            return None
+        if not self.reset:
+           hold_dtr(ser)
+        if self.handshake_cached(ser,abort=abort):
+           return ser
+        ser.close()
+        return None
+
+    def find(self):
+        """
+        find Arduino port
+
+        :return:
+          port,serial.Serial  or None,None
+        """
+        ports = self.candidates()
+        if self.verbose:
+           print(" --> Find Arduino Port Event/Trigger-Code: ")
+           print(" --> ports:  {}".format(ports))
+
+       #--- warm start
+        port = self.cached_port(ports)
+        if port:
+           ser = self.probe(port)
+           if ser:
+              self.save_cache(port)
+              return port,ser
+           ports = [p for p in ports if p != port]
+
+       #--- cold start, probe concurrently
+        if not ports:
+           return None,None
+
+        found = []
+        abort = threading.Event()
+        lock  = threading.Lock()
+        def _probe(p):
+            ser = self.probe(p,abort=abort)
+            if ser:
+               with lock:
+                    if abort.is_set():
+                       ser.close()
+                       return
+                    abort.set()
+                    found.append( (p,ser) )
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers,len(ports))) as pool:
+             list( pool.map(_probe,ports) )
+
+        if not found:
+           return None,None
+        port,ser = found[0]
+        self.save_cache(port)
+        return port,ser
+
+    def find_all(self,ports=None):
+        """
+        find all Arduino ports e.g. one box for MEG and one for EEG, all ports are probed concurrently
+
+        :param ports: ports to probe <candidates()>
+        :return:
+          list of (port,serial.Serial) sorted by port
+        """
+        if ports is None:
+           ports = self.candidates()
+        if not ports:
+           return []
+        found = []
+        lock  = threading.Lock()
+        def _probe(p):
+            ser = self.probe(p)
+            if ser:
+               with lock:
+                    found.append( (p,ser) )
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers,len(ports))) as pool:
+             list( pool.map(_probe,ports) )
+        found.sort(key=lambda x: x[0])
+        if found:
+           self.save_cache(found[0][0])
+        if self.verbose:
+           print(" --> found Arduino ports: {}".format([p for p,_ in found]))
+        return found
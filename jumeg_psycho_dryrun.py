@@ -0,0 +1,452 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+virtual clock dry-run of JuMEGStim experiment scripts
+
+no psychopy window, no Arduino, no waiting: the stand-ins advance a virtual clock
+ stub window : flips on a vsync grid of <refresh_hz>, a flip is ready after <render_ms> + <draw_ms> per drawn stimulus,
+               a late frame lands on a later vsync (missed frames)
+ null device : eventcode API of JuMEG_Psycho_EventCode, a write costs the frame transmit time at <baudrate>
+ core / event: core.getTime(), core.wait(), core.Clock, event.waitKeys() answers after <key_delay_ms>
+               e.g. the IOD toggle key of the photodiode box in WaitForIODOnScreen
+ wait        : WaitForSec advances the clock to the deadline
+
+every flip, trigger, wait and key is logged in the timeline: predicted trigger and flip times,
+missed frames and cut triggers (next code before the end of the previous pulse) show budget overruns
+
+Example:
+--------
+ from jumeg_psycho_dryrun import JuMEG_Psycho_DryRun
+ dry   = JuMEG_Psycho_DryRun(refresh_hz=120,render_ms=4.0)
+ jSTIM = JuMEGStim(dry_run=dry)
+ ... experiment loop ...
+ print(dry.summary())
+ dry.to_csv("run01_timeline.csv")
+
+ # whole script, psychopy imports of the script get the stand-ins
+ python jumeg_psycho_dryrun.py --refresh-hz 120 --render-ms 4 --csv timeline.csv my_experiment.py
+
+update 10.2026 fb
+"""
+
+import sys,math,time,types,runpy,argparse
+from collections import namedtuple
+
+from jumeg_psycho_frame import JuMEG_Psycho_FrameEncoder,FRAME_SIZE,SWITCH_ON_AT_SIZE
+from jumeg_psycho_wait  import JuMEG_Psycho_PrecisionWait
+
+__version__='2026-10-18-001'
+
+#--- timeline: t virtual time in s
+#    flip   : value missed frames
+#    trigger: code, value duration in ms, t: switch-on at the Arduino
+#    wait   : value wait time in s
+#    key    : value key delay in s, code 0: timeout
+TimelineEvent = namedtuple("TimelineEvent",["t","kind","code","value"])
+TIMELINE_KINDS = ("flip","trigger","wait","key")
+
+
+class JuMEG_Psycho_VirtualClock(object):
+    """ simulated time in s, only advance() moves it """
+    def __init__(self,t0=0.0):
+        super().__init__()
+        self.t = t0
+
+    def getTime(self):
+        return self.t
+
+    def advance(self,dt):
+        if dt > 0:
+           self.t += dt
+        return self.t
+
+    def advance_to(self,t):
+        if t > self.t:
+           self.t = t
+        return self.t
+
+
+class _Clock(object):
+    """ psychopy core.Clock on the virtual clock """
+    def __init__(self,vclock):
+        self._vclock = vclock
+        self._t0     = vclock.t
+
+    def getTime(self):
+        return self._vclock.t - self._t0
+
+    def reset(self,newT=0.0):
+        self._t0 = self._vclock.t + newT
+
+    def addTime(self,t):
+        self._t0 -= t
+
+
+class _StubStim(object):
+    """ any psychopy visual stimulus: attributes are stored, draw() adds render cost to the next flip """
+    def __init__(self,win=None,*args,**kwargs):
+        super().__init__()
+        self.win      = win
+        self.autoDraw = False
+        self.__dict__.update(kwargs)
+
+    def draw(self,win=None):
+        (win or self.win)._draws += 1
+
+    def setAutoDraw(self,v,log=None):
+        self.autoDraw = v
+        if v:
+           self.win._autodraw.add(self)
+        else:
+           self.win._autodraw.discard(self)
+
+    def __getattr__(self,name):
+        if name.startswith("set"): # setText, setPos, ...
+           attr = name[3].lower() + name[4:]
+           return lambda v=None,*args,**kwargs: setattr(self,attr,v)
+        raise AttributeError(name)
+
+
+class JuMEG_Psycho_StubWindow(object):
+    """
+    psychopy Window stand-in: flips on the vsync grid of the virtual clock
+
+    :param dryrun: JuMEG_Psycho_DryRun
+    """
+    def __init__(self,dryrun,size=(1920,1200),color=(-1.0,-1.0,-1.0),units="pix",**kwargs):
+        super().__init__()
+        self._dryrun  = dryrun
+        self.size     = list(size)
+        self.color    = color
+        self.units    = units
+        self.mouseVisible = True
+        self.monitorFramePeriod = 1.0 / dryrun.refresh_hz
+        self.frameIntervals = []
+        self.recordFrameIntervals = False
+        self._t0      = dryrun.clock.t
+        self._draws   = 0
+        self._autodraw= set()
+        self._on_flip = []
+        self._t_flip  = None
+
+    def callOnFlip(self,function,*args,**kwargs):
+        self._on_flip.append( (function,args,kwargs) )
+
+    def flip(self,clearBuffer=True):
+        """
+        :return:
+          flip time on the virtual clock in s
+        """
+        dry    = self._dryrun
+        period = self.monitorFramePeriod
+        now    = dry.clock.t
+        t_ready= now + 1.0e-3 * (dry.render_ms + dry.draw_ms * (self._draws + len(self._autodraw)))
+        k_next = math.floor( (now - self._t0) / period + 1.0e-9 ) + 1
+        k      = max(k_next,math.ceil( (t_ready - self._t0) / period - 1.0e-9 ))
+        t_flip = dry.clock.advance_to(self._t0 + k * period)
+        if self.recordFrameIntervals and self._t_flip is not None:
+           self.frameIntervals.append(t_flip - self._t_flip)
+        self._t_flip = t_flip
+        self._draws  = 0
+        dry.log("flip",t_flip,value=k - k_next)
+        calls,self._on_flip = self._on_flip,[]
+        for function,args,kwargs in calls:
+            function(*args,**kwargs)
+        return t_flip
+
+    def getActualFrameRate(self,*args,**kwargs):
+        return self._dryrun.refresh_hz
+
+    def close(self):
+        pass
+
+
+class JuMEG_Psycho_NullDevice(object):
+    """
+    eventcode API of JuMEG_Psycho_EventCode without hardware
+    a write advances the virtual clock by the transmit time, the trigger is logged at the end of the transmit
+
+    :param dryrun: JuMEG_Psycho_DryRun
+    """
+    def __init__(self,dryrun,duration_ms=200,startcode=128):
+        super().__init__()
+        self._dryrun     = dryrun
+        self.duration_ms = duration_ms
+        self.startcode   = startcode
+        self._encoder    = JuMEG_Psycho_FrameEncoder()
+        self._isConnected= False
+   #---
+    @property
+    def isConnected(self): return self._isConnected
+
+    def open(self,*args,**kwargs):
+        self._isConnected = True
+        return True
+
+    def close(self):
+        self._isConnected = False
+
+    def _write(self,nbytes):
+        """ host write of <nbytes>, returns the time the Arduino got the frame """
+        dry = self._dryrun
+        return dry.clock.advance(1.0e-6 * (dry.write_overhead_us + nbytes * 10.0e6 / dry.baudrate))
+
+    def encode(self,eventcode=0,duration_ms=-1):
+        if duration_ms == -1:
+           duration_ms = self.duration_ms
+        return self._encoder.switch_on(eventcode or 0,duration_ms)
+
+    def sendFrame(self,frame,callback=None):
+        t = self._write(len(frame))
+        if frame[0] == 111:
+           self._dryrun.log("trigger",t,frame[1] | (frame[2] << 8),int.from_bytes(frame[3:7],"little"))
+
+    def send(self,eventcode=0,duration_ms=-1):
+        self.sendFrame( self.encode(eventcode,duration_ms) )
+
+    def sendEventCode(self,eventcode=0,duration_ms=-1):
+        self.send(eventcode=eventcode,duration_ms=duration_ms)
+
+    def sendStartCode(self,startcode=None,duration_ms=-1):
+        self.send(eventcode=startcode or self.startcode,duration_ms=duration_ms)
+
+    def sendSwitchOff(self):
+        self._write(FRAME_SIZE)
+
+    def send_at(self,eventcode=0,t_ns=None,duration_ms=-1,callback=None):
+        """
+        <t_ns> time.monotonic_ns() is mapped on the virtual clock
+        :return:
+          target device time in us on the virtual clock
+        """
+        dry = self._dryrun
+        t   = dry.clock.t + ( 0.0 if t_ns is None else (t_ns - time.monotonic_ns()) * 1.0e-9 )
+        self._write(SWITCH_ON_AT_SIZE)
+        dry.log("trigger",max(t,dry.clock.t),eventcode or 0,self.duration_ms if duration_ms == -1 else duration_ms)
+        return int(round(t * 1.0e6))
+
+    def syncClock(self,*args,**kwargs):
+        return {"offset_us":0.0,"drift_ppm":0.0}
+
+
+class JuMEG_Psycho_VirtualWait(JuMEG_Psycho_PrecisionWait):
+    """ WaitForSec on the virtual clock: polls once, jumps to the deadline """
+    def __init__(self,dryrun,clock=None,**kwargs):
+        super().__init__(clock=clock or dryrun.clock.getTime,**kwargs)
+        self._dryrun = dryrun
+
+    def wait(self,twait,tstart=None,poll=None):
+        clock = self.clock
+        if tstart is None:
+           tstart = clock()
+        deadline = tstart + twait
+        if poll and poll():
+           return self._record(deadline,clock(),0.0,time.thread_time(),True)
+        self._dryrun.log("wait",self._dryrun.clock.t,value=twait)
+        self._dryrun.clock.advance(deadline - clock())
+        return self._record(deadline,clock(),0.0,time.thread_time(),False)
+
+
+class JuMEG_Psycho_DryRun(object):
+    """
+    virtual clock, stub window, null device and psychopy stand-ins
+
+    :param refresh_hz       : monitor refresh rate
+    :param render_ms        : render cost per flip in ms
+    :param draw_ms          : render cost per drawn stimulus in ms
+    :param key_delay_ms     : event.waitKeys answers after <key_delay_ms> e.g. photodiode IOD key, None: timeout
+    :param baudrate         : transmit time of eventcode frames
+    :param write_overhead_us: host cost per write in us
+    """
+    def __init__(self,refresh_hz=60.0,render_ms=2.0,draw_ms=0.0,key_delay_ms=5.0,baudrate=115200,write_overhead_us=30.0):
+        super().__init__()
+        self.refresh_hz   = refresh_hz
+        self.render_ms    = render_ms
+        self.draw_ms      = draw_ms
+        self.key_delay_ms = key_delay_ms
+        self.baudrate     = baudrate
+        self.write_overhead_us = write_overhead_us
+        self._clock    = JuMEG_Psycho_VirtualClock()
+        self._timeline = []
+        self._device   = None
+        self._t_wall   = time.perf_counter()
+        self.isActive  = 0 # users of the stand-ins in jumeg_stim, see jumeg_stim.import_dryrun()
+        self.visual,self.core,self.event = self._stub_modules()
+   #---
+    @property
+    def clock(self): return self._clock
+   #---
+    @property
+    def timeline(self): return self._timeline
+   #---
+    @property
+    def device(self):
+        """ JuMEG_Psycho_NullDevice, created on first use """
+        if self._device is None:
+           self._device = JuMEG_Psycho_NullDevice(self)
+        return self._device
+
+    def log(self,kind,t,code=0,value=0.0):
+        self._timeline.append( TimelineEvent(t,kind,code,value) )
+
+    def waiter(self,clock=None):
+        """ JuMEG_Psycho_VirtualWait on <clock> e.g. JuMEGStim.clock.getTime """
+        return JuMEG_Psycho_VirtualWait(self,clock=clock)
+
+    def _stub_modules(self):
+        """ psychopy visual, core, event stand-ins as modules, <dry_run> marks them as stand-ins """
+        dry    = self
+        visual = types.ModuleType("psychopy.visual")
+        visual.dry_run = dry
+        visual.Window = lambda size=(1920,1200),**kwargs: JuMEG_Psycho_StubWindow(dry,size=size,**kwargs)
+        def stim(name): # Rect, TextStim, ImageStim, ...
+            if name.startswith("_"):
+               raise AttributeError(name)
+            return _StubStim
+        visual.__getattr__ = stim
+
+        core = types.ModuleType("psychopy.core")
+        core.dry_run = dry
+        core.getTime = dry._clock.getTime
+        core.Clock   = lambda: _Clock(dry._clock)
+        core.MonotonicClock = core.Clock
+        core.wait    = lambda secs,hogCPUperiod=0.2: dry._clock.advance(secs)
+        def quit():
+            raise SystemExit(0)
+        core.quit    = quit
+
+        event = types.ModuleType("psychopy.event")
+        event.dry_run = dry
+        event.getKeys     = lambda keyList=None,*args,**kwargs: []
+        event.clearEvents = lambda eventType=None: None
+        def waitKeys(maxWait=float("inf"),keyList=None,*args,**kwargs):
+            if dry.key_delay_ms is None or dry.key_delay_ms * 1.0e-3 > maxWait:
+               dry._clock.advance(maxWait)
+               dry.log("key",dry._clock.t,value=maxWait)
+               return None
+            dry._clock.advance(dry.key_delay_ms * 1.0e-3)
+            dry.log("key",dry._clock.t,code=1,value=dry.key_delay_ms * 1.0e-3)
+            return [keyList[0] if keyList else "space"]
+        event.waitKeys = waitKeys
+        return visual,core,event
+
+    def install(self):
+        """ stand-ins as sys.modules psychopy, psychopy.visual, ... for scripts importing psychopy """
+        psychopy = types.ModuleType("psychopy")
+        psychopy.visual,psychopy.core,psychopy.event = self.visual,self.core,self.event
+        self._saved = { k: sys.modules.get(k) for k in ("psychopy","psychopy.visual","psychopy.core","psychopy.event") }
+        sys.modules.update({"psychopy":psychopy,"psychopy.visual":self.visual,"psychopy.core":self.core,"psychopy.event":self.event})
+
+    def uninstall(self):
+        for k,v in getattr(self,"_saved",{}).items():
+            if v is None:
+               sys.modules.pop(k,None)
+            else:
+               sys.modules[k] = v
+        self._saved = {}
+
+    def run(self,script,argv=None):
+        """
+        run <script> as __main__ with the stand-ins, core.quit() ends the run
+        jumeg_stim.JuMEGStim in the script uses this dry-run
+
+        :return:
+          self
+        """
+        import jumeg_stim
+        self.install()
+        saved = jumeg_stim.import_dryrun(self)
+        jumeg_stim.JuMEGStim.dry_run_default = self
+        sys_argv,sys.argv = sys.argv,[script] + list(argv or [])
+        self._t_wall = time.perf_counter()
+        try:
+            runpy.run_path(script,run_name="__main__")
+        except SystemExit:
+            pass
+        finally:
+            sys.argv = sys_argv
+            jumeg_stim.JuMEGStim.dry_run_default = None
+            jumeg_stim.restore_psychopy(saved,self)
+            self.uninstall()
+        return self
+
+    def to_numpy(self):
+        """
+        :return:
+          timeline as numpy structured array t, kind, code, value
+        """
+        import numpy as np
+        data = np.zeros(len(self._timeline),dtype=[("t","<f8"),("kind","U8"),("code","<u2"),("value","<f8")])
+        for i,e in enumerate(self._timeline):
+            data[i] = e
+        return data
+
+    def to_csv(self,fname):
+        with open(fname,"w") as f:
+             f.write("t,kind,code,value\n")
+             for e in self._timeline:
+                 f.write("{:.6f},{},{},{:g}\n".format(*e))
+
+    def triggers(self):
+        """ trigger events sorted by switch-on time """
+        return sorted( (e for e in self._timeline if e.kind == "trigger"),key=lambda e: e.t )
+
+    def stats(self):
+        """
+        :return:
+          dict: simulated and wall time in s, flips, missed frames, triggers,
+                cut triggers (next trigger before the end of the pulse), min trigger gap in ms
+        """
+        flips = [e for e in self._timeline if e.kind == "flip"]
+        trig  = self.triggers()
+        cut,gap = 0,float("inf")
+        for a,b in zip(trig[:-1],trig[1:]):
+            dt = (b.t - a.t) * 1.0e3
+            gap = min(gap,dt)
+            if dt < a.value:
+               cut += 1
+        return { "t_sim"         : self._clock.t,
+                 "t_wall"        : time.perf_counter() - self._t_wall,
+                 "flips"         : len(flips),
+                 "missed_frames" : sum(e.value for e in flips),
+                 "late_flips"    : sum(1 for e in flips if e.value),
+                 "triggers"      : len(trig),
+                 "cut_triggers"  : cut,
+                 "min_gap_ms"    : gap if len(trig) > 1 else float("nan"),
+                 "key_timeouts"  : sum(1 for e in self._timeline if e.kind == "key" and not e.code) }
+
+    def summary(self):
+        s = self.stats()
+        return ("---> dry-run: {t_sim:.1f} s simulated in {t_wall:.2f} s\n"
+                "  -> flips: {flips}, late flips: {late_flips}, missed frames: {missed_frames}\n"
+                "  -> triggers: {triggers}, cut by the next trigger: {cut_triggers}, min gap [ms]: {min_gap_ms:.3f}\n"
+                "  -> key timeouts: {key_timeouts}".format(**s))
+
+
+def get_args(argv=None):
+    opt = argparse.ArgumentParser(description="JuMEG virtual clock dry-run of an experiment script")
+    opt.add_argument("script",help="experiment script, run as __main__, options of the dry-run go before the script")
+    opt.add_argument("args",nargs=argparse.REMAINDER,help="arguments of the script")
+    opt.add_argument("--refresh-hz",type=float,default=60.0)
+    opt.add_argument("--render-ms",type=float,default=2.0,help="render cost per flip")
+    opt.add_argument("--draw-ms",type=float,default=0.0,help="render cost per drawn stimulus")
+    opt.add_argument("--key-delay-ms",type=float,default=5.0,help="event.waitKeys answer e.g. IOD key")
+    opt.add_argument("-b","--baudrate",type=int,default=115200)
+    opt.add_argument("--csv",default=None,help="timeline csv file")
+    return opt.parse_args(argv)
+
+
+def main(argv=None):
+    args = get_args(argv)
+    dry  = JuMEG_Psycho_DryRun(refresh_hz=args.refresh_hz,render_ms=args.render_ms,draw_ms=args.draw_ms,
+                               key_delay_ms=args.key_delay_ms,baudrate=args.baudrate)
+    dry.run(args.script,args.args)
+    print(dry.summary())
+    if args.csv:
+       dry.to_csv(args.csv)
+       print(" --> timeline: {}".format(args.csv))
+    return 0
+
+
+if __name__ == "__main__":
+   sys.exit( main() )
@@ -0,0 +1,681 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+software emulator of the jumeg_eventcode01 Arduino firmware on a pty
+
+JuMEG_Psycho_EventCode.open(port=emu.port,reset=False) connects unchanged
+
+emulated:
+ - commands 111 switch on, 112 switch off (+ACK), 123 vendor id, 211 sequence,
+   212/213 seq stream with two chunk buffers, credit / underrun / done replies,
+   214/215 schedule upload (ACK) and playback against the device clock (done reply)
+   216 clock ping (PONG with micros()), 217 edge ack (EDGE packet for every TTL change)
+   218 switch on at device time, fired at the first tick >= T before the other timer handlers
+   219 protocol negotiation, v2 frames: sync, length, CRC, NAK + resync, inter-byte timeout
+   220/221 baudrate trial / confirm with fall back after BAUD_TRIAL_MS, burst test echo,
+   <baudrate_limit>: echoes above this rate are corrupted e.g. a long cable
+ - 7 byte framing as in check_serialEvent(): a command is read when 7 bytes are available,
+   unknown command bytes are dropped one by one
+ - serial wire time per byte (10 bit / baudrate) and the 64 byte RX buffer incl. overflow
+ - Timer5 tick: switch off / next sequence code at the first tick after the end time
+ - SEQ_MAX_DATA_COUNTS: longer sequences are clipped, the rest is read as commands
+ - 16 bit TTL output: eventcode port C bit 0-7, triggercode port A bit 8-15
+
+deterministic use without pty: feed(bytes,t_us) with device times in us
+
+Example:
+--------
+ from jumeg_psycho_emulator import JuMEG_Psycho_Emulator
+ emu = JuMEG_Psycho_Emulator()
+ emu.feed(bytes([111,16,0,10,0,0,0]),t_us=1000.0)
+ emu.advance(20000.0)
+ emu.edges()
+  -> t_us,value: (0.0,0),(1607.6,16),(11800.0,0)
+
+update 10.2026 fb
+"""
+
+import time,threading
+import numpy as np
+
+from jumeg_psycho_frame import (FRAME_SIZE,ACK,DEVICE_READY,SEQ_CREDIT,SEQ_UNDERRUN,SEQ_DONE,
+                                SEQ_CHUNK_BYTES,SEQ_STREAM_START,SEQ_STREAM_CHUNK,
+                                SCHEDULE_DONE,SCHEDULE_LOAD,SCHEDULE_START,SCHEDULE_ENTRY_SIZE,SCHEDULE_MAX_ENTRIES,
+                                PONG,EDGE,CLOCK_PING,EDGE_ACK,SWITCH_ON_AT,SWITCH_ON_AT_SIZE,
+                                PROTOCOL,NAK,V2_NEED,V2_OK,V2_BAD,V2_VENDOR_ID,parse_v2,
+                                BAUDRATE,BAUD_TEST,BAUD_ECHO,BAUD_TRIAL_MS,BAUD_TRIAL,BAUD_CONFIRM)
+from jumeg_psycho_schedule import SCHEDULE_DTYPE
+from jumeg_psycho_pty   import JuMEG_Psycho_PtyDevice
+
+__version__='2026-10-18-001'
+
+TIMER5_INTERVALL_US    = 200
+SEQ_MAX_DATA_COUNTS    = 122
+SERIAL_RX_BUFFER_SIZE  = 64
+SEQ_DEFAULT_DURATION   = 15
+V2_BYTE_TIMEOUT_US     = 2000
+F_CPU                  = 16000000
+BAUD_MIN,BAUD_MAX      = 9600,2000000
+BAUD_MAX_ERROR_PERMILLE= 25
+
+EDGE_DTYPE = np.dtype([("t_us","<f8"),("t_ns","<i8"),("value","<u2")])
+
+
+class _EventCode(object):
+    """ firmware EventCode state """
+    def __init__(self):
+        self.eventcode   = 0
+        self.triggercode = 0
+        self.duration    = 0
+        self.time_end    = 0.0
+        self.isOn        = False
+
+
+class _EventCodeAt(object):
+    """ firmware EventCodeAt state, time_tick: first tick the pending code fires """
+    def __init__(self):
+        self.eventcode   = 0
+        self.triggercode = 0
+        self.duration    = 0
+        self.time_tick   = 0.0
+        self.isPending   = False
+
+
+class _EventCodeSeq(object):
+    """ firmware EventCodeSeq state """
+    def __init__(self):
+        self.duration    = 0
+        self.data        = b""
+        self.data_counts = 0
+        self.data_index  = 0
+        self.time_end    = 0.0
+        self.isOn        = False
+
+
+class _EventCodeStream(object):
+    """ firmware EventCodeStream state """
+    def __init__(self,duration=0):
+        self.duration     = duration if duration > 0 else SEQ_DEFAULT_DURATION
+        self.data         = [b"",b""]
+        self.play_buffer  = 0
+        self.play_index   = 0
+        self.write_buffer = 0
+        self.time_end     = 0.0
+        self.isOn         = False
+        self.isWaiting    = False
+        self.last_chunk   = False
+
+
+class _EventCodeSchedule(object):
+    """ firmware EventCodeSchedule state """
+    def __init__(self,entries=None):
+        self.entries    = np.zeros(0,dtype=SCHEDULE_DTYPE) if entries is None else entries
+        self.index      = 0
+        self.time_start = 0.0
+        self.time_end   = 0.0
+        self.isOn       = False
+        self.codeOn     = False
+
+
+class JuMEG_Psycho_Emulator(JuMEG_Psycho_PtyDevice):
+    """
+    protocol-accurate model of arduino/jumeg_eventcode01
+
+    :param baudrate   : wire time per byte 10 bit/baudrate
+    :param tick_us    : Timer5 interval in us
+    :param rx_buffer  : RX buffer size in bytes
+    :param seq_max    : SEQ_MAX_DATA_COUNTS
+    :param baudrate_limit: burst test echoes above this rate are corrupted, None: no limit
+    """
+    def __init__(self,baudrate=115200,tick_us=TIMER5_INTERVALL_US,rx_buffer=SERIAL_RX_BUFFER_SIZE,
+                 seq_max=SEQ_MAX_DATA_COUNTS,vendor_id_code=123,baudrate_limit=None,verbose=False):
+        super().__init__(vendor_id_code=vendor_id_code,verbose=verbose)
+        self.baudrate  = baudrate
+        self.baudrate_default = baudrate
+        self.baudrate_limit   = baudrate_limit
+        self.tick_us   = tick_us
+        self.rx_buffer = rx_buffer
+        self.seq_max   = seq_max
+        self._model    = threading.RLock()
+        self._commands = { 111: self._cmd_switch_on,
+                           112: self._cmd_switch_off,
+                           123: self._cmd_vendor_id,
+                           211: self._cmd_seq,
+                           SEQ_STREAM_START: self._cmd_stream_start,
+                           SEQ_STREAM_CHUNK: self._cmd_stream_chunk,
+                           SCHEDULE_LOAD   : self._cmd_schedule_load,
+                           SCHEDULE_START  : self._cmd_schedule_start,
+                           CLOCK_PING      : self._cmd_clock_ping,
+                           EDGE_ACK        : self._cmd_edge_ack,
+                           SWITCH_ON_AT    : self._cmd_switch_on_at,
+                           PROTOCOL        : self._cmd_protocol,
+                           BAUDRATE        : self._cmd_baudrate,
+                           BAUD_TEST       : self._cmd_baud_test }
+        self.poll_interval = 0.001 # Timer5 runs without received bytes
+        self.reset()
+
+   #---
+    @property
+    def byte_us(self): return 10.0e6 / self.baudrate
+
+    def reset(self,t_us=0.0):
+        """ power on / bootloader reset """
+        with self._model:
+             self._t0_ns      = time.monotonic_ns() - int(t_us * 1000)
+             self._rx         = bytearray()
+             self._rx_t       = []
+             self._last_arrival = t_us
+             self._busy_until = t_us
+             self._now        = t_us
+             self._ec         = _EventCode()
+             self._at         = _EventCodeAt()
+             self._seq        = _EventCodeSeq()
+             self._stream     = _EventCodeStream()
+             self._schedule   = _EventCodeSchedule()
+             self._edge_ack   = False
+             self._protocol   = 1
+             self.v2_errors   = 0    # v2 frames dropped: header / CRC error, timeout
+             self.baudrate    = self.baudrate_default
+             self._baud_prev  = self.baudrate
+             self._baud_trial = None # fall back time of a trial rate
+             self._value      = 0
+             self._edges      = [(t_us,0)]
+             self.replies     = []   # (t_us,bytes)
+             self.commands    = []   # (t_us,cmd,code,duration)
+             self.rx_overflows= 0
+             self.rx_max_level= 0
+
+    def now_us(self):
+        """ device time micros() of the running pty emulator """
+        return (time.monotonic_ns() - self._t0_ns) * 1.0e-3
+
+    def announce_ready(self):
+        """ send DEVICE_READY as at the end of setup(), call after the host opened the port """
+        self._reply(DEVICE_READY,self._now)
+
+   #--- pty
+    def receive(self,data,t_ns):
+        self.nbytes += len(data)
+        self.feed(data,(t_ns - self._t0_ns) * 1.0e-3)
+
+    def idle(self,t_ns):
+        self.advance((t_ns - self._t0_ns) * 1.0e-3)
+
+    def _reply(self,data,t_us):
+        self.replies.append( (t_us,bytes(data)) )
+        if self.isRunning:
+           self.write(data)
+
+   #--- model
+    def feed(self,data,t_us):
+        """
+        bytes from the host, the first byte starts on the wire at <t_us>
+
+        :param data: bytes
+        :param t_us: device time in us
+        """
+        with self._model:
+             bt = self.byte_us
+             a  = max(t_us,self._last_arrival)
+             for b in data:
+                 a += bt
+                 self._process_until(a)
+                 level = self._rx_level(a)
+                 self.rx_max_level = max(self.rx_max_level,level + 1)
+                 if level >= self.rx_buffer:
+                    self.rx_overflows += 1 # HardwareSerial drops the byte
+                    continue
+                 self._rx.append(b)
+                 self._rx_t.append(a)
+             self._last_arrival = a
+             self._process_until(a)
+
+    def advance(self,t_us=None):
+        """
+        run Timer5 and pending commands till <t_us> <now>
+
+        :param t_us: device time in us
+        """
+        with self._model:
+             if t_us is None:
+                t_us = self.now_us()
+             self._process_until(t_us)
+
+    def _rx_level(self,t):
+        if self._protocol == 2: # loop() moves every byte into the frame buffer
+           return 0
+        n = len(self._rx)
+       #--- payload of a sequence in Serial.readBytes() is read while it arrives
+        if n >= FRAME_SIZE and self._rx[0] in (211,SEQ_STREAM_CHUNK,SCHEDULE_LOAD,BAUD_TEST) and self._rx_t[FRAME_SIZE-1] <= t:
+           n -= min(n,self._cmd_length())
+        return n
+
+    def _cmd_length(self):
+        """ bytes needed for the command at the head of the RX buffer """
+        cmd = self._rx[0]
+        if cmd in (211,BAUD_TEST):
+           return FRAME_SIZE + min(self._rx[1],self.seq_max)
+        if cmd == SEQ_STREAM_CHUNK:
+           return FRAME_SIZE + min(self._rx[1],SEQ_CHUNK_BYTES)
+        if cmd == SCHEDULE_LOAD:
+           return FRAME_SIZE + (self._rx[1] | (self._rx[2] << 8)) * SCHEDULE_ENTRY_SIZE
+        if cmd == SWITCH_ON_AT:
+           return SWITCH_ON_AT_SIZE
+        return FRAME_SIZE
+
+    def _process_v2(self,t):
+        """
+        one step of the v2 parser, frames, NAKs and the vendor id run at the arrival of their last byte
+        :return:
+          True if bytes were consumed
+        """
+        status,used,body = parse_v2(self._rx,self.vendor_id_code)
+        if status == V2_NEED:
+          #--- incomplete frame, dropped after the inter-byte timeout
+           if self._rx and self._rx[0] == 0xA5 and self._rx_t[-1] + V2_BYTE_TIMEOUT_US <= t:
+              t_cmd = self._rx_t[-1] + V2_BYTE_TIMEOUT_US
+              self._timer(t_cmd)
+              self._now = max(self._now,t_cmd)
+              self.v2_errors += 1
+              self._tx(NAK,t_cmd)
+              used = len(self._rx)
+              del self._rx[:used]
+              del self._rx_t[:used]
+              return True
+           return False
+        t_cmd = max(self._rx_t[used-1],self._busy_until)
+        if t_cmd > t:
+           return False
+        self._timer(t_cmd)
+        self._now = t_cmd
+        if status == V2_OK:
+           fct = self._commands.get(body[0])
+           if fct:
+              fct(body,t_cmd)
+        elif status == V2_BAD:
+           self.v2_errors += 1
+           self._tx(NAK,t_cmd)
+        elif status == V2_VENDOR_ID:
+           self._protocol = 1
+           self._tx( "{}\r\n".format(self.vendor_id_code).encode(),t_cmd )
+        del self._rx[:used]
+        del self._rx_t[:used]
+        return True
+
+    def _process_until(self,t):
+        """ process timer ticks and complete commands up to time t """
+        while True:
+              if self._baud_trial is not None and self._baud_trial <= t: # check_baudrate() in loop()
+                 self._baud_trial = None
+                 self.baudrate    = self._baud_prev
+              if self._protocol == 2:
+                 if not self._process_v2(t):
+                    break
+                 continue
+              if len(self._rx) < FRAME_SIZE: # while ( Serial.available() >=7 )
+                 break
+              n = self._cmd_length()
+              if len(self._rx) < n:
+                 break
+              t_cmd = max(self._rx_t[n-1],self._busy_until)
+              if t_cmd > t:
+                 break
+              self._timer(t_cmd)
+              self._now = t_cmd
+              fct = self._commands.get(self._rx[0])
+              if fct:
+                 used = fct(bytes(self._rx[:n]),t_cmd)
+                 if used is None:
+                    used = n
+              else:
+                 used = 1
+              del self._rx[:used]
+              del self._rx_t[:used]
+        self._timer(t)
+        self._now = max(self._now,t)
+
+    def _next_tick(self,t):
+        """ first Timer5 tick with micros() > t """
+        return (int(t // self.tick_us) + 1) * self.tick_us
+
+    def _timer(self,t):
+        """ EventCodeHandler() for all ticks up to t, a pending switch-on-at fires first in its tick """
+        at = self._at
+        while at.isPending and at.time_tick <= t:
+              self._timer_handler(at.time_tick - 0.5 * self.tick_us)
+              at.isPending   = False
+              ec = self._ec
+              ec.eventcode   = at.eventcode
+              ec.triggercode = at.triggercode
+              ec.duration    = at.duration
+              self._switch_on(at.time_tick)
+        self._timer_handler(t)
+
+    def _timer_handler(self,t):
+        while True:
+              if self._schedule.isOn:
+                 tick = self._schedule_next_tick()
+                 if tick > t:
+                    break
+                 self._schedule_update(tick)
+              elif self._stream.isOn:
+                 if self._stream.isWaiting:
+                    break
+                 tick = self._next_tick(self._stream.time_end)
+                 if tick > t:
+                    break
+                 self._stream_next(tick)
+              elif self._seq.isOn and self._seq.duration > 0:
+                 tick = self._next_tick(self._seq.time_end)
+                 if tick > t:
+                    break
+                 self._send_seq(tick)
+              elif self._ec.isOn and self._ec.duration > 0:
+                 tick = self._next_tick(self._ec.time_end)
+                 if tick > t:
+                    break
+                 self._switch_off(tick)
+              else:
+                 break
+
+    def _set_port(self,t,eventcode,triggercode):
+        v = ((triggercode & 0xFF) << 8) | (eventcode & 0xFF)
+        if v != self._value:
+           self._value = v
+           self._edges.append( (t,v) )
+           if self._edge_ack: # reported from loop()
+              self._reply(EDGE + bytes((eventcode & 0xFF,triggercode & 0xFF)) + self._micros(t),t)
+
+    def _switch_on(self,t):
+        ec = self._ec
+        self._set_port(t,ec.eventcode,ec.triggercode)
+        ec.time_end = t + ec.duration * 1000.0
+        ec.isOn     = True
+
+    def _switch_off(self,t):
+        self._set_port(t,0,0)
+        self._ec.time_end = 0.0
+        self._ec.isOn     = False
+
+    def _send_seq(self,t):
+        sq = self._seq
+        if sq.data_index + 1 < sq.data_counts:
+           self._set_port(t,sq.data[sq.data_index],sq.data[sq.data_index+1])
+           sq.data_index += 2
+           sq.time_end = t + sq.duration * 1000.0
+           sq.isOn     = True
+        else:
+           self._seq_reset(t)
+
+    def _seq_reset(self,t):
+        self._set_port(t,0,0)
+        sq = self._seq
+        sq.time_end = 0.0
+        sq.isOn = False
+        sq.data_counts = sq.data_index = 0
+
+    def _stream_next(self,t):
+        st = self._stream
+        data = st.data[st.play_buffer]
+        if st.play_index + 1 < len(data):
+           self._set_port(t,data[st.play_index],data[st.play_index+1])
+           st.play_index += 2
+           st.time_end  = t + st.duration * 1000.0
+           st.isWaiting = False
+           return
+       #--- buffer played -> credit, switch buffer; replies are sent from loop()
+        if data:
+           st.data[st.play_buffer] = b""
+           self._reply(SEQ_CREDIT,t)
+        st.play_buffer ^= 1
+        st.play_index   = 0
+        if st.data[st.play_buffer]:
+           return self._stream_next(t)
+        if st.last_chunk:
+           self._stream_stop(t)
+           self._reply(SEQ_DONE,t)
+           return
+        self._set_port(t,0,0)
+        if not st.isWaiting:
+           self._reply(SEQ_UNDERRUN,t)
+        st.isWaiting = True
+
+    def _stream_stop(self,t):
+        self._set_port(t,0,0)
+        self._stream.isOn      = False
+        self._stream.isWaiting = False
+
+    def _schedule_next_tick(self):
+        """ first tick with a code switched off or on """
+        sc   = self._schedule
+        tick = float("inf")
+        if sc.codeOn:
+           tick = self._next_tick(sc.time_start + sc.time_end)
+        if sc.index < len(sc.entries):
+           t_on = sc.time_start + sc.entries["onset_ms"][sc.index] * 1000.0
+           tick = min(tick,np.ceil(t_on / self.tick_us) * self.tick_us)
+        elif not sc.codeOn:
+           tick = self._next_tick(sc.time_start)
+        return tick
+
+    def _schedule_update(self,t):
+        sc = self._schedule
+        dt = t - sc.time_start
+        if sc.codeOn and dt > sc.time_end:
+           self._set_port(t,0,0)
+           sc.codeOn = False
+        if sc.index < len(sc.entries) and dt >= sc.entries["onset_ms"][sc.index] * 1000.0:
+           e = sc.entries[sc.index]
+           self._set_port(t,int(e["eventcode"]),int(e["triggercode"]))
+           sc.time_end = (int(e["onset_ms"]) + int(e["duration_ms"])) * 1000.0
+           sc.codeOn   = True
+           sc.index   += 1
+        if sc.index >= len(sc.entries) and not sc.codeOn:
+           sc.isOn = False
+           self._reply(SCHEDULE_DONE,t)
+
+    def _schedule_stop(self,t):
+        self._set_port(t,0,0)
+        self._schedule.isOn   = False
+        self._schedule.codeOn = False
+
+    def _micros(self,t):
+        return (int(t) & 0xFFFFFFFF).to_bytes(4,"little")
+
+    def _tx(self,data,t):
+        """ Serial.write + Serial.flush() at the end of the command loop """
+        self._reply(data,t)
+        self._busy_until = t + len(data) * self.byte_us
+
+   #--- commands
+    def _cmd_switch_on(self,frame,t):
+        ec = self._ec
+        ec.eventcode   = frame[1]
+        ec.triggercode = frame[2]
+        ec.duration    = int.from_bytes(frame[3:7],"little")
+        self.commands.append( (t,111,frame[1] | (frame[2] << 8),ec.duration) )
+        self._switch_on(t)
+
+    def _cmd_switch_off(self,frame,t):
+        self.commands.append( (t,112,0,0) )
+        self._switch_off(t)
+        self._at.isPending = False
+        if self._stream.isOn:
+           self._stream_stop(t)
+        if self._schedule.isOn:
+           self._schedule_stop(t)
+        if frame[1] == 1:
+           self._tx(ACK,t)
+
+    def _cmd_vendor_id(self,frame,t):
+        vid = self.vendor_id_code
+        for i in range(1,FRAME_SIZE):
+            if frame[i] != vid:
+               self._tx(b"99\r\n",t)
+               return i + 1
+        self._tx( "{}\r\n".format(vid).encode(),t )
+       #--- drop following vendor id bytes already received
+        n = FRAME_SIZE
+        while n < len(self._rx) and self._rx[n] == vid and self._rx_t[n] <= t:
+              n += 1
+        return n
+
+    def _cmd_seq(self,frame,t):
+        self._seq_reset(t)
+        sq = self._seq
+        sq.data_counts = min(frame[1],self.seq_max)
+        sq.duration    = int.from_bytes(frame[3:7],"little")
+        sq.data        = frame[FRAME_SIZE:FRAME_SIZE + sq.data_counts]
+        if sq.duration == 0:
+           sq.duration = SEQ_DEFAULT_DURATION
+        self.commands.append( (t,211,sq.data_counts // 2,sq.duration) )
+        self._send_seq(t)
+
+    def _cmd_stream_start(self,frame,t):
+        if self._stream.isOn:
+           self._stream_stop(t)
+        self._stream = _EventCodeStream( int.from_bytes(frame[3:7],"little") )
+        self.commands.append( (t,SEQ_STREAM_START,0,self._stream.duration) )
+
+    def _cmd_stream_chunk(self,frame,t):
+        st = self._stream
+        n  = min(frame[1],SEQ_CHUNK_BYTES)
+        self.commands.append( (t,SEQ_STREAM_CHUNK,n // 2,st.duration) )
+        if st.data[st.write_buffer]: # no credit, chunk is dropped
+           return
+        st.data[st.write_buffer] = frame[FRAME_SIZE:FRAME_SIZE + n]
+        st.write_buffer ^= 1
+        if frame[2] & 1:
+           st.last_chunk = True
+        if not st.isOn:
+           st.isOn = True
+           self._stream_next(t)
+        elif st.isWaiting:
+           self._stream_next(t)
+
+    def _cmd_schedule_load(self,frame,t):
+        if self._schedule.isOn:
+           self._schedule_stop(t)
+        k0 = frame[3] | (frame[4] << 8)
+        n  = max(min(len(frame[FRAME_SIZE:]) // SCHEDULE_ENTRY_SIZE,SCHEDULE_MAX_ENTRIES - k0),0)
+        entries = np.frombuffer(frame[FRAME_SIZE:FRAME_SIZE + n * SCHEDULE_ENTRY_SIZE],dtype=SCHEDULE_DTYPE)
+        if k0: # add a chunk
+           old = self._schedule.entries
+           entries = np.concatenate( (old[:k0],np.zeros(max(k0 - len(old),0),dtype=SCHEDULE_DTYPE),entries,old[k0 + n:]) )
+        self._schedule = _EventCodeSchedule(entries.copy())
+        self.commands.append( (t,SCHEDULE_LOAD,n,k0) )
+        self._tx(ACK,t)
+
+    def _cmd_schedule_start(self,frame,t):
+        sc = self._schedule
+        if sc.isOn:
+           self._schedule_stop(t)
+        sc.index      = 0
+        sc.codeOn     = False
+        sc.time_start = t + int.from_bytes(frame[3:7],"little") * 1000.0
+        sc.isOn       = len(sc.entries) > 0
+        self.commands.append( (t,SCHEDULE_START,len(sc.entries),0) )
+
+    def _cmd_switch_on_at(self,frame,t):
+        at = self._at
+        at.eventcode   = frame[1]
+        at.triggercode = frame[2]
+        at.duration    = int.from_bytes(frame[3:7],"little")
+        t_at = int.from_bytes(frame[FRAME_SIZE:SWITCH_ON_AT_SIZE],"little")
+        t_at+= round( (t - t_at) / 4294967296.0 ) * 4294967296 # micros() wraps, unwrap near now
+        at.time_tick = max(np.ceil(t_at / self.tick_us) * self.tick_us,self._next_tick(t))
+        at.isPending = True
+        self.commands.append( (t,SWITCH_ON_AT,frame[1] | (frame[2] << 8),at.duration) )
+
+    def _cmd_protocol(self,frame,t):
+        self.commands.append( (t,PROTOCOL,frame[1],0) )
+        if frame[1] in (1,2):
+           self._tx(ACK,t)
+           self._protocol = frame[1]
+
+    def _baud_ok(self,baud):
+        """ HardwareSerial::begin with U2X: UBRR rounding error """
+        if not BAUD_MIN <= baud <= BAUD_MAX:
+           return False
+        real = F_CPU // 8 // ((F_CPU // 4 // baud - 1) // 2 + 1)
+        return abs(real - baud) * 1000 // baud <= BAUD_MAX_ERROR_PERMILLE
+
+    def _cmd_baudrate(self,frame,t):
+        mode = frame[1]
+        baud = int.from_bytes(frame[3:7],"little")
+        self.commands.append( (t,BAUDRATE,mode,baud) )
+        if mode == BAUD_CONFIRM:
+           ok = self._baud_trial is not None and baud == self.baudrate
+           if ok:
+              self._baud_trial = None
+           self._tx(ACK if ok else NAK,t)
+           return
+        if not self._baud_ok(baud):
+           self._tx(NAK,t)
+           return
+        self._tx(ACK,t) # at the old rate
+        if self._baud_trial is None:
+           self._baud_prev = self.baudrate
+        self._baud_trial = self._busy_until + BAUD_TRIAL_MS * 1000.0 if mode == BAUD_TRIAL else None
+        self.baudrate    = baud
+
+    def _cmd_baud_test(self,frame,t):
+        data = bytearray(frame[FRAME_SIZE:FRAME_SIZE + min(frame[1],self.seq_max)])
+        self.commands.append( (t,BAUD_TEST,len(data),0) )
+        if self._baud_trial is not None:
+           self._baud_trial = t + BAUD_TRIAL_MS * 1000.0
+        if data and self.baudrate_limit and self.baudrate > self.baudrate_limit:
+           data[len(data) // 2] ^= 0x5A # bit errors on the wire
+        self._tx(BAUD_ECHO + bytes(data),t)
+
+    def _cmd_clock_ping(self,frame,t):
+        self.commands.append( (t,CLOCK_PING,frame[1],0) )
+        self._tx(PONG + bytes((frame[1],)) + self._micros(t),t)
+
+    def _cmd_edge_ack(self,frame,t):
+        self.commands.append( (t,EDGE_ACK,frame[1],0) )
+        self._edge_ack = frame[1] == 1
+
+   #--- output
+    def edges(self,t_us=None):
+        """
+        TTL edges up to <t_us>
+
+        :return:
+          numpy structured array EDGE_DTYPE: device time [us], host time.monotonic_ns(), 16 bit value
+        """
+        self.advance(t_us)
+        with self._model:
+             e = np.array(self._edges,dtype=[("t_us","<f8"),("value","<u2")])
+        out = np.zeros(len(e),dtype=EDGE_DTYPE)
+        out["t_us"]  = e["t_us"]
+        out["value"] = e["value"]
+        out["t_ns"]  = self._t0_ns + np.round(e["t_us"] * 1000.0).astype(np.int64)
+        return out
+
+    def ttl_trace(self,sfreq=1000.0,t_start_us=0.0,t_end_us=None):
+        """
+        sampled 16 bit TTL channel as recorded by the MEG/EEG system
+
+        :param sfreq     : sampling frequency in Hz
+        :param t_start_us: first sample device time in us
+        :param t_end_us  : last sample <now>
+        :return:
+          times in us, values uint16
+        """
+        e = self.edges(t_end_us)
+        if t_end_us is None:
+           t_end_us = self._now
+        t = np.arange(t_start_us,t_end_us,1.0e6 / sfreq)
+        i = np.searchsorted(e["t_us"],t,side="right") - 1
+        v = np.where(i >= 0,e["value"][np.maximum(i,0)],0).astype(np.uint16)
+        return t,v
+
+
+if __name__ == "__main__":
+   emu = JuMEG_Psycho_Emulator()
+   emu.feed(bytes([111,16,0,10,0,0,0]),t_us=1000.0)
+   emu.feed(bytes([211,6,0,2,0,0,0,1,0,2,0,4,0]),t_us=20000.0)
+   print("---> JuMEG emulator edges [us,value]:")
+   for e in emu.edges(40000.0):
+       print("  -> {:10.1f} {:6d}".format(e["t_us"],e["value"]))
@@ -7,13 +7,31 @@ update 11.12.2020 for py3, fb
 """
 
 from warnings import warn
-import os,time,glob,serial
-import numpy as np
+import os,time,glob,serial,threading
+from collections import deque,namedtuple
+
+#--- no numpy / psychopy at import: numpy, journal, schedule and asyncio are imported on first use
+from jumeg_psycho_frame  import (JuMEG_Psycho_FrameEncoder,DEVICE_READY,ACK,SEQ_CREDIT,SEQ_UNDERRUN,SEQ_DONE,
+                                 SEQ_MAX_DATA_COUNTS,SEQ_CHUNK_BYTES,SEQ_STREAM_START,SCHEDULE_DONE,SCHEDULE_START,
+                                 PONG,EDGE,EDGE_ACK,SWITCH_ON_AT,NAK,SCHEDULE_ENTRY_SIZE,V2_SCHEDULE_ENTRIES,
+                                 BAUD_ECHO,BAUD_TRIAL_MS,BAUD_CONFIRM,BAUD_SET,
+                                 FRAME_SIZE,pack_codes,flatten_codes,parse_cmd,baud_test_pattern,unwrap_frame)
+from jumeg_psycho_sender import JuMEG_Psycho_Sender,SendRecord,notify_error
+from jumeg_psycho_discovery import JuMEG_Psycho_PortDiscovery,hold_dtr
+from jumeg_psycho_reply     import JuMEG_Psycho_ReplyReader
+from jumeg_psycho_clock     import JuMEG_Psycho_ClockSync
+from jumeg_psycho_supervisor import JuMEG_Psycho_Supervisor,LINK_DOWN,LINK_UP,FRAME_DROPPED,FRAME_LATE
 
 __version__='2020-02-11-001'
 
+#--- TTL edge reported by the Arduino: code, device micros() unwrapped [us], host time [ns] of the edge, host read time [ns]
+EdgeRecord = namedtuple("EdgeRecord",["code","t_device_us","t_host_ns","t_recv_ns"])
+
 class JuMEG_Psycho_EventCode(object):
-      def __init__(self,port='/dev/ttyACM0',baudrate=115200,startcode=128,duration_ms=200,duration_seq_ms=10,verbose=False):
+      profiler = None # profiling hook e.g. JuMEG_Psycho_Profiler, see jumeg_psycho_profile.install()
+
+      def __init__(self,port='/dev/ttyACM0',baudrate=115200,startcode=128,duration_ms=200,duration_seq_ms=10,verbose=False,
+                   async_mode=False,async_queue_size=256,journal=None):
           """ 
           sending digital eventcodes (TTL) via Arduino (MEGA)
           default setings (LINUX):
@@ -21,7 +39,45 @@ class JuMEG_Psycho_EventCode(object):
                   duration_ms = 200
                   startcode   = 128
                   port        = '/dev/ttyACM0'
+                  async_mode  = False
+                  reset_on_open = True
+                  protocol_version = 1
+                  baudrate_negotiate = False
+                  auto_reconnect = False
            -> will find arduino port via VENDOR_ID_CODE (123)
+              all ports are probed in parallel, the last good device is cached in
+              ~/.cache/jumeg/jumeg_psycho_eventcode.json (JuMEG_Psycho_PortDiscovery)
+           -> open waits for the DEVICE_READY byte the Arduino sends after reset (timeout: ready_timeout)
+              reset_on_open=False: DTR is kept asserted (HUPCL cleared), a running Arduino is not reset
+              on the next open; checked by vendor id handshake
+           -> close waits for the ACK of the switch-off command (timeout: ack_timeout)
+           -> async_mode: frames are written by a background thread (JuMEG_Psycho_Sender),
+                          send() returns immediately, timestamps in <evc.sender.records>
+           -> journal: file name or JuMEG_Psycho_EventJournal, every sent code is logged
+                       with time.monotonic_ns() into a memory-mapped ring file
+                       load offline: jumeg_psycho_journal.load_journal(fname)
+           -> sendSeq: max 61 codes in one frame, sendSeqStream: unlimited number of codes,
+              streamed in chunks of 32 codes with credit flow control
+           -> sendSchedule: fixed timing block as one binary schedule (JuMEG_Psycho_Schedule),
+              played by the Arduino against its own clock after startSchedule()
+           -> syncClock: offset/drift of the Arduino micros() clock vs time.monotonic_ns() from pings,
+              round trip statistics in rtt_stats()
+           -> edge_ack=True: the Arduino reports micros() of every TTL change, converted to host time
+              in <edges> and journaled with cmd 217
+           -> send_at: the code is sent ahead with a target time, the Arduino switches it on
+              at the first timer tick >= target (needs syncClock), one pending code at a time
+           -> protocol_version=2 (opt-in, default 1: 7 byte frames): open() negotiates framed protocol v2
+              (sync, length, CRC), a corrupted frame is dropped by the Arduino (NAK, counted in <protocol_errors>)
+              and the next frame is read again; firmware without v2: protocol 1 after <ack_timeout>
+           -> baudrate_negotiate=True (opt-in): open() switches to the fastest rate of <baudrate_list> up to <baudrate_max>
+              which passes an error free burst test, the rate is cached per device;
+              close() switches the Arduino back to <baudrate>
+           -> auto_reconnect=True (opt-in): a supervisor thread polls the sysfs node of the port, a lost USB link
+              is reopened in the background, send() does not block; frames are buffered with their
+              intended time and replayed if not older than <replay_max_delay_ms>, else dropped;
+              gaps, dropped and late frames are journaled (jumeg_psycho_supervisor LINK_DOWN,...)
+              write errors do not raise: the frame is buffered, a dropped frame calls its callback
+              with an error SendRecord; auto_reconnect=False: a direct write error raises serial.SerialException
               https://github.com/wiseman/arduino-serial/blob/master/arduinoserial.py
               https://github.com/vascop/Python-Arduino-Proto-API-v2/blob/master/arduino/arduino.py
 
@@ -72,6 +128,11 @@ class JuMEG_Psycho_EventCode(object):
                         'duration_ms':duration_ms,'duration_seq_ms':duration_seq_ms,'startcode':startcode, 
                         'vendor_id_code':123,'vendor_id_repetition':7,
                         'send_byte_code':True,'verbose': verbose,
+                        'async_mode':async_mode,
+                        'reset_on_open':True,'ready_timeout':2.5,'ack_timeout':0.5,
+                        'edge_ack':False,'protocol_version':1,
+                        'baudrate_negotiate':False,'baudrate_max':2000000,'baud_bursts':4,
+                        'auto_reconnect':False,'replay_max_delay_ms':50,
                         'cmd_code_switch_on' : 111,
                         'cmd_code_switch_off': 112,
                         'cmd_code_send_seq'  : 211,
@@ -80,6 +141,26 @@ class JuMEG_Psycho_EventCode(object):
 
           self.__serial     = None
           self.__byte_array_size = 7
+          self.__sender     = JuMEG_Psycho_Sender(maxsize=async_queue_size)
+          self.__discovery  = JuMEG_Psycho_PortDiscovery()
+          self.__journal    = None
+          self.journal      = journal
+          self.__schedule   = None
+          self.__schedule_t_end = 0.0
+          self.__clock      = JuMEG_Psycho_ClockSync()
+          self.__reader     = JuMEG_Psycho_ReplyReader(on_packet=self.__on_packet)
+          self.__pings      = dict()
+          self.__ping_id    = 0
+          self.__edges      = deque(maxlen=100000)
+          self.__protocol   = 1
+          self.__protocol_errors = 0
+          self.__supervisor = JuMEG_Psycho_Supervisor(reconnect=self.__reconnect,on_lost=self.__on_link_lost)
+          self.__link_lock  = threading.Lock()
+          self.__sender.on_error = self.__link_error
+          self.__encoder    = JuMEG_Psycho_FrameEncoder(cmd_code_switch_on=self.__param['cmd_code_switch_on'],
+                                                        cmd_code_switch_off=self.__param['cmd_code_switch_off'],
+                                                        vendor_id_code=self.__param['vendor_id_code'],
+                                                        vendor_id_repetition=self.__param['vendor_id_repetition'])
           self.verbose      = False
           
           self.__isConnected= False
@@ -115,6 +196,131 @@ class JuMEG_Psycho_EventCode(object):
      #---
       @property 
       def serial(self): return self.__serial
+     #---
+      @property
+      def encoder(self): return self.__encoder
+     #---
+      @property
+      def sender(self): return self.__sender
+     #---
+      @property
+      def discovery(self): return self.__discovery
+     #---
+      @property
+      def journal(self): return self.__journal
+      @journal.setter
+      def journal(self,v):
+          if isinstance(v,str):
+             from jumeg_psycho_journal import JuMEG_Psycho_EventJournal
+             v = JuMEG_Psycho_EventJournal(v)
+          self.__journal = v
+     #---
+      @property
+      def clock(self): return self.__clock
+     #---
+      @property
+      def reader(self): return self.__reader
+     #---
+      @property
+      def edges(self):
+          """ EdgeRecord for each TTL change reported by the Arduino (edge_ack) """
+          return self.__edges
+     #---
+      @property
+      def edge_ack(self): return self.__param['edge_ack']
+      @edge_ack.setter
+      def edge_ack(self,v):
+          self.__param['edge_ack'] = bool(v)
+          if self.isConnected:
+             self.__set_edge_ack()
+     #---
+      @property
+      def protocol_version(self):
+          """ protocol requested in open(), 1: no negotiation """
+          return self.__param['protocol_version']
+      @protocol_version.setter
+      def protocol_version(self,v):
+          self.__param['protocol_version']=v
+     #---
+      @property
+      def protocol(self):
+          """ protocol in use """
+          return self.__protocol
+     #---
+      @property
+      def protocol_errors(self):
+          """ NAKs from the Arduino: v2 frames dropped with header or CRC error """
+          return self.__protocol_errors + self.__reader.naks
+     #---
+      @property
+      def baudrate_negotiate(self): return self.__param['baudrate_negotiate']
+      @baudrate_negotiate.setter
+      def baudrate_negotiate(self,v):
+          self.__param['baudrate_negotiate']=v
+     #---
+      @property
+      def baudrate_max(self): return self.__param['baudrate_max']
+      @baudrate_max.setter
+      def baudrate_max(self,v):
+          self.__param['baudrate_max']=v
+     #---
+      @property
+      def baud_bursts(self): return self.__param['baud_bursts']
+      @baud_bursts.setter
+      def baud_bursts(self,v):
+          self.__param['baud_bursts']=v
+     #---
+      @property
+      def baudrate_active(self):
+          """ baudrate in use, <baudrate> after open, negotiated rate see negotiateBaudrate() """
+          return self.serial.baudrate if self.serial else None
+     #---
+      @property
+      def auto_reconnect(self): return self.__param['auto_reconnect']
+      @auto_reconnect.setter
+      def auto_reconnect(self,v):
+          self.__param['auto_reconnect']=v
+          if not v:
+             self.__supervisor.stop()
+          elif self.isConnected:
+             self.__supervisor.start(self.ComPort)
+     #---
+      @property
+      def replay_max_delay_ms(self): return self.__param['replay_max_delay_ms']
+      @replay_max_delay_ms.setter
+      def replay_max_delay_ms(self,v):
+          self.__param['replay_max_delay_ms']=v
+     #---
+      @property
+      def supervisor(self): return self.__supervisor
+     #---
+      @property
+      def async_mode(self): return self.__param['async_mode']
+      @async_mode.setter
+      def async_mode(self,v):
+          self.__param['async_mode']=v
+          if not v:
+             self.__sender.stop()
+          elif self.isConnected:
+             self.__sender.start(self.serial)
+     #---
+      @property
+      def reset_on_open(self): return self.__param['reset_on_open']
+      @reset_on_open.setter
+      def reset_on_open(self,v):
+          self.__param['reset_on_open']=v
+     #---
+      @property
+      def ready_timeout(self): return self.__param['ready_timeout']
+      @ready_timeout.setter
+      def ready_timeout(self,v):
+          self.__param['ready_timeout']=v
+     #---
+      @property
+      def ack_timeout(self): return self.__param['ack_timeout']
+      @ack_timeout.setter
+      def ack_timeout(self,v):
+          self.__param['ack_timeout']=v
      #---
       @property
       def ComPort(self): return self.__param['ComPort']
@@ -159,12 +365,14 @@ class JuMEG_Psycho_EventCode(object):
       @vendor_id_code.setter
       def vendor_id_code(self,v):
           self.__param['vendor_id_code']=v
+          self.__encoder.vendor_id_code=v
      #---
       @property
       def vendor_id_repetition(self): return self.__param['vendor_id_repetition']
       @vendor_id_repetition.setter 
       def vendor_id_repetition(self,v):
           self.__param['vendor_id_repetition']=v
+          self.__encoder.vendor_id_repetition=v
      #---
       @property
       def send_byte_code(self): return self.__param['send_byte_code']
@@ -177,12 +385,14 @@ class JuMEG_Psycho_EventCode(object):
       @cmd_code_switch_on.setter
       def cmd_code_switch_on(self,v):
           self.__param['cmd_code_switch_on']=v      
+          self.__encoder.cmd_code_switch_on=v
      #---
       @property
       def cmd_code_switch_off(self): return self.__param['cmd_code_switch_off']   
       @cmd_code_switch_off.setter
       def cmd_code_switch_off(self,v):
           self.__param['cmd_code_switch_off']=v
+          self.__encoder.cmd_code_switch_off=v
      #---     
       @property
       def cmd_code_send_seq(self): return self.__param['cmd_code_send_seq']
@@ -210,6 +420,7 @@ class JuMEG_Psycho_EventCode(object):
      #---  
       @property  
       def vendor_id_code_array(self):
+          import numpy as np
           return np.zeros( self.vendor_id_repetition,dtype=np.byte)+self.vendor_id_code
        
     #----------------    
@@ -225,39 +436,477 @@ class JuMEG_Psycho_EventCode(object):
           self.__isConnected=False 
           try:
               self.__serial = serial.Serial(self.ComPort,int(self.baudrate))       
-              time.sleep(2)
-              if self.__serial:
+              if self.reset_on_open:
+                 if not self.waitForReady():
+                    warn('---> WARNING no ready code from Arduino port: {} within {} s\n'.format(self.ComPort,self.ready_timeout))
                  self.__isConnected=True
+              else:
+                 hold_dtr(self.__serial)
+                 self.discovery._update_from_kwargs(reset=False)
+                 self.__isConnected = self.discovery.handshake_cached(self.__serial)
               print('---> done Arduino is connected: {}\n'.format(self.isConnected))
           except:
               warn('---> EEROR can not connected to Arduino port: {} !!!\n'.format(port))
               
           return self.__isConnected
+
+      def __wait_for_byte(self,code,timeout):
+          """ read from port till <code> is received or timeout """
+          if self.__reader.isRunning:
+             return self.__reader.wait_for(code,timeout)
+          t_end = time.monotonic() + timeout
+          tout  = self.serial.timeout
+          try:
+              while True:
+                    dt = t_end - time.monotonic()
+                    if dt <= 0:
+                       return False
+                    self.serial.timeout = dt
+                    b = self.serial.read( max(1,self.serial.in_waiting) )
+                    self.__protocol_errors += b.count(NAK)
+                    if code in b:
+                       return True
+          finally:
+              self.serial.timeout = tout
+
+      def waitForReady(self,timeout=None):
+          """
+          wait for the DEVICE_READY byte the Arduino sends after reset (end of setup())
+
+          :param timeout: timeout in s <ready_timeout>
+          :return:
+            True if ready byte was received
+          """
+          if timeout is None:
+             timeout = self.ready_timeout
+          return self.__wait_for_byte(DEVICE_READY,timeout)
       
-      def open(self,port=None,baudrate=None):
+      def __attach(self,port,ser):
+          """ use an already opened and checked serial port e.g. from port discovery """
+          self.ComPort      = port
+          self.__serial     = ser
+          self.__serial.timeout = None
+          self.__isConnected= True
+          return self.__isConnected
+
+      def attach(self,port,ser):
+          """
+          use an already opened and checked serial port e.g. from JuMEG_Psycho_PortDiscovery.find_all()
+
+          :param port: port
+          :param ser : open serial.Serial, vendor id checked
+          :return:
+            True if connected
+          """
+          self.__close_comport()
+          self.__attach(port,ser)
+          self.__init_connection()
+          return self.isConnected
+
+      def __init_connection(self):
+          self.serial.flushInput()
+          self.serial.flushOutput()
+          self.__protocol = 1
+          if self.protocol_version > 1:
+             self.negotiateProtocol()
+          if self.baudrate_negotiate:
+             self.negotiateBaudrate()
+         #--- direct writes: a reconnect runs this while send() still buffers
+          if self.__journal:
+             self.__journal.log(self.cmd_code_switch_off,0,0)
+          self.__write_frame( self.__encoder.switch_off )
+          if self.edge_ack:
+             self.__reader.start(self.serial)
+             self.__write_frame( self.__encoder.edge_ack(True) )
+          if self.async_mode:
+             self.__sender.start(self.serial)
+
+      def __update_discovery(self):
+          self.discovery._update_from_kwargs(port_pattern=self.port_pattern,baudrate=self.baudrate,reset=self.reset_on_open,
+                                             vendor_id_code=self.vendor_id_code,
+                                             vendor_id_frame=self.encoder.vendor_id,verbose=self.verbose)
+
+     #--- link supervisor
+      def __link_error(self,e):
+          """ write error in the render or writer thread """
+          if self.__supervisor.isRunning:
+             self.__supervisor.lost(e)
+          else:
+             warn("  -> ERROR write bytes to Arduino: {}\n".format(e))
+
+      def __journal_frame(self,cmd,t_ns,frame,duration=None):
+          if self.__journal and len(frame) >= FRAME_SIZE:
+             if duration is None:
+                duration = int.from_bytes(frame[3:7],"little")
+             self.__journal.log(cmd,frame[1] | (frame[2] << 8),duration,t_ns=t_ns)
+
+      def __drop_frame(self,t_ns,frame,callback,reason):
+          """ buffered frame is not sent: journaled as FRAME_DROPPED, callback gets an error SendRecord """
+          self.__journal_frame(FRAME_DROPPED,t_ns,frame)
+          notify_error(callback,frame,ConnectionError(reason),t_enqueue=t_ns)
+
+      def __buffer_frame(self,frame,callback=None,t_ns=None):
+          """ buffer a v1 frame while the link is down, returns False if the link is up """
+          with self.__link_lock:
+               if not self.__supervisor.isDown:
+                  return False
+               dropped = self.__supervisor.put(bytes(frame),callback,t_ns)
+          if dropped:
+             self.__drop_frame(*dropped,"link down, buffer full")
+          return True
+
+      def __on_link_lost(self,t_ns,reason):
+          """ supervisor thread: close the dead port, pending frames of the writer thread are buffered """
+          warn("---> WARNING Arduino link lost: {} => {}, reconnecting in background\n".format(self.ComPort,reason))
+          if self.__journal:
+             self.__journal.log(LINK_DOWN,0,0,t_ns=t_ns)
+          pending = self.__sender.take()
+          self.__sender.stop(timeout=0.2)
+          with self.__link_lock:
+               dropped = self.__supervisor.requeue( [ (t,unwrap_frame(frame),cb) for _,t,frame,cb in pending ] )
+          for item in dropped:
+              self.__drop_frame(*item,"link down, buffer full")
+          self.__reader.stop(timeout=0.2)
+          self.__isConnected = False
+          try:
+              self.__serial.close()
+          except Exception:
+              pass
+
+      def __find_link_port(self):
+          """ port of the lost device: USB identity from the discovery cache, else <ComPort> """
+          port = self.discovery.cached_port(self.discovery.candidates()) if self.find_port else None
+          if port is None and os.path.exists(self.ComPort):
+             port = self.ComPort
+          return port
+
+      def __reconnect(self):
+          """
+          supervisor thread: reopen the port, buffered frames are replayed or dropped
+          :return:
+            port or None
+          """
+          port = self.__find_link_port()
+          if not port:
+             return None
+          self.__update_discovery()
+          ser = self.discovery.probe(port,abort=self.__supervisor.abort)
+          if ser is None:
+             return None
+          self.__attach(port,ser)
+          try:
+              self.__init_connection()
+          except (serial.SerialException,OSError) as e:
+              warn("---> WARNING Arduino reconnect failed: {} => {}\n".format(port,e))
+              self.__sender.stop(timeout=0.2)
+              self.__reader.stop(timeout=0.2)
+              self.__isConnected = False
+              ser.close()
+              return None
+          t_up = time.monotonic_ns()
+          with self.__link_lock:
+               replayed,dropped = self.__replay( self.__supervisor.take(),t_up )
+               t_down = self.__supervisor.gaps[-1][0]
+               self.__supervisor.up(port)
+          if self.__journal:
+             self.__journal.log(LINK_UP,0,int( (t_up - t_down) * 1.0e-6 ),t_ns=t_up)
+          print("---> Arduino link up: {} gap: {:.1f} ms replayed: {} dropped: {}".format(port,(t_up - t_down) * 1.0e-6,replayed,dropped))
+          return port
+
+      def __replay(self,items,t_now):
+          """ write buffered frames not older than <replay_max_delay_ms>, journal late / dropped frames """
+          max_delay = self.replay_max_delay_ms * 1000000
+          replayed  = 0
+          for t_ns,frame,callback in items:
+              if t_now - t_ns > max_delay:
+                 self.__drop_frame(t_ns,frame,callback,"link down, older than replay_max_delay_ms")
+                 continue
+              self.__journal_frame(FRAME_LATE,t_ns,frame,duration=(t_now - t_ns) // 1000)
+              if self.__protocol == 2:
+                 frame = self.__encoder.wrap(frame)
+              if self.__sender.isRunning:
+                 self.__sender.put(frame,callback=callback)
+              else:
+                 t_w = time.monotonic_ns()
+                 self.serial.write(frame)
+                 if callback:
+                    callback( SendRecord(0,t_ns,t_w,time.monotonic_ns(),len(frame),None) )
+              replayed += 1
+          return replayed,len(items) - replayed
+
+      def negotiateProtocol(self,version=None,timeout=None):
+          """
+          switch the Arduino to protocol <version>, the request is a v1 frame (v2 frame if v2 is active)
+          firmware without v2 does not reply: protocol 1
+
+          :param version: 1 or 2 <protocol_version>
+          :param timeout: timeout for the ACK in s <ack_timeout>
+          :return:
+            protocol in use
+          """
+          if version is None:
+             version = self.protocol_version
+          if timeout is None:
+             timeout = self.ack_timeout
+          if not self.isConnected or version == self.__protocol:
+             return self.__protocol
+          self.__sender.wait(timeout)
+          self.__reset_replies()
+          frame = self.__encoder.protocol(version)
+          self.serial.write( self.__encoder.wrap(frame) if self.__protocol == 2 else frame )
+          self.serial.flush()
+          if self.__wait_for_byte(ACK,timeout):
+             self.__protocol = version
+          elif self.verbose:
+             print(" --> Arduino protocol v{} not supported, using v{}".format(version,self.__protocol))
+          if self.verbose:
+             print(" --> Arduino protocol: v{}".format(self.__protocol))
+          return self.__protocol
+
+      def negotiateBaudrate(self,baudrate_max=None,timeout=None):
+          """
+          switch to the fastest rate of <baudrate_list> up to <baudrate_max> which passes the burst test,
+          the cached rate of the device is tried first and a new rate is saved in the device cache
+
+          trial: 220 -> ACK at the old rate, both sides switch, <baud_bursts> burst tests must be
+          echoed error free, 220 confirm -> ACK at the new rate; on error the host switches back
+          and the Arduino falls back after BAUD_TRIAL_MS
+          NAK: rate not supported by the Arduino clock, no reply: firmware without negotiation
+
+          :param baudrate_max: max rate in bits/s <baudrate_max>
+          :param timeout     : timeout for ACK and echo in s <ack_timeout>
+          :return:
+            baudrate in use
+          """
+          if not self.isConnected:
+             return None
+          if baudrate_max is None:
+             baudrate_max = self.baudrate_max
+          if timeout is None:
+             timeout = self.ack_timeout
+          current = self.serial.baudrate
+          cached  = self.discovery.load_baudrate(self.ComPort)
+          if cached == current: # box kept running at the negotiated rate
+             return current
+          rates = sorted( { int(b) for b in self.baudrate_list if current < int(b) <= baudrate_max },reverse=True )
+          if cached in rates:
+             rates.remove(cached)
+             rates.insert(0,cached)
+          if not rates:
+             return current
+          reader = self.__reader.isRunning
+          self.__sender.wait(timeout)
+          self.__reader.stop()
+          try:
+              for rate in rates:
+                  ok = self.__baud_trial(rate,timeout)
+                  if ok is None: # no reply
+                     if self.verbose:
+                        print(" --> Arduino baudrate negotiation not supported")
+                     break
+                  if ok:
+                     self.discovery.save_baudrate(self.ComPort,rate)
+                     break
+          finally:
+              if reader:
+                 self.__reader.start(self.serial)
+          if self.verbose:
+             print(" --> Arduino baudrate: {}".format(self.serial.baudrate))
+          return self.serial.baudrate
+
+      def __write_frame(self,frame):
+          """ blocking write of one frame, v2 wrapped, bypasses the async writer thread """
+          self.serial.write( self.__encoder.wrap(frame) if self.__protocol == 2 else frame )
+          self.serial.flush()
+
+      def __read_exact(self,n,timeout):
+          """ read <n> bytes or less on timeout """
+          tout = self.serial.timeout
+          try:
+              self.serial.timeout = timeout
+              return self.serial.read(n)
+          finally:
+              self.serial.timeout = tout
+
+      def __baud_trial(self,rate,timeout):
+          """
+          one trial of negotiateBaudrate()
+          :return:
+            True: confirmed, False: not supported or burst test failed, None: no reply
+          """
+          old = self.serial.baudrate
+          self.serial.reset_input_buffer()
+          self.__write_frame( self.__encoder.baudrate(rate) )
+          reply = self.__read_exact(1,timeout)
+          if reply != ACK: # NAK: rate not supported
+             return False if reply else None
+          try:
+              self.serial.baudrate = rate
+              ok = True
+          except (ValueError,serial.SerialException) as e: # rate not supported by the host port
+              if self.verbose:
+                 print(" --> baudrate {} not supported by port: {}".format(rate,e))
+              ok = False
+          for k in range(self.baud_bursts if ok else 0):
+              data = baud_test_pattern(k)
+              self.__write_frame( self.__encoder.baud_test(data) )
+              if self.__read_exact(1 + len(data),timeout + 20.0 * len(data) / rate) != BAUD_ECHO + data:
+                 ok = False
+                 break
+          if ok:
+             self.__write_frame( self.__encoder.baudrate(rate,BAUD_CONFIRM) )
+             ok = self.__read_exact(1,timeout) == ACK
+          if self.verbose:
+             print("  -> baudrate trial {}: {}".format(rate,"ok" if ok else "failed"))
+          if not ok: # Arduino falls back without confirm
+             self.serial.baudrate = old
+             time.sleep(BAUD_TRIAL_MS * 1.0e-3 + timeout * 0.1)
+             self.serial.reset_input_buffer()
+          return ok
+
+      def __restore_baudrate(self):
+          """ switch the Arduino back to <baudrate> e.g. before close, next open at <baudrate> """
+          baudrate = int(self.baudrate)
+          if self.serial.baudrate == baudrate:
+             return True
+          self.serial.reset_input_buffer()
+          self.__write_frame( self.__encoder.baudrate(baudrate,BAUD_SET) )
+          ok = self.__read_exact(1,self.ack_timeout) == ACK
+          self.serial.baudrate = baudrate
+          return ok
+
+      def __reset_replies(self):
+          if self.__reader.isRunning:
+             self.__reader.clear()
+          else:
+             self.serial.reset_input_buffer()
+
+      def __set_edge_ack(self):
+          """ enable / disable edge replies on the Arduino, the reply reader runs with edge acks """
+          if self.edge_ack:
+             self.__reader.start(self.serial)
+          self.write_bytes( self.__encoder.edge_ack(self.edge_ack) )
+
+      def __on_packet(self,pkt,t_ns):
+          """ reply reader callback: PONG and EDGE packets """
+          t_dev = int.from_bytes(pkt[-4:],"little")
+          if pkt[0] == PONG[0]:
+             ping = self.__pings.pop(pkt[1],None)
+             if ping:
+                self.__clock.add(ping[0],t_dev,t_ns)
+                ping[1].set()
+          elif pkt[0] == EDGE[0]:
+             code  = pkt[1] | (pkt[2] << 8)
+             t_us  = self.__clock.unwrap(t_dev,t_ns)
+             t_edge= self.__clock.to_host_ns(t_us) if self.__clock.isSynced else -1
+             self.__edges.append( EdgeRecord(code,t_us,t_edge,t_ns) )
+             if self.__journal:
+                self.__journal.log(EDGE_ACK,code,0,t_ns=t_edge if t_edge >= 0 else t_ns)
+
+      def ping(self,timeout=None):
+          """
+          one clock ping, the PONG is added to <clock>
+
+          :param timeout: timeout in s <ack_timeout>
+          :return:
+            round trip time in us, None on timeout
+          """
+          if not self.isConnected:
+             return None
+          if timeout is None:
+             timeout = self.ack_timeout
+          if not self.__reader.isRunning:
+             self.__reader.start(self.serial)
+          self.__ping_id = (self.__ping_id + 1) & 0xFF
+          done  = threading.Event()
+          frame = self.__encoder.ping(self.__ping_id)
+          self.__sender.wait(timeout)
+          t0 = time.monotonic_ns()
+          self.__pings[self.__ping_id] = (t0,done)
+          if self.__protocol == 2:
+             frame = self.__encoder.wrap(frame)
+          self.serial.write(frame) # no writer thread: the send time is part of the measurement
+          if not done.wait(timeout):
+             self.__pings.pop(self.__ping_id,None)
+             return None
+          return self.__clock.samples[-1][2] * 1.0e-3
+
+      def syncClock(self,n=16,interval=0.005,timeout=None):
+          """
+          clock synchronisation with <n> pings, repeat during the session for the drift estimate
+
+          :param n       : number of pings
+          :param interval: pause between the pings in s
+          :param timeout : timeout per ping in s <ack_timeout>
+          :return:
+            dict: offset_us, drift_ppm and round trip statistics, None if no PONG was received
+          """
+          ok = 0
+          try:
+              for i in range(n):
+                  if self.ping(timeout) is not None:
+                     ok += 1
+                  time.sleep(interval)
+          finally:
+              if not self.edge_ack:
+                 self.__reader.stop()
+          if not ok:
+             warn("---> ERROR clock sync: no PONG from Arduino\n")
+             return None
+          result = {"offset_us":self.__clock.offset_us,"drift_ppm":self.__clock.drift_ppm}
+          result.update( self.rtt_stats() )
+          if self.verbose:
+             print("---> DONE clock sync: {}".format(result))
+          return result
+
+      def rtt_stats(self):
+          """ round trip statistics of all pings, see JuMEG_Psycho_ClockSync.rtt_stats """
+          return self.__clock.rtt_stats()
+
+      def open(self,port=None,baudrate=None,reset=None):
+          """
+          open connection to Arduino
+
+          :param port    : port <ComPort>, ignored if <find_port>
+          :param baudrate: baudrate
+          :param reset   : <reset_on_open> False: do not toggle DTR, do not reset a running Arduino
+          :return:
+            True if connected
+          """
           if port:
              self.ComPort = port     
           if baudrate:
              self.baudrate = baudrate 
+          if reset is not None:
+             self.reset_on_open = reset
           if self.find_port:
               self.findArduinoPort()
           else:   
              self.__open()
              
           if self.isConnected:
-             self.serial.flushInput()
-             self.serial.flushOutput()
-             self.sendSwitchOff() 
+             self.__init_connection()
+             if self.auto_reconnect:
+                self.__supervisor.start(self.ComPort)
           return self.isConnected
 
       def __close_comport(self):
+          if self.__supervisor.isDown:
+             for t_ns,frame,callback in self.__supervisor.take():
+                 self.__drop_frame(t_ns,frame,callback,"link down at close")
+          self.__supervisor.stop()
           try:
               if self.isConnected:
-                 self.sendSwitchOff() 
-                 time.sleep(1)
+                 self.__sender.stop()
+                 if not self.sendSwitchOffAck():
+                    warn('---> WARNING no switch off ACK from Arduino within {} s\n'.format(self.ack_timeout))
+                 self.__reader.stop()
+                 if not self.__restore_baudrate():
+                    warn('---> WARNING no ACK from Arduino for baudrate: {}\n'.format(self.baudrate))
                  self.serial.close()
-                 time.sleep(1)
                  self.__isConnected = False
+                 if self.__journal:
+                    self.__journal.flush()
                  print('---> done Arduino connection closed\n'          )
           except:
                  self.__isConnected = False
@@ -272,46 +921,75 @@ class JuMEG_Psycho_EventCode(object):
               check if <event/trigger code arduino> is connected to the port
               return arduino vendor id e.g: 123 for 7 times
           """ 
-          self.write_bytes( bytearray( self.vendor_id_code_array ) ) 
-          time.sleep(1)
+          timeout = self.serial.timeout
+          self.serial.timeout = self.discovery.timeout
+          self.write_bytes( self.encoder.vendor_id ) 
           id = self.serial.readline()
-          time.sleep(1)
-          self.serial.flushOutput()
+          self.serial.timeout = timeout
+          try:
+              id = int(id)
+          except ValueError:
+              id = -1
           if self.verbose:
-             print( " -->ID code : %d"%(int(id)) )
-          return int(id)
+             print( " -->ID code : %d"%(id) )
+          return id
        
       def findArduinoPort(self):
-          ports = glob.glob( self.port_pattern )   
+          """
+          find Arduino port via vendor id handshake
+          cached device first, else all ports matching <port_pattern> in parallel
+          """
           print(" --> Find Arduino Port Event/Trigger-Code: ")
-          print(" --> checking ports ...")
-          print(" --> ports:  {}".format(ports))
-          
-          for port in ports:
-              print("\n ---> " +port)
-              try:
-                  self.__open(port=port)
-                  self.serial.timeout=1.0
-                  if self.isConnected:
-                     id = self.getIdCode()
-                     if ( id == self.vendor_id_code ):
-                        print(" --> found Arduino@Port: " + self.ComPort +" -> Vendor ID: %d" %(id))
-                        self.serial.timeout=None
-                        return self.ComPort
-                     else:
-                        self.close() 
-              except:
-                 self.__isConnected = False
-                 warn('!!! ---> ERROR in connecting to port: '+ port )
+          print(" --> port pattern: " +self.port_pattern)
+          self.__close_comport()
+          self.__isConnected = False
+          self.__update_discovery()
+          port,ser = self.discovery.find()
+          if ser:
+             self.__attach(port,ser)
+             print(" --> found Arduino@Port: " + self.ComPort +" -> Vendor ID: %d" %(self.vendor_id_code))
+             return self.ComPort
+          warn('!!! ---> ERROR can not find Arduino port: '+ self.port_pattern )
           return self.isConnected
          
-      def write_bytes(self,v):
-          if self.__isConnected:
-           # d=bytes(bytearray([111,255,255,0,0,0,0])  
-             self.serial.write(bytes(v))
-             self.serial.flushOutput()
-          else:
-             warn("  -> ERROR write bytes to Arduino => Serial conncetion is closed\n")
+      def write_bytes(self,v,callback=None):
+          """
+          write bytes to Arduino
+          async_mode: enqueue for the writer thread, callback(SendRecord) is called after transmit
+          callback is called for every frame, a frame not written gets a SendRecord with seq -1 and <error>
+          protocol v2: <v> is one frame, wrapped with sync, length and CRC
+          link lost (auto_reconnect): <v> is buffered till the reconnect
+          """
+          prof = self.profiler
+          if prof: t_p = prof.mark()
+          try:
+              if self.__supervisor.isDown and self.__buffer_frame(v,callback):
+                 return
+              if self.__isConnected:
+                 frame = self.__encoder.wrap(bytes(v)) if self.__protocol == 2 else v
+                 if self.async_mode and self.__sender.isRunning:
+                    self.__sender.put(bytes(frame),callback=callback)
+                    return
+                 if self.__sender.isRunning: # started by send_async(), keep the order of its frames
+                    self.__sender.wait(self.ack_timeout)
+               # d=bytes(bytearray([111,255,255,0,0,0,0])  
+                 t_w = time.monotonic_ns()
+                 try:
+                     self.serial.write(bytes(frame)) # no flushOutput(): discards bytes not yet sent
+                 except (serial.SerialException,OSError) as e:
+                     if not self.__supervisor.isRunning:
+                        notify_error(callback,frame,e,t_enqueue=t_w)
+                        raise
+                     self.__supervisor.lost(e)
+                     self.__buffer_frame(v,callback)
+                     return
+                 if callback:
+                    callback( SendRecord(0,t_w,t_w,time.monotonic_ns(),len(frame),None) )
+              else:
+                 warn("  -> ERROR write bytes to Arduino => Serial conncetion is closed\n")
+                 notify_error(callback,v,ConnectionError("serial connection is closed"))
+          finally:
+              if prof: prof.record("evc.write_bytes",t_p)
              
       def number2byte( self,v ):
           """ 
@@ -319,6 +997,7 @@ class JuMEG_Psycho_EventCode(object):
              output : numpy byte array size:4 
              example: 2048+255 => [255,8,0,0]
           """   
+          import numpy as np
           b  = np.zeros(4,dtype=np.uint8)
           mask = np.uint8(255)
           b[0] = v & mask
@@ -328,22 +1007,18 @@ class JuMEG_Psycho_EventCode(object):
           return b
       
       def send(self,eventcode=0,duration_ms=-1): 
-           
+          prof = self.profiler
+          if prof: t_p = prof.mark()
           if not eventcode:
              eventcode = 0
              
           if duration_ms ==-1:
              duration_ms = self.duration_ms 
-         #--- send as byte 
+         #--- send as byte, frame is precompiled & cached in encoder
           if self.send_byte_code:
-             db      = np.zeros( self.__byte_array_size,dtype=np.uint8)
-             db[0]   = self.cmd_code_switch_on
-             db[1:3] = self.number2byte(eventcode)[0:2]
-             db[3:]  = self.number2byte(duration_ms)
-             #print "test"
-             #print db
-            #db=bytes(bytearray([111,255,255,0,0,0,0])
-             self.write_bytes( bytearray( db ) )
+             if self.__journal:
+                self.__journal.log(self.cmd_code_switch_on,eventcode,duration_ms)
+             self.write_bytes( self.__encoder.switch_on(eventcode,duration_ms) )
              if self.verbose:
                 print("---> DONE Send: ")
                 print("  -> eventcode %d" % (eventcode))
@@ -354,54 +1029,332 @@ class JuMEG_Psycho_EventCode(object):
          #--- send as string  no bytearray(t implemented !!!! 
              warn(" --> Warning Arduino setup can only read bytes!!!\n")
               # self.write( self.__SWITCH_ON_CODE_STR+','+str(eventcode)+','+str(duration_ms) + ',0' )
+          if prof: prof.record("evc.send",t_p)
               
       def sendEventCode(self,eventcode=0,duration_ms=-1) :
           self.send(eventcode=eventcode,duration_ms=duration_ms)
+
+      def encode(self,eventcode=0,duration_ms=-1):
+          """
+          pre-encoded switch-on frame for sendFrame() e.g. in a flip callback
+
+          :return:
+            bytes
+          """
+          if not eventcode:
+             eventcode = 0
+          if duration_ms ==-1:
+             duration_ms = self.duration_ms
+          return self.__encoder.switch_on(eventcode,duration_ms)
+
+      def sendFrame(self,frame,callback=None):
+          """
+          write a pre-encoded frame, journal entry is decoded from the frame
+          no encoding, no print: one write
+
+          :param frame   : bytes from encode()
+          :param callback: async_mode: callback(SendRecord) after transmit
+          """
+          if self.__journal:
+             self.__journal.log(frame[0],frame[1] | (frame[2] << 8),int.from_bytes(frame[3:7],"little"))
+          self.write_bytes(frame,callback=callback)
+
+      def send_at(self,eventcode=0,t_ns=None,duration_ms=-1,callback=None):
+          """
+          switch on <eventcode> at host time <t_ns>, the Arduino fires the code from its timer
+          at the converted device time, host write latency and jitter do not shift the edge
+          send well ahead of <t_ns>: > frame transmit time + timer tick (200 us)
+          a new send_at replaces a pending code, sendSwitchOff cancels it
+
+          :param eventcode  : eventcode + triggercode<<8
+          :param t_ns       : target time time.monotonic_ns()
+          :param duration_ms: duration in ms
+          :param callback   : async_mode: callback(SendRecord) after transmit
+          :return:
+            target device time micros() unwrapped in us, None if the clock is not synced
+          """
+          if not self.__clock.isSynced:
+             warn("---> ERROR send at: clock not synced, call syncClock() first\n")
+             return None
+          if not eventcode:
+             eventcode = 0
+          if duration_ms ==-1:
+             duration_ms = self.duration_ms
+          t_dev = int(round( self.__clock.to_device_us(t_ns) ))
+          if self.__journal:
+             self.__journal.log(SWITCH_ON_AT,eventcode,duration_ms,t_ns=t_ns)
+          self.write_bytes( self.__encoder.switch_on_at(eventcode,duration_ms,t_dev),callback=callback )
+          return t_dev
+
+      async def send_async(self,eventcode=0,duration_ms=-1):
+          """
+          asyncio API on the writer thread engine
+          starts the writer thread if not running, send() and sendFrame() write direct unless <async_mode>
           
+          Example:
+          --------
+           rec = await evc.send_async(eventcode=16,duration_ms=100)
+           print("latency [ms]: ",(rec.t_write_done - rec.t_enqueue) * 1.0e-6)
+
+          :return:
+            SendRecord with enqueue, write-start and write-complete time [ns]
+          """
+          if not eventcode:
+             eventcode = 0
+          if duration_ms ==-1:
+             duration_ms = self.duration_ms
+          if not self.isConnected:
+             warn("  -> ERROR write bytes to Arduino => Serial conncetion is closed\n")
+             return None
+          if not self.__sender.isRunning:
+             self.__sender.start(self.serial)
+
+          if self.__journal:
+             self.__journal.log(self.cmd_code_switch_on,eventcode,duration_ms)
+
+          import asyncio
+          loop = asyncio.get_running_loop()
+          fut  = loop.create_future()
+
+          def _done(rec):
+              loop.call_soon_threadsafe(lambda: fut.done() or fut.set_result(rec))
+
+          frame = self.__encoder.switch_on(eventcode,duration_ms)
+          if self.__protocol == 2:
+             frame = self.__encoder.wrap(frame)
+          if self.__sender.put(frame,callback=_done) < 0:
+             return None
+          return await fut
+          
+      def _seq_codes(self,seq):
+          """ seq as flat list of 16 bit codes: eventcode + triggercode<<8 """
+          return flatten_codes(seq)
+
       def sendSeq(self,seq=None,duration_seq_ms=-1):
           '''
           send event code seq 
           cmd,number of codes, codes low,high byte .., duration 2 byte
+          max 61 codes (SEQ_MAX_DATA_COUNTS 122 bytes), use sendSeqStream for longer sequences
           '''
-          if not seq:
+          seq_ar = self._seq_codes(seq)
+          if not seq_ar:
               return
           
           if duration_seq_ms ==-1:
              duration_seq_ms = self.duration_seq_ms 
      #--- send as byte 
           if self.send_byte_code:
-            #--- arduino 7 byte offset for usual cmds 
-             mask     = np.uint8(255)
-             seq_ar   = np.array([seq],dtype=np.int).flatten()
-             cnt      = len(seq)
-             db       = np.zeros(7 + cnt*2,dtype=np.uint8)
-             db[0]    = self.cmd_code_send_seq
-             db[1]    = np.uint8(cnt*2) # 2 x cnt -> Low/High bytes->Eventcode & Trigger             
-             db[3:7]  = self.number2byte( duration_seq_ms) # 6,7 = 0
-             db[7::2] = seq_ar & mask 
-             db[8::2] = (seq_ar >> 8 ) & mask
+             if len(seq_ar) * 2 > SEQ_MAX_DATA_COUNTS:
+                warn("---> WARNING seq too long: {} codes, Arduino reads max {} codes, use sendSeqStream()\n".format(len(seq_ar),SEQ_MAX_DATA_COUNTS // 2))
+                seq_ar = seq_ar[:SEQ_MAX_DATA_COUNTS // 2]
+            #--- arduino 7 byte offset for usual cmds: cmd,2 x cnt -> Low/High bytes->Eventcode & Trigger,0,duration
+             db = self.__encoder.seq(seq_ar,duration_seq_ms,cmd=self.cmd_code_send_seq)
            
-             self.write_bytes( bytearray(db) ) 
+             if self.__journal:
+                self.__journal.log_array(self.cmd_code_send_seq,seq_ar,duration_seq_ms)
+             self.write_bytes( db ) 
              if self.verbose:
                 print("---> DONE send SEQ: ")
                 print( seq )            
                 print (db  )           
                 print("\n")
+
+      def sendSeqStream(self,seq=None,duration_seq_ms=-1,wait=True,timeout=None):
+          """
+          stream an event code seq of unlimited length
+          the seq is sent in chunks of 32 codes into two buffers on the Arduino,
+          a new chunk is sent when the Arduino returns a credit for a played buffer
+
+          :param seq            : list or array of codes eventcode + triggercode<<8
+          :param duration_seq_ms: duration of each code in ms <duration_seq_ms>
+          :param wait           : True : blocking till the last code is done
+                                  False: upload in a background thread, returns the thread
+          :param timeout        : timeout in s for a credit <2 x chunk duration + ack_timeout>
+          :return:
+            wait=True: dict with chunks, underruns, done; None on error
+            wait=False: threading.Thread, result in <thread.result>
+          """
+          seq_ar = self._seq_codes(seq)
+          if not seq_ar:
+             return None
+          if duration_seq_ms ==-1:
+             duration_seq_ms = self.duration_seq_ms
+          if not self.isConnected:
+             warn("  -> ERROR write bytes to Arduino => Serial conncetion is closed\n")
+             return None
+          if self.__journal:
+             self.__journal.log_array(SEQ_STREAM_START,seq_ar,duration_seq_ms)
+          if wait:
+             return self.__stream_seq(seq_ar,duration_seq_ms,timeout)
+
+          t = threading.Thread(target=lambda: setattr(t,"result",self.__stream_seq(seq_ar,duration_seq_ms,timeout)),
+                               name="JuMEG_Psycho_SeqStream",daemon=True)
+          t.result = None
+          t.start()
+          return t
+
+      def __stream_seq(self,seq_ar,duration_seq_ms,timeout):
+          """ upload loop of sendSeqStream, reads credits from the serial port """
+          payload = pack_codes(seq_ar)
+          nchunks = -(-len(payload) // SEQ_CHUNK_BYTES)
+          if timeout is None:
+             timeout = 2 * (SEQ_CHUNK_BYTES // 2) * max(duration_seq_ms,1) * 1.0e-3 + self.ack_timeout
+          result  = {"chunks":nchunks,"underruns":0,"done":False}
+          credits = 2 # two free buffers on the Arduino
+
+          def _read(tout):
+              b = self.__read_replies(tout)
+              result["underruns"] += b.count(SEQ_UNDERRUN)
+              if SEQ_DONE in b:
+                 result["done"] = True
+              return b.count(SEQ_CREDIT)
+
+          self.__reset_replies() # no credits of a previous stream
+          self.write_bytes( self.__encoder.seq_stream_start(duration_seq_ms) )
+          for i in range(nchunks):
+              while credits < 1:
+                    n = _read(timeout)
+                    if not n and not result["done"]:
+                       warn("---> ERROR seq stream: no credit from Arduino within {} s, chunk {} / {}\n".format(timeout,i,nchunks))
+                       return None
+                    credits += n
+              chunk = payload[i * SEQ_CHUNK_BYTES:(i + 1) * SEQ_CHUNK_BYTES]
+              self.write_bytes( self.__encoder.seq_stream_chunk(chunk,last=(i == nchunks - 1)) )
+              credits -= 1
+         #--- wait for the last buffers to be played
+          t_end = time.monotonic() + timeout + len(seq_ar) * duration_seq_ms * 1.0e-3
+          while not result["done"]:
+                dt = t_end - time.monotonic()
+                if dt <= 0:
+                   warn("---> WARNING seq stream: no done code from Arduino\n")
+                   break
+                _read(dt)
+          if result["underruns"]:
+             warn("---> WARNING seq stream: {} underruns, codes were delayed\n".format(result["underruns"]))
+          if self.verbose:
+             print("---> DONE send SEQ stream: {} codes in {} chunks".format(len(seq_ar),nchunks))
+          return result
+
+      def __read_replies(self,timeout):
+          """ read at least one reply byte or timeout, returns bytes """
+          if self.__reader.isRunning:
+             return self.__reader.read(timeout)
+          tout = self.serial.timeout
+          try:
+              self.serial.timeout = max(timeout,0)
+              b = self.serial.read( max(1,self.serial.in_waiting) )
+              self.__protocol_errors += b.count(NAK)
+              return b
+          finally:
+              self.serial.timeout = tout
            
-      def sendCmdList(self,cmd_str):
+      def compileCmdList(self,cmd_str,onset_ms=0,hold_ms=None):
+          """
+          compile command strings into a schedule, see JuMEG_Psycho_Schedule.from_cmd_list
+
+          :param cmd_str : "111,16,100;211,10,1,2,4;112" or list of command strings
+          :param onset_ms: onset of the first command
+          :param hold_ms : duration of "111,code,0", None: ValueError
+          :return:
+            JuMEG_Psycho_Schedule
+          """
+          from jumeg_psycho_schedule import JuMEG_Psycho_Schedule
+          return JuMEG_Psycho_Schedule.from_cmd_list(cmd_str,onset_ms=onset_ms,duration_ms=self.duration_ms,
+                                                     duration_seq_ms=self.duration_seq_ms,
+                                                     cmd_code_switch_on=self.cmd_code_switch_on,
+                                                     cmd_code_switch_off=self.cmd_code_switch_off,
+                                                     cmd_code_send_seq=self.cmd_code_send_seq,hold_ms=hold_ms)
+
+      def sendCmdList(self,cmd_str,as_schedule=False):
+          """
+          send command string e.g. "111,16,100"
+          as_schedule: compile into a schedule, upload and start on device, commands separated by ";"
+          """
           print(" --> send cmd list:")
           print("  -> "+ cmd_str)
-          cmd = [int(i) for i in cmd_str.split(',')]
-          if cmd[0] == self.cmd_code_switch_on:
+          if as_schedule:
+             if self.sendSchedule( self.compileCmdList(cmd_str) ):
+                self.startSchedule()
+             return
+          cmd,args = parse_cmd(cmd_str)
+          if cmd == self.cmd_code_switch_on:
              dt=-1
-             if len(cmd)>2: 
-                dt=cmd[2]
-             self.send(eventcode=cmd[1],duration_ms=dt)
-          elif cmd[0] == self.cmd_code_send_seq:
-             self.sendSeq(seq=cmd[2:],duration_seq_ms=cmd[1])
+             if len(args)>1: 
+                dt=args[1]
+             self.send(eventcode=args[0],duration_ms=dt)
+          elif cmd == self.cmd_code_send_seq:
+             self.sendSeq(seq=args[1:],duration_seq_ms=args[0])
             
-          elif cmd[0] == self.cmd_code_switch_off:
+          elif cmd == self.cmd_code_switch_off:
              self.sendSwitchOff()        
+
+      def sendSchedule(self,schedule,timeout=None):
+          """
+          upload a schedule, waits for the ACK of the Arduino
+          
+          :param schedule: JuMEG_Psycho_Schedule or array see JuMEG_Psycho_Schedule.compile()
+          :param timeout : timeout in s <ack_timeout + upload time>
+          :return:
+            True if ACK received
+          """
+          from jumeg_psycho_schedule import JuMEG_Psycho_Schedule
+          if not isinstance(schedule,JuMEG_Psycho_Schedule):
+             schedule = JuMEG_Psycho_Schedule(schedule)
+          if not self.isConnected:
+             warn("  -> ERROR write bytes to Arduino => Serial conncetion is closed\n")
+             return False
+          payload = schedule.tobytes()
+         #--- v2: chunks of V2_SCHEDULE_ENTRIES at their index, a chunk without ACK is sent again
+          n = V2_SCHEDULE_ENTRIES if self.__protocol == 2 else max(schedule.counts,1)
+          self.__schedule = None
+          for k in range(0,max(schedule.counts,1),n):
+              frame = self.__encoder.schedule_load(payload[k * SCHEDULE_ENTRY_SIZE:(k + n) * SCHEDULE_ENTRY_SIZE],offset=k)
+              tout  = timeout or self.ack_timeout + len(frame) * 10.0 / self.serial.baudrate
+              for retry in range(3 if self.__protocol == 2 else 1):
+                  self.__reset_replies()
+                  self.write_bytes(frame)
+                  if self.__wait_for_byte(ACK,tout):
+                     break
+              else:
+                  warn("---> ERROR schedule upload: no ACK from Arduino within {} s, entry {}\n".format(tout,k))
+                  return False
+          self.__schedule = schedule
+          if self.verbose:
+             print("---> DONE upload schedule: {} entries, {} ms".format(schedule.counts,schedule.duration_ms))
+          return True
+
+      def startSchedule(self,delay_ms=0):
+          """
+          start playback of the uploaded schedule, the codes are journaled with the planned onset times
+
+          :param delay_ms: playback starts <delay_ms> after the start frame is read by the Arduino
+          :return:
+            host start time time.monotonic_ns() of schedule onset 0
+          """
+          if self.__schedule is None:
+             warn("---> ERROR start schedule: no schedule uploaded\n")
+             return None
+          sch = self.__schedule
+          self.write_bytes( self.__encoder.schedule_start(delay_ms) )
+          t0  = time.monotonic_ns() + int(delay_ms) * 1000000
+          self.__schedule_t_end = t0 * 1.0e-9 + sch.duration_ms * 1.0e-3
+          if self.__journal:
+             import numpy as np
+             self.__journal.log_array(SCHEDULE_START,sch.codes(),sch.entries["duration_ms"].astype(np.int64),
+                                      t_ns=t0 + sch.entries["onset_ms"].astype(np.int64) * 1000000)
+          return t0
+
+      def waitSchedule(self,timeout=None):
+          """
+          wait for the SCHEDULE_DONE byte after the last code
+
+          :param timeout: timeout in s <rest of the schedule + ack_timeout>
+          :return:
+            True if done
+          """
+          if timeout is None:
+             timeout = max(self.__schedule_t_end - time.monotonic(),0) + self.ack_timeout
+          return self.__wait_for_byte(SCHEDULE_DONE,timeout)
          
       def sendStartCode(self,startcode=None,duration_ms=-1):
           if not startcode:
@@ -418,9 +1371,33 @@ class JuMEG_Psycho_EventCode(object):
          
       def sendSwitchOff(self):
           """https://stackoverflow.com/questions/31975356/python-arduino-serial-communication"""
-          self.write_bytes(bytearray([self.cmd_code_switch_off,0,0,0,0,0,0]) )           
+          if self.__journal:
+             self.__journal.log(self.cmd_code_switch_off,0,0)
+          self.write_bytes( self.__encoder.switch_off )           
           if self.verbose:
              print( " --> DONE send StopCode & switch off"   )
+      def sendSwitchOffAck(self,timeout=None):
+          """
+          send switch off with ack flag and wait for the ACK byte
+          blocking, bypasses the async writer thread
+
+          :param timeout: timeout in s <ack_timeout>
+          :return:
+            True if ACK received
+          """
+          if not self.isConnected:
+             return False
+          if timeout is None:
+             timeout = self.ack_timeout
+          self.__sender.wait(timeout)
+          self.__reset_replies()
+          if self.__journal:
+             self.__journal.log(self.cmd_code_switch_off,0,0)
+          frame = self.__encoder.switch_off_ack
+          self.serial.write( self.__encoder.wrap(frame) if self.__protocol == 2 else frame )
+          self.serial.flush()
+          return self.__wait_for_byte(ACK,timeout)
+
       def sendStopCode(self):
           self.sendSwitchOff()   
 
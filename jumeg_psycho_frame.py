@@ -0,0 +1,497 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+precompiled byte frames for the JuMEG Arduino eventcode box
+
+7 byte frame layout (see arduino/jumeg_eventcode01):
+   cmd, eventcode, triggercode, duration b0,b1,b2,b3
+
+   switch on : 111,255,1,0,4,0,0
+   switch off: 112,0,0,0,0,0,0
+               112,1,0,0,0,0,0 -> Arduino replies ACK
+   vendor id : 123,123,123,123,123,123,123
+   seq       : 211,counts,0,duration b0..b3,data[counts] max 122 bytes
+   seq stream: 212,0,0,duration b0..b3
+               213,counts,last,0,0,0,0,data[counts] max 64 bytes per chunk
+   schedule  : 214,counts b0,b1,offset b0..b3,entries[counts] 8 bytes each -> Arduino replies ACK
+               offset 0 starts a new schedule, offset > 0 adds entries (v2 upload in chunks)
+               215,0,0,delay b0..b3 start playback
+   clock ping: 216,id,0,0,0,0,0                     -> Arduino replies PONG,id,micros b0..b3
+   edge ack  : 217,enable,0,0,0,0,0                 -> Arduino replies EDGE,code b0,b1,micros b0..b3
+                                                       for every change of the TTL output
+   switch on at device time T: 218,eventcode,triggercode,duration b0..b3,T b0..b3   11 bytes
+   protocol  : 219,version,0,0,0,0,0                -> Arduino replies ACK and switches, no reply: v1 only
+   baudrate  : 220,mode,0,baudrate b0..b3           -> Arduino replies ACK and switches, NAK: rate not supported
+               mode 0: trial, the Arduino falls back to the old rate after BAUD_TRIAL_MS without confirm
+               mode 1: confirm the trial rate, mode 2: switch without trial e.g. back to the default rate
+   burst test: 221,counts,0,0,0,0,0,data[counts]    -> Arduino replies BAUD_ECHO,data[counts], max 122 bytes
+
+protocol v2: every frame above (body) is wrapped
+   0xA5,0x5A,len b0,b1,crc8(len),body[len],crc16 b0,b1
+   crc8: poly 0x07 init 0 (avr _crc8_ccitt_update), crc16: XMODEM poly 0x1021 init 0 (avr _crc_xmodem_update)
+   the Arduino drops a frame with header or CRC error and replies NAK, a frame with missing bytes
+   is dropped after an inter-byte timeout, the parser hunts for the next sync
+   7 x vendor id byte (123) switches back to v1 and replies the vendor id: port discovery works in v1 and v2
+
+single byte replies from the Arduino:
+   DEVICE_READY: after setup() e.g. bootloader reset
+   ACK         : switch off with ack flag done
+   SEQ_CREDIT  : seq stream chunk buffer is free
+   SEQ_UNDERRUN: seq stream waits for the next chunk
+   SEQ_DONE    : last code of the seq stream done
+   SCHEDULE_DONE: last code of the schedule done
+   NAK         : v2 frame dropped, header or CRC error; baudrate not supported
+packet replies, first byte is the marker:
+   PONG: 6 bytes, EDGE: 7 bytes, BAUD_ECHO: 1 + counts bytes of the burst test
+
+update 10.2026 fb
+"""
+
+import struct,time,binascii
+
+__version__='2026-10-18-001'
+
+FRAME_SIZE   = 7
+DEVICE_READY = b'\x11' # DC1
+ACK          = b'\x06'
+SEQ_CREDIT   = b'\x12' # DC2
+SEQ_UNDERRUN = b'\x14' # DC4
+SEQ_DONE     = b'\x04' # EOT
+SCHEDULE_DONE= b'\x13' # DC3
+PONG         = b'\x16' # SYN
+EDGE         = b'\x17' # ETB
+PONG_SIZE    = 6
+EDGE_SIZE    = 7
+
+SEQ_MAX_DATA_COUNTS = 122 # bytes in a 211 seq frame, 61 codes
+SEQ_CHUNK_BYTES     = 64  # bytes in a 213 stream chunk, 32 codes
+SEQ_STREAM_START    = 212
+SEQ_STREAM_CHUNK    = 213
+SCHEDULE_LOAD       = 214
+SCHEDULE_START      = 215
+SCHEDULE_ENTRY_SIZE = 8
+SCHEDULE_MAX_ENTRIES= 384 # 3 kB SRAM
+CLOCK_PING          = 216
+EDGE_ACK            = 217
+SWITCH_ON_AT        = 218
+SWITCH_ON_AT_SIZE   = 11
+PROTOCOL            = 219
+BAUDRATE            = 220
+BAUD_TEST           = 221
+BAUD_ECHO           = b'\x18' # CAN, echo of a burst test
+BAUD_TRIAL_MS       = 500     # Arduino falls back to the old baudrate without confirm
+BAUD_TRIAL,BAUD_CONFIRM,BAUD_SET = range(3)
+
+#--- protocol v2: sync,len b0,b1,header crc8,body[len],crc16 b0,b1
+PROTOCOL_SYNC       = b'\xa5\x5a'
+NAK                 = b'\x15' # NAK, v2 frame with header or CRC error dropped
+V2_HEADER_SIZE      = 5
+V2_MAX_BODY         = FRAME_SIZE + SEQ_MAX_DATA_COUNTS # 129, longest body: 211 seq
+V2_SCHEDULE_ENTRIES = (V2_MAX_BODY - FRAME_SIZE) // SCHEDULE_ENTRY_SIZE # schedule upload in chunks
+V2_NEED,V2_OK,V2_BAD,V2_SKIP,V2_VENDOR_ID = range(5)
+
+class JuMEG_Psycho_FrameEncoder(object):
+    """
+    builds the 7 byte command frames as immutable <bytes>
+    frames for (eventcode,duration_ms) pairs are cached,
+    a repeated send() is a single dict lookup, no numpy, no bytearray
+
+    Example:
+    --------
+     from jumeg_psycho_frame import JuMEG_Psycho_FrameEncoder
+     enc = JuMEG_Psycho_FrameEncoder()
+     enc.switch_on(255,1024)
+      -> b'o\\xff\\x00\\x00\\x04\\x00\\x00'
+     enc.switch_off
+      -> b'p\\x00\\x00\\x00\\x00\\x00\\x00'
+    """
+    def __init__(self,cmd_code_switch_on=111,cmd_code_switch_off=112,vendor_id_code=123,vendor_id_repetition=7,cache_size=1024):
+        super().__init__()
+        self._struct     = struct.Struct("<BHI") # cmd, code 16bit, duration 32bit => 7 bytes
+        self._cache      = dict()
+        self._wrapped    = dict() # v1 frame -> v2 frame
+        self.cache_size  = cache_size
+        self._cmd_code_switch_on  = cmd_code_switch_on
+        self._cmd_code_switch_off = cmd_code_switch_off
+        self._vendor_id_code      = vendor_id_code
+        self._vendor_id_repetition= vendor_id_repetition
+        self._update_static_frames()
+
+   #---
+    @property
+    def switch_off(self): return self._switch_off
+   #---
+    @property
+    def switch_off_ack(self): return self._switch_off_ack
+   #---
+    @property
+    def vendor_id(self): return self._vendor_id
+   #---
+    @property
+    def cache(self): return self._cache
+   #---
+    @property
+    def cmd_code_switch_on(self): return self._cmd_code_switch_on
+    @cmd_code_switch_on.setter
+    def cmd_code_switch_on(self,v):
+        if v != self._cmd_code_switch_on:
+           self._cmd_code_switch_on = v
+           self.clear()
+   #---
+    @property
+    def cmd_code_switch_off(self): return self._cmd_code_switch_off
+    @cmd_code_switch_off.setter
+    def cmd_code_switch_off(self,v):
+        self._cmd_code_switch_off = v
+        self._update_static_frames()
+   #---
+    @property
+    def vendor_id_code(self): return self._vendor_id_code
+    @vendor_id_code.setter
+    def vendor_id_code(self,v):
+        self._vendor_id_code = v
+        self._update_static_frames()
+   #---
+    @property
+    def vendor_id_repetition(self): return self._vendor_id_repetition
+    @vendor_id_repetition.setter
+    def vendor_id_repetition(self,v):
+        self._vendor_id_repetition = v
+        self._update_static_frames()
+
+    def _update_static_frames(self):
+        self._switch_off     = bytes( [self._cmd_code_switch_off & 0xFF] + [0] * (FRAME_SIZE-1) )
+        self._switch_off_ack = bytes( [self._cmd_code_switch_off & 0xFF,1] + [0] * (FRAME_SIZE-2) )
+        self._vendor_id      = bytes( [self._vendor_id_code & 0xFF] * self._vendor_id_repetition )
+
+    def clear(self):
+        """ clear frame cache """
+        self._cache.clear()
+
+    def encode(self,cmd,code,duration_ms):
+        """
+        pack one 7 byte frame, uncached
+        code and duration are masked to 16 / 32 bit like number2byte()
+
+        :param cmd        : command code e.g. 111
+        :param code       : eventcode + triggercode<<8
+        :param duration_ms: duration in ms
+        :return:
+          bytes
+        """
+        return self._struct.pack(cmd & 0xFF,code & 0xFFFF,duration_ms & 0xFFFFFFFF)
+
+    def seq(self,codes,duration_ms,cmd=211):
+        """
+        seq frame: 7 byte header with number of bytes, codes as 16 bit little endian
+
+        :param codes      : list of eventcode + triggercode<<8, max SEQ_MAX_DATA_COUNTS // 2
+        :param duration_ms: duration of each code in ms
+        :return:
+          bytes
+        """
+        return self.encode(cmd,len(codes) * 2,duration_ms) + pack_codes(codes)
+
+    def seq_stream_start(self,duration_ms):
+        """
+        start frame of a seq stream
+
+        :param duration_ms: duration of each code in ms, 0: firmware default
+        :return:
+          bytes
+        """
+        return self.encode(SEQ_STREAM_START,0,duration_ms)
+
+    def seq_stream_chunk(self,payload,last=False):
+        """
+        chunk frame of a seq stream: header + payload
+
+        :param payload: bytes eventcode,triggercode,... max SEQ_CHUNK_BYTES
+        :param last   : last chunk of the stream
+        :return:
+          bytes
+        """
+        if len(payload) > SEQ_CHUNK_BYTES:
+           raise ValueError("ERROR seq stream chunk too large: {} > {}".format(len(payload),SEQ_CHUNK_BYTES))
+        return bytes( (SEQ_STREAM_CHUNK,len(payload),1 if last else 0,0,0,0,0) ) + bytes(payload)
+
+    def schedule_load(self,payload,offset=0):
+        """
+        upload frame of a schedule: header + entries
+
+        :param payload: bytes of SCHEDULE_ENTRY_SIZE entries e.g. JuMEG_Psycho_Schedule.tobytes()
+        :param offset : index of the first entry, 0: new schedule
+        :return:
+          bytes
+        """
+        n = len(payload) // SCHEDULE_ENTRY_SIZE
+        if offset + n > SCHEDULE_MAX_ENTRIES or len(payload) % SCHEDULE_ENTRY_SIZE:
+           raise ValueError("ERROR schedule size: {} bytes at entry {}, max {} entries of {} bytes".format(len(payload),offset,SCHEDULE_MAX_ENTRIES,SCHEDULE_ENTRY_SIZE))
+        return self.encode(SCHEDULE_LOAD,n,offset) + bytes(payload)
+
+    def schedule_start(self,delay_ms=0):
+        """
+        start frame of the uploaded schedule
+
+        :param delay_ms: playback starts <delay_ms> after the frame is read
+        :return:
+          bytes
+        """
+        return self.encode(SCHEDULE_START,0,delay_ms)
+
+    def protocol(self,version):
+        """ protocol negotiation frame, the Arduino replies ACK if it switches to <version> """
+        return self.encode(PROTOCOL,version,0)
+
+    def baudrate(self,baudrate,mode=BAUD_TRIAL):
+        """
+        baudrate frame, the Arduino replies ACK at the old rate and switches
+
+        :param baudrate: bits/s
+        :param mode    : BAUD_TRIAL, BAUD_CONFIRM or BAUD_SET
+        :return:
+          bytes
+        """
+        return self.encode(BAUDRATE,mode,baudrate)
+
+    def baud_test(self,payload):
+        """ burst test frame: header + payload max SEQ_MAX_DATA_COUNTS bytes, echoed by the Arduino """
+        if len(payload) > SEQ_MAX_DATA_COUNTS:
+           raise ValueError("ERROR burst test too large: {} > {}".format(len(payload),SEQ_MAX_DATA_COUNTS))
+        return self.encode(BAUD_TEST,len(payload),0) + bytes(payload)
+
+    def wrap(self,frame):
+        """
+        protocol v2 frame of a v1 frame, 7 byte frames are cached
+        :return:
+          bytes
+        """
+        v2 = self._wrapped.get(frame)
+        if v2 is None:
+           v2 = wrap_frame(frame)
+           if len(frame) == FRAME_SIZE:
+              if len(self._wrapped) >= self.cache_size:
+                 self._wrapped.clear()
+              self._wrapped[frame] = v2
+        return v2
+
+    def ping(self,ping_id=0):
+        """ clock ping frame, <ping_id> 0-255 is returned in the PONG """
+        return self.encode(CLOCK_PING,ping_id & 0xFF,0)
+
+    def edge_ack(self,enable=True):
+        """ enable / disable EDGE replies """
+        return self.encode(EDGE_ACK,1 if enable else 0,0)
+
+    def switch_on_at(self,eventcode,duration_ms,t_device_us):
+        """
+        switch-on frame fired by the Arduino at device time <t_device_us>
+
+        :param eventcode  : eventcode + triggercode<<8
+        :param duration_ms: duration in ms
+        :param t_device_us: Arduino micros(), masked to 32 bit
+        :return:
+          bytes
+        """
+        return self.encode(SWITCH_ON_AT,eventcode,duration_ms) + (int(t_device_us) & 0xFFFFFFFF).to_bytes(4,"little")
+
+    def switch_on(self,eventcode,duration_ms):
+        """
+        switch-on frame for eventcode, cached by (eventcode,duration_ms)
+
+        :param eventcode  : eventcode + triggercode<<8
+        :param duration_ms: duration in ms
+        :return:
+          bytes
+        """
+        try:
+            return self._cache[(eventcode,duration_ms)]
+        except KeyError:
+            pass
+        frame = self.encode(self._cmd_code_switch_on,eventcode,duration_ms)
+        if len(self._cache) >= self.cache_size:
+           self._cache.clear()
+        self._cache[(eventcode,duration_ms)] = frame
+        return frame
+
+
+def parse_cmd(cmd_str):
+    """
+    :param cmd_str: "111,16,100"
+    :return:
+      cmd, list of int arguments
+    """
+    cmd = [int(i) for i in cmd_str.split(',')]
+    return cmd[0],cmd[1:]
+
+
+def baud_test_pattern(k,n=SEQ_MAX_DATA_COUNTS):
+    """
+    payload of burst test <k>: all byte values over the bursts incl. 0x00, 0xFF and alternating bits
+
+    :param k: burst index
+    :param n: number of bytes
+    :return:
+      bytes
+    """
+    return bytes( (i * 73 + k * 29) & 0xFF for i in range(n) )
+
+
+def crc8(data,crc=0):
+    """ CRC-8 poly 0x07 as avr-libc _crc8_ccitt_update """
+    for b in data:
+        crc ^= b
+        for i in range(8):
+            crc = ((crc << 1) ^ 0x07) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+    return crc
+
+
+def crc16(data,crc=0):
+    """ CRC-16/XMODEM as avr-libc _crc_xmodem_update """
+    return binascii.crc_hqx(data,crc)
+
+
+def wrap_frame(body):
+    """
+    protocol v2 frame: sync,len b0,b1,crc8(len),body,crc16(body) b0,b1
+
+    :param body: v1 frame incl. payload, max V2_MAX_BODY bytes
+    :return:
+      bytes
+    """
+    n = len(body)
+    if not 0 < n <= V2_MAX_BODY:
+       raise ValueError("ERROR protocol v2 frame size: {} bytes, max {}".format(n,V2_MAX_BODY))
+    hdr = bytes( (n & 0xFF,n >> 8) )
+    return PROTOCOL_SYNC + hdr + bytes( (crc8(hdr),) ) + bytes(body) + crc16(body).to_bytes(2,"little")
+
+
+def unwrap_frame(frame):
+    """ body of a v2 frame, a v1 frame is returned unchanged """
+    if frame[:2] == PROTOCOL_SYNC and len(frame) > V2_HEADER_SIZE + 2:
+       return bytes(frame[V2_HEADER_SIZE:-2])
+    return frame
+
+
+def parse_v2(buf,vendor_id_code=123):
+    """
+    parse the head of <buf> like the firmware v2 parser
+
+    :param buf: received bytes
+    :return:
+      status,used,body
+      V2_NEED     : incomplete, wait for more bytes
+      V2_OK       : <used> bytes are a valid frame, body is the v1 frame
+      V2_BAD      : header or CRC error, drop <used> bytes, the Arduino replies NAK
+      V2_SKIP     : no sync, drop <used> bytes
+      V2_VENDOR_ID: 7 x vendor id byte, drop <used> bytes, back to v1
+    """
+    n = len(buf)
+    if not n:
+       return V2_NEED,0,None
+    if buf[0] != PROTOCOL_SYNC[0]:
+       if buf[0] == vendor_id_code:
+          k = 0
+          while k < n and k < 7 and buf[k] == vendor_id_code:
+                k += 1
+          if k == 7:
+             return V2_VENDOR_ID,7,None
+          if k == n:
+             return V2_NEED,0,None
+       return V2_SKIP,1,None
+    if n < 2:
+       return V2_NEED,0,None
+    if buf[1] != PROTOCOL_SYNC[1]:
+       return V2_SKIP,1,None
+    if n < V2_HEADER_SIZE:
+       return V2_NEED,0,None
+    size = buf[2] | (buf[3] << 8)
+    if buf[4] != crc8(buf[2:4]) or not 0 < size <= V2_MAX_BODY:
+       return V2_BAD,V2_HEADER_SIZE,None
+    used = V2_HEADER_SIZE + size + 2
+    if n < used:
+       return V2_NEED,0,None
+    body = bytes( buf[V2_HEADER_SIZE:V2_HEADER_SIZE + size] )
+    if crc16(body) != buf[used - 2] | (buf[used - 1] << 8):
+       return V2_BAD,used,None
+    return V2_OK,used,body
+
+
+def pack_codes(codes):
+    """ list of eventcode + triggercode<<8 -> bytes, 16 bit little endian """
+    return struct.pack("<{}H".format(len(codes)),*codes)
+
+
+def flatten_codes(seq):
+    """
+    codes as flat list of int masked to 16 bit, no numpy needed
+
+    :param seq: int, list, nested list or array of eventcode + triggercode<<8
+    :return:
+      list of int
+    """
+    if seq is None:
+       return []
+    if hasattr(seq,"ravel"): # numpy array
+       seq = seq.ravel().tolist()
+    elif not hasattr(seq,"__iter__"):
+       seq = [seq]
+    out = []
+    for c in seq:
+        if hasattr(c,"__iter__"):
+           out.extend( flatten_codes(c) )
+        else:
+           out.append( int(c) & 0xFFFF )
+    return out
+
+
+def numpy_frame(eventcode,duration_ms,cmd=111):
+    """
+    switch-on frame as build by JuMEG_Psycho_EventCode <= 2020, reference for benchmarks
+    """
+    import numpy as np
+
+    def number2byte(v):
+        b    = np.zeros(4,dtype=np.uint8)
+        mask = np.uint8(255)
+        b[0] = v & mask
+        b[1] = (v >>  8) & mask
+        b[2] = (v >> 16) & mask
+        b[3] = (v >> 24) & mask
+        return b
+
+    db      = np.zeros(FRAME_SIZE,dtype=np.uint8)
+    db[0]   = cmd
+    db[1:3] = number2byte(eventcode)[0:2]
+    db[3:]  = number2byte(duration_ms)
+    return bytes( bytearray(db) )
+
+
+def benchmark(loops=100000,eventcode=16,duration_ms=200):
+    """
+    micro-benchmark: numpy frame build as in JuMEG_Psycho_EventCode <= 2020 vs FrameEncoder
+
+    :param loops      : number of frames per path
+    :param eventcode  : eventcode
+    :param duration_ms: duration in ms
+    :return:
+      dict with time per frame in us for each path
+    """
+    enc = JuMEG_Psycho_FrameEncoder()
+    if numpy_frame(eventcode,duration_ms) != enc.switch_on(eventcode,duration_ms):
+       raise ValueError("ERROR frame mismatch numpy <> encoder")
+
+    result = dict()
+    for name,fct in ( ("numpy",numpy_frame),("encoder uncached",lambda c,d: enc.encode(111,c,d)),
+                      ("encoder cached",enc.switch_on) ):
+        t0 = time.perf_counter()
+        for i in range(loops):
+            fct(eventcode,duration_ms)
+        result[name] = (time.perf_counter() - t0) / loops * 1.0e6
+        print(" --> {:<18}: {:8.3f} us/frame".format(name,result[name]))
+    return result
+
+
+if __name__ == "__main__":
+   print("---> JuMEG FrameEncoder micro-benchmark")
+   benchmark()
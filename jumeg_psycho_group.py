@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+group of JuMEG Arduino eventcode boxes e.g. one for MEG and one for EEG
+
+open / discovery / close run concurrently for all boxes,
+a code is put into the writer thread of every box (async_mode), the boxes are written in parallel
+for every send the inter-device skew of the write-complete times is recorded
+
+a group can be used as EventCode in JuMEGStim:
+   JuMEGStim(EventCode=JuMEG_Psycho_EventCodeGroup(ports=["/dev/ttyACM0","/dev/ttyACM1"]))
+
+Example:
+--------
+ from jumeg_psycho_group import JuMEG_Psycho_EventCodeGroup
+ grp = JuMEG_Psycho_EventCodeGroup()   # all boxes found on port_pattern
+ grp.open()
+ grp.send(16,100)
+ grp.wait()
+ print(grp.records[-1].skew_ns * 1.0e-3,"us")
+ print(grp.summary())
+ grp.close()
+
+update 10.2026 fb
+"""
+
+import threading
+from collections import deque,namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from warnings import warn
+
+from jumeg_psycho_eventcode  import JuMEG_Psycho_EventCode
+from jumeg_psycho_discovery import JuMEG_Psycho_PortDiscovery
+from jumeg_psycho_wait      import percentile
+
+__version__='2026-10-18-001'
+
+#--- times in ns time.monotonic_ns(), one entry per device in the order of <devices>
+GroupRecord = namedtuple("GroupRecord",["seq","t_enqueue","t_write_start","t_write_done","skew_ns","error"])
+
+
+class JuMEG_Psycho_EventCodeGroup(object):
+    """
+    fan-out of eventcodes to several boxes
+
+    :param devices: list of JuMEG_Psycho_EventCode, async_mode is set
+    :param ports  : list of ports, one JuMEG_Psycho_EventCode for each port
+                    devices and ports None: all boxes found on <port_pattern> at open()
+    :param history: number of GroupRecords kept
+    :param kwargs : parameter for new JuMEG_Psycho_EventCode e.g. baudrate, duration_ms, journal is not shared
+    """
+    def __init__(self,devices=None,ports=None,history=4096,**kwargs):
+        super().__init__()
+        self._kwargs  = kwargs
+        self._devices = list(devices) if devices else []
+        for d in self._devices: # open devices too, the fan-out needs the writer threads
+            d.async_mode = True
+        if ports:
+           self._devices.extend( self._new_device(port=p) for p in ports )
+        self._lock    = threading.Lock()
+        self._pending = dict()
+        self._seq     = 0
+        self._records = deque(maxlen=history)
+        self.port_pattern = kwargs.get("port_pattern",'/dev/ttyACM[0-9]*')
+        self.verbose  = kwargs.get("verbose",False)
+   #---
+    @property
+    def devices(self): return self._devices
+   #---
+    @property
+    def records(self): return self._records
+   #---
+    @property
+    def isConnected(self):
+        return bool(self._devices) and all(d.isConnected for d in self._devices)
+   #---
+    @property
+    def duration_ms(self): return self._devices[0].duration_ms if self._devices else self._kwargs.get("duration_ms",200)
+
+    def __len__(self):
+        return len(self._devices)
+
+    def _new_device(self,port=None):
+        kw = { k:v for k,v in self._kwargs.items() if k not in ("port_pattern","journal") }
+        kw["async_mode"] = True
+        if port:
+           kw["port"] = port
+        evc = JuMEG_Psycho_EventCode(**kw)
+        evc.find_port = False
+        return evc
+
+    def _map(self,fct,devices=None):
+        """ run fct(device) concurrently for all devices, returns list of results """
+        devices = self._devices if devices is None else devices
+        if not devices:
+           return []
+        with ThreadPoolExecutor(max_workers=len(devices)) as pool:
+             return list( pool.map(fct,devices) )
+
+    def open(self):
+        """
+        open all boxes concurrently, without devices all boxes on <port_pattern> are discovered
+        :return:
+          True if all boxes are connected
+        """
+        if not self._devices:
+           disc = JuMEG_Psycho_PortDiscovery(port_pattern=self.port_pattern,verbose=self.verbose,
+                                             baudrate=self._kwargs.get("baudrate",115200))
+           for port,ser in disc.find_all():
+               evc = self._new_device(port=port)
+               evc.attach(port,ser)
+               self._devices.append(evc)
+           if not self._devices:
+              warn("!!! ---> ERROR can not find Arduino ports: {}\n".format(self.port_pattern))
+              return False
+        else:
+           for d in self._devices:
+               d.async_mode = True
+           ok = self._map(lambda d: d.isConnected or d.open())
+           for d,v in zip(self._devices,ok):
+               if not v:
+                  warn("---> ERROR can not connect Arduino port: {}\n".format(d.ComPort))
+        return self.isConnected
+
+    def close(self):
+        self._map(lambda d: d.close())
+
+    def _done(self,seq,idx,rec):
+        """ sender callback, called in the writer thread of device <idx>, a frame not written has rec.error set """
+        with self._lock:
+             recs = self._pending.get(seq)
+             if recs is None:
+                return
+             recs[idx] = rec
+             if any(r is None for r in recs):
+                return
+             del self._pending[seq]
+        done = [r.t_write_done for r in recs]
+        self._records.append( GroupRecord(seq,min(r.t_enqueue for r in recs),tuple(r.t_write_start for r in recs),
+                                          tuple(done),max(done) - min(done),tuple(r.error for r in recs)) )
+
+    def sendFrame(self,frame):
+        """
+        put a pre-encoded frame into the writer thread of every box
+        :return:
+          group sequence id
+        """
+        with self._lock:
+             self._seq += 1
+             seq = self._seq
+             self._pending[seq] = [None] * len(self._devices)
+             if len(self._pending) > self._records.maxlen: # a device never answered, e.g. closed while the link was down
+                del self._pending[next(iter(self._pending))]
+        for idx,d in enumerate(self._devices):
+            d.sendFrame(frame,callback=lambda rec,idx=idx: self._done(seq,idx,rec))
+        return seq
+
+    def encode(self,eventcode=0,duration_ms=-1):
+        return self._devices[0].encode(eventcode=eventcode,duration_ms=duration_ms)
+
+    def send(self,eventcode=0,duration_ms=-1):
+        """ send eventcode to all boxes in parallel, returns group sequence id """
+        return self.sendFrame( self.encode(eventcode=eventcode,duration_ms=duration_ms) )
+
+    def sendEventCode(self,eventcode=0,duration_ms=-1):
+        return self.send(eventcode=eventcode,duration_ms=duration_ms)
+
+    def syncClock(self,n=16,interval=0.005,timeout=None):
+        """ clock synchronisation of all boxes concurrently, returns list of results """
+        return self._map(lambda d: d.syncClock(n=n,interval=interval,timeout=timeout))
+
+    def send_at(self,eventcode=0,t_ns=None,duration_ms=-1):
+        """
+        switch on <eventcode> at host time <t_ns> on all boxes, each box converts with its own clock
+        :return:
+          list of target device times, None if a clock is not synced (nothing sent)
+        """
+        if not all(d.clock.isSynced for d in self._devices):
+           warn("---> ERROR send at: clock not synced, call syncClock() first\n")
+           return None
+        return [ d.send_at(eventcode=eventcode,t_ns=t_ns,duration_ms=duration_ms) for d in self._devices ]
+
+    def sendStartCode(self,startcode=None,duration_ms=-1):
+        self.send(eventcode=startcode or self._devices[0].startcode,duration_ms=duration_ms)
+
+    def sendSwitchOff(self):
+        for d in self._devices:
+            d.sendSwitchOff()
+
+    def sendSeq(self,seq=None,duration_seq_ms=-1):
+        for d in self._devices:
+            d.sendSeq(seq=seq,duration_seq_ms=duration_seq_ms)
+
+    def wait(self,timeout=None):
+        """ wait till all boxes have written their queues """
+        return all( self._map(lambda d: d.sender.wait(timeout)) )
+
+    def stats(self):
+        """
+        :return:
+          dict: sends, skew p50/p99/max in us, latency enqueue -> last write done p50/p99 in us
+        """
+        recs = list(self._records)
+        skew = [r.skew_ns * 1.0e-3 for r in recs]
+        lat  = [(max(r.t_write_done) - r.t_enqueue) * 1.0e-3 for r in recs]
+        return { "devices" : len(self._devices),"sends": len(recs),
+                 "skew_p50_us": percentile(skew,50),"skew_p99_us": percentile(skew,99),
+                 "skew_max_us": max(skew) if skew else float("nan"),
+                 "latency_p50_us": percentile(lat,50),"latency_p99_us": percentile(lat,99) }
+
+    def summary(self):
+        return ("---> eventcode group: {devices} devices, {sends} sends\n"
+                "  -> skew [us] p50: {skew_p50_us:.1f} p99: {skew_p99_us:.1f} max: {skew_max_us:.1f}\n"
+                "  -> latency [us] p50: {latency_p50_us:.1f} p99: {latency_p99_us:.1f}".format(**self.stats()))
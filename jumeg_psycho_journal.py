@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+memory-mapped event journal for the JuMEG Arduino eventcode box
+
+fixed size ring file:
+   header  64 bytes: magic, version, capacity, record size, number of written records
+   records capacity x JOURNAL_DTYPE
+
+the file is MAP_SHARED, a record is in the page cache as soon as log() returns
+and survives a crash of the experiment process
+
+link events of the reconnect supervisor are journaled with the cmd codes
+LINK_DOWN, LINK_UP, FRAME_DROPPED and FRAME_LATE, see jumeg_psycho_supervisor
+
+Example:
+--------
+ from jumeg_psycho_journal import JuMEG_Psycho_EventJournal,load_journal
+ jnl = JuMEG_Psycho_EventJournal("/tmp/session01.jnl",capacity=100000)
+ jnl.log(111,16,200)
+ jnl.close()
+
+ data = load_journal("/tmp/session01.jnl")
+ data["t_ns"],data["cmd"],data["code"],data["duration"],data["seq"]
+
+update 10.2026 fb
+"""
+
+import os,time,threading
+import numpy as np
+
+__version__='2026-10-18-001'
+
+JOURNAL_MAGIC   = b"JUMEGJNL"
+JOURNAL_VERSION = 1
+HEADER_SIZE     = 64
+
+#--- t_ns: time.monotonic_ns(), cmd: 111,112,211,..., code: eventcode + triggercode<<8, seq: record number
+JOURNAL_DTYPE = np.dtype([("t_ns","<i8"),("cmd","u1"),("code","<u2"),("duration","<u4"),("seq","<u8")])
+HEADER_DTYPE  = np.dtype([("magic","S8"),("version","<u4"),("record_size","<u4"),("capacity","<u8"),("count","<u8")])
+
+
+def _read_header(fname):
+    hdr = np.fromfile(fname,dtype=HEADER_DTYPE,count=1)
+    if not len(hdr) or hdr["magic"][0] != JOURNAL_MAGIC:
+       raise ValueError("ERROR not a JuMEG event journal: {}".format(fname))
+    if hdr["record_size"][0] != JOURNAL_DTYPE.itemsize:
+       raise ValueError("ERROR JuMEG event journal record size mismatch: {}".format(fname))
+    return hdr[0]
+
+
+class JuMEG_Psycho_EventJournal(object):
+    """
+    preallocated memory-mapped ring of fixed size records
+    log() is one record write into the mapping, no allocation, no print
+    log() and log_array() are thread safe, the record slots and the header count are written under a lock
+
+    :param fname   : journal file, an existing journal is continued
+    :param capacity: number of records in the ring, the oldest records are overwritten
+    """
+    def __init__(self,fname,capacity=1000000):
+        super().__init__()
+        self._fname    = fname
+        self._capacity = int(capacity)
+        self._count    = 0
+        self._header   = None
+        self._records  = None
+        self._lock     = threading.Lock()
+        self.open()
+   #---
+    @property
+    def fname(self): return self._fname
+   #---
+    @property
+    def capacity(self): return self._capacity
+   #---
+    @property
+    def count(self): return self._count
+   #---
+    @property
+    def isOpen(self): return self._records is not None
+
+    def open(self):
+        """ create or continue the journal file """
+        if os.path.isfile(self._fname) and os.path.getsize(self._fname) > 0:
+           hdr = _read_header(self._fname)
+           self._capacity = int(hdr["capacity"])
+           self._header   = np.memmap(self._fname,dtype=HEADER_DTYPE,mode="r+",shape=(1,))
+        else:
+           d = os.path.dirname(self._fname)
+           if d:
+              os.makedirs(d,exist_ok=True)
+           with open(self._fname,"wb") as fd:
+                fd.truncate(HEADER_SIZE + self._capacity * JOURNAL_DTYPE.itemsize)
+           self._header = np.memmap(self._fname,dtype=HEADER_DTYPE,mode="r+",shape=(1,))
+           self._header[0] = (JOURNAL_MAGIC,JOURNAL_VERSION,JOURNAL_DTYPE.itemsize,self._capacity,0)
+        self._records = np.memmap(self._fname,dtype=JOURNAL_DTYPE,mode="r+",offset=HEADER_SIZE,shape=(self._capacity,))
+        self._count   = int(self._header["count"][0])
+       #--- field views, log() writes scalars into them
+        self._hdr_count = self._header["count"]
+        self._t_ns      = self._records["t_ns"]
+        self._cmd       = self._records["cmd"]
+        self._code      = self._records["code"]
+        self._duration  = self._records["duration"]
+        self._seq       = self._records["seq"]
+        return True
+
+    def log(self,cmd,code,duration,t_ns=None):
+        """
+        write one record, the header count is updated last
+
+        :param cmd     : command code e.g. 111
+        :param code    : eventcode + triggercode<<8
+        :param duration: duration in ms
+        :param t_ns    : timestamp <time.monotonic_ns()>
+        :return:
+          record sequence id
+        """
+        if t_ns is None:
+           t_ns = time.monotonic_ns()
+        with self._lock:
+             n = self._count
+             i = n % self._capacity
+             self._t_ns[i]     = t_ns
+             self._cmd[i]      = cmd & 0xFF
+             self._code[i]     = code & 0xFFFF
+             self._duration[i] = duration & 0xFFFFFFFF
+             self._seq[i]      = n
+             self._count       = n + 1
+             self._hdr_count[0]= n + 1
+        return n
+
+    def log_array(self,cmd,codes,duration,t_ns=None):
+        """
+        write records for an array of codes e.g. a sequence, one vectorized write
+
+        :param cmd     : command code e.g. 211
+        :param codes   : array of eventcode + triggercode<<8
+        :param duration: duration in ms, scalar or array for each code
+        :param t_ns    : timestamp <time.monotonic_ns()>, scalar or array e.g. planned onsets
+        :return:
+          record sequence id of the first code
+        """
+        codes = np.asarray(codes,dtype=np.int64).ravel()
+        if not codes.size:
+           return self._count
+        t_ns     = np.broadcast_to( np.asarray(time.monotonic_ns() if t_ns is None else t_ns,dtype=np.int64),codes.shape )
+        duration = np.broadcast_to( np.asarray(duration,dtype=np.int64),codes.shape )
+        with self._lock:
+             n0 = self._count
+             if codes.size > self._capacity: # only the last records survive in the ring
+                n0      += codes.size - self._capacity
+                codes    = codes[-self._capacity:]
+                t_ns     = t_ns[-self._capacity:]
+                duration = duration[-self._capacity:]
+             seq = np.arange(n0,n0 + codes.size,dtype=np.uint64)
+             idx = (seq % self._capacity).astype(np.intp)
+             self._t_ns[idx]     = t_ns
+             self._cmd[idx]      = cmd & 0xFF
+             self._code[idx]     = codes & 0xFFFF
+             self._duration[idx] = duration & 0xFFFFFFFF
+             self._seq[idx]      = seq
+             self._count         = n0 + codes.size
+             self._hdr_count[0]  = self._count
+        return n0
+
+    def flush(self):
+        """ write mapping to disk e.g. at the end of a block """
+        if self.isOpen:
+           self._records.flush()
+           self._header.flush()
+
+    def close(self):
+        self.flush()
+        self._records = self._header = None
+        self._hdr_count = self._t_ns = self._cmd = self._code = self._duration = self._seq = None
+
+    def to_array(self):
+        """
+        :return:
+          copy of all valid records in write order as numpy structured array
+        """
+        return _unroll(self._records,self._count,self._capacity)
+
+
+def _unroll(records,count,capacity):
+    if count <= capacity:
+       return np.array(records[:count])
+    i = count % capacity
+    return np.concatenate( (records[i:],records[:i]) )
+
+
+def load_journal(fname):
+    """
+    load event journal for offline alignment e.g. with MEG trigger channel
+
+    :param fname: journal file
+    :return:
+      numpy structured array JOURNAL_DTYPE in write order
+    """
+    hdr     = _read_header(fname)
+    records = np.memmap(fname,dtype=JOURNAL_DTYPE,mode="r",offset=HEADER_SIZE,shape=(int(hdr["capacity"]),))
+    return _unroll(records,int(hdr["count"]),int(hdr["capacity"]))
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+photodiode onset detection for the IOD marker of JuMEG_Psycho_IOD
+
+the analog photodiode channel is memory-mapped and read in chunks, memory is bounded by <chunk_size>
+ baseline : off level per <baseline_sec> block, median of the samples below the block minimum + off level,
+            a block on as a whole keeps the previous level, interpolated over the chunk, follows slow drifts
+ threshold: on above baseline + threshold, off below baseline + threshold x (1 - hysteresis),
+            the state between the two levels is kept, carried over chunk borders
+            threshold None: half the range of the first chunk (0.1 to 99.9 percentile)
+ onsets shorter than <min_samples> are ignored
+
+each IOD onset is paired with the nearest preceding eventcode of the trigger channel,
+the trigger-to-screen delay is reported per trial
+sessions are processed in parallel in a process pool
+
+Example:
+--------
+ from jumeg_psycho_photodiode import JuMEG_Psycho_PhotodiodeDetector,detect_sessions
+ from jumeg_psycho_verify     import load_trigger_channel
+ pd   = load_trigger_channel("run01.raw",dtype="<f4",n_channels=4,channel=3)
+ trig = load_trigger_channel("run01.raw",dtype="<f4",n_channels=4,channel=0)
+ det  = JuMEG_Psycho_PhotodiodeDetector(sfreq=1017.25)
+ res  = det.run(pd,trig)
+ res["onsets"]["delay_ms"]
+ print(det.summary())
+
+ sessions = [{"fname":"run01.raw","dtype":"<f4","n_channels":4,"channel":3,"trigger_channel":0,"sfreq":1017.25},...]
+ results  = detect_sessions(sessions,processes=4)
+
+ python jumeg_psycho_photodiode.py --sfreq 1017.25 --dtype "<f4" --channels 4 --channel 3 --trigger-channel 0 run*.raw
+
+update 10.2026 fb
+"""
+
+import os,sys,argparse
+from warnings import warn
+import numpy as np
+
+from jumeg_psycho_verify import JuMEG_Psycho_TriggerVerify,EVENT_DTYPE,load_trigger_channel
+
+__version__='2026-10-18-001'
+
+#--- sample: IOD onset, n_samples: on duration, code / event_sample: preceding eventcode, -1: not paired
+ONSET_DTYPE = np.dtype([("sample","<i8"),("n_samples","<i8"),("code","<i4"),("event_sample","<i8"),("delay_ms","<f8")])
+
+
+class JuMEG_Psycho_PhotodiodeDetector(object):
+    """
+    :param sfreq       : sampling rate in Hz
+    :param chunk_size  : samples per chunk
+    :param threshold   : on level above the baseline in channel units, None: from the first chunk
+    :param hysteresis  : off level = threshold x (1 - hysteresis)
+    :param baseline_sec: block length of the baseline, off level of each block
+    :param polarity    : -1: IOD on is a drop of the signal
+    :param min_samples : shorter onsets are ignored
+    :param max_delay_ms: eventcode to onset, later onsets are not paired
+    """
+    def __init__(self,sfreq=1000.0,chunk_size=10000000,threshold=None,hysteresis=0.3,baseline_sec=1.0,polarity=1,
+                 min_samples=2,max_delay_ms=200.0,verbose=False):
+        super().__init__()
+        self.sfreq        = float(sfreq)
+        self.chunk_size   = int(chunk_size)
+        self.threshold    = threshold
+        self.hysteresis   = hysteresis
+        self.baseline_sec = baseline_sec
+        self.polarity     = polarity
+        self.min_samples  = min_samples
+        self.max_delay_ms = max_delay_ms
+        self.verbose      = verbose
+        self._result      = None
+   #---
+    @property
+    def result(self): return self._result
+
+    def estimate_threshold(self,x):
+        """ half the range 0.1 .. 99.9 percentile of <x>, polarity applied, the median is the on level for long markers """
+        lo,hi = np.percentile(np.asarray(x,dtype=np.float64),[0.1,99.9])
+        amp = hi - lo
+        if amp <= 0:
+           warn("---> ERROR photodiode: no signal range in the first chunk, set threshold\n")
+        return 0.5 * amp
+
+    def _baseline(self,x,thr_off,level=None):
+        """
+        off level per block interpolated over the chunk
+        block: median of the samples below its 1 percentile + <thr_off>, IOD on samples are excluded,
+        a block above the previous off level + <thr_off> is on as a whole and keeps the previous level
+
+        :param x      : chunk, polarity applied
+        :param thr_off: off threshold above the baseline
+        :param level  : off level of the last block of the previous chunk
+        :return:
+          baseline, off level of the last block
+        """
+        b = max(int(self.baseline_sec * self.sfreq),1)
+        n = max(len(x) // b,1)
+        blocks = np.sort(x[:n * b].reshape(n,-1),axis=1)
+        lo  = blocks[:,blocks.shape[1] // 100]
+        c   = np.count_nonzero(blocks < (lo + thr_off)[:,None],axis=1) # off samples are the lowest of the block
+        off = blocks[np.arange(n),c // 2]
+        for k in range(n):
+            if level is not None and lo[k] - level > thr_off:
+               off[k] = level
+            level = off[k]
+        if n < 2:
+           return np.full(len(x),level),level
+        return np.interp(np.arange(len(x)),np.arange(n) * b + b / 2.0,off),level
+
+    def detect(self,data):
+        """
+        :param data: photodiode channel, 1d array or memmap
+        :return:
+          onset samples, on durations in samples
+        """
+        n     = len(data)
+        state = 0
+        level = None
+        thr   = self.threshold
+        on,off = [],[]
+        for i0 in range(0,n,self.chunk_size):
+            x = np.asarray(data[i0:i0 + self.chunk_size],dtype=np.float64) * self.polarity
+            if thr is None:
+               thr = self.threshold = self.estimate_threshold(x)
+            thr_on = abs(thr)
+            base,level = self._baseline(x,thr_on * (1.0 - self.hysteresis),level)
+            x -= base
+           #--- hysteresis: 1 above on level, 0 below off level, keep the state between
+            s = np.where(x > thr_on,1,np.where(x < thr_on * (1.0 - self.hysteresis),0,-1))
+            k = np.where(s >= 0,np.arange(len(s)),-1)
+            np.maximum.accumulate(k,out=k)
+            s = np.where(k >= 0,s[np.maximum(k,0)],state)
+            d = np.diff(s,prepend=state)
+            on.append(np.flatnonzero(d > 0) + i0)
+            off.append(np.flatnonzero(d < 0) + i0)
+            state = s[-1]
+            if self.verbose:
+               print("  -> photodiode: {:.1f} %".format(100.0 * min(i0 + self.chunk_size,n) / n),end="\r")
+        if self.verbose and n:
+           print()
+        on  = np.concatenate(on)  if on  else np.zeros(0,np.int64)
+        off = np.concatenate(off) if off else np.zeros(0,np.int64)
+        if len(off) < len(on): # on at the end of the recording
+           off = np.append(off,n)
+        length = off - on
+        m = length >= self.min_samples
+        return on[m],length[m]
+
+    def pair(self,onsets,length,events):
+        """
+        pair each onset with the nearest preceding eventcode, an eventcode is paired once
+
+        :param onsets: onset samples
+        :param length: on durations in samples
+        :param events: EVENT_DTYPE of the trigger channel
+        :return:
+          np.array ONSET_DTYPE
+        """
+        res = np.zeros(len(onsets),dtype=ONSET_DTYPE)
+        res["sample"],res["n_samples"] = onsets,length
+        res["code"],res["event_sample"],res["delay_ms"] = -1,-1,np.nan
+        if not len(events) or not len(onsets):
+           return res
+        k = np.searchsorted(events["sample"],onsets,side="right") - 1
+        delay = (onsets - events["sample"][np.maximum(k,0)]) / self.sfreq * 1.0e3
+        m = (k >= 0) & (delay <= self.max_delay_ms)
+        _,first = np.unique(np.where(m,k,-1),return_index=True) # first onset after an eventcode
+        once = np.zeros(len(onsets),dtype=bool)
+        once[first] = True
+        m &= once
+        res["code"][m]         = events["code"][k[m]]
+        res["event_sample"][m] = events["sample"][k[m]]
+        res["delay_ms"][m]     = delay[m]
+        return res
+
+    def run(self,photodiode,trigger=None,events=None):
+        """
+        :param photodiode: photodiode channel, 1d array or memmap
+        :param trigger   : trigger channel, events are found with JuMEG_Psycho_TriggerVerify
+        :param events    : EVENT_DTYPE, instead of <trigger>
+        :return:
+          dict: onsets ONSET_DTYPE, events, unpaired_events (no onset within max_delay_ms)
+        """
+        if events is None:
+           if trigger is None:
+              events = np.zeros(0,dtype=EVENT_DTYPE)
+           else:
+              events = JuMEG_Psycho_TriggerVerify(sfreq=self.sfreq,chunk_size=self.chunk_size).find_events(trigger)
+        on,length = self.detect(photodiode)
+        onsets = self.pair(on,length,events)
+        paired = np.zeros(len(events),dtype=bool)
+        paired[np.searchsorted(events["sample"],onsets["event_sample"][onsets["code"] >= 0])] = True
+        self._result = {"onsets":onsets,"events":events,"unpaired_events":events[~paired],"threshold":self.threshold}
+        return self._result
+
+    def stats(self,result=None):
+        r = result or self._result
+        d = r["onsets"]["delay_ms"]
+        d = d[~np.isnan(d)]
+        return {"onsets"         : len(r["onsets"]),
+                "paired"         : len(d),
+                "unpaired_onsets": len(r["onsets"]) - len(d),
+                "unpaired_events": len(r["unpaired_events"]),
+                "delay_mean_ms"  : float(np.mean(d)) if d.size else np.nan,
+                "delay_std_ms"   : float(np.std(d))  if d.size else np.nan,
+                "delay_min_ms"   : float(np.min(d))  if d.size else np.nan,
+                "delay_max_ms"   : float(np.max(d))  if d.size else np.nan}
+
+    def summary(self,result=None):
+        s = self.stats(result)
+        return ("---> photodiode: {onsets} onsets, paired: {paired}, unpaired onsets: {unpaired_onsets}, "
+                "eventcodes without onset: {unpaired_events}\n"
+                "  -> trigger to screen [ms] mean: {delay_mean_ms:.3f} std: {delay_std_ms:.3f} "
+                "min: {delay_min_ms:.3f} max: {delay_max_ms:.3f}".format(**s))
+
+
+def detect_session(session):
+    """
+    one session, runs in a worker process
+
+    :param session: dict: fname, sfreq, dtype <f4, n_channels 1, channel 0, offset 0,
+                    trigger_fname <fname>, trigger_dtype <dtype>, trigger_channel None: no pairing,
+                    further keys are parameter of JuMEG_Psycho_PhotodiodeDetector
+    :return:
+      dict: fname, result of JuMEG_Psycho_PhotodiodeDetector.run, stats
+    """
+    s  = dict(session)
+    fname  = s.pop("fname")
+    dtype  = s.pop("dtype","<f4")
+    nch    = s.pop("n_channels",1)
+    offset = s.pop("offset",0)
+    pd     = load_trigger_channel(fname,dtype=dtype,n_channels=nch,channel=s.pop("channel",0),offset=offset)
+    t_ch   = s.pop("trigger_channel",None)
+    t_fname= s.pop("trigger_fname",fname)
+    t_dtype= s.pop("trigger_dtype",dtype)
+    trig   = None
+    if t_ch is not None:
+       trig = load_trigger_channel(t_fname,dtype=t_dtype,n_channels=nch if t_fname == fname else 1,
+                                   channel=t_ch if t_fname == fname else 0,offset=offset if t_fname == fname else 0)
+    det = JuMEG_Psycho_PhotodiodeDetector(**s)
+    res = det.run(pd,trig)
+    return {"fname":fname,"result":res,"stats":det.stats()}
+
+
+def detect_sessions(sessions,processes=None):
+    """
+    sessions in a process pool
+
+    :param sessions : list of session dicts, see detect_session
+    :param processes: worker processes <os.cpu_count()>, 1: no pool
+    :return:
+      list of detect_session results in the order of <sessions>
+    """
+    if processes == 1 or len(sessions) < 2:
+       return [detect_session(s) for s in sessions]
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=min(processes or os.cpu_count() or 1,len(sessions))) as pool:
+         return list( pool.map(detect_session,sessions) )
+
+
+def get_args(argv=None):
+    opt = argparse.ArgumentParser(description="JuMEG photodiode IOD onsets and trigger to screen delay")
+    opt.add_argument("fnames",nargs="+",help="raw files, one per session")
+    opt.add_argument("--sfreq",type=float,required=True,help="sampling rate in Hz")
+    opt.add_argument("--dtype",default="<f4",help="sample type")
+    opt.add_argument("--channels",type=int,default=1,help="channels per sample in the raw file")
+    opt.add_argument("--channel",type=int,default=0,help="photodiode channel index")
+    opt.add_argument("--trigger-channel",type=int,default=None,help="trigger channel index, pairs onsets with eventcodes")
+    opt.add_argument("--offset",type=int,default=0,help="header bytes")
+    opt.add_argument("--threshold",type=float,default=None)
+    opt.add_argument("--polarity",type=int,default=1,choices=(1,-1))
+    opt.add_argument("--max-delay-ms",type=float,default=200.0)
+    opt.add_argument("-j","--processes",type=int,default=None,help="worker processes")
+    return opt.parse_args(argv)
+
+
+def main(argv=None):
+    args = get_args(argv)
+    sessions = [ {"fname":f,"sfreq":args.sfreq,"dtype":args.dtype,"n_channels":args.channels,"channel":args.channel,
+                  "trigger_channel":args.trigger_channel,"offset":args.offset,"threshold":args.threshold,
+                  "polarity":args.polarity,"max_delay_ms":args.max_delay_ms} for f in args.fnames ]
+    det = JuMEG_Psycho_PhotodiodeDetector(sfreq=args.sfreq)
+    for r in detect_sessions(sessions,processes=args.processes):
+        print(" --> {}".format(r["fname"]))
+        print( det.summary(r["result"]) )
+    return 0
+
+
+if __name__ == "__main__":
+   sys.exit( main() )
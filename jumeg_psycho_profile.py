@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+profiling hooks of the present() pipeline
+
+instrumented: JuMEGStim.present (phases), JuMEGStim.run_schedule, JuMEG_Psycho_IOD.draw / hide,
+JuMEG_Psycho_EventCode.send / write_bytes
+each instrumented method reads the class attribute <profiler> once, None: no further cost
+a profiler gets the phase name and start / end time time.perf_counter_ns() of every span
+and passes them to its collectors
+ JuMEG_Psycho_HistogramCollector: HDR-style log-linear histogram per phase, fixed memory, ~1 % resolution
+ JuMEG_Psycho_TraceCollector    : ring of spans, export as Chrome trace / Perfetto JSON (chrome://tracing, ui.perfetto.dev)
+
+Example:
+--------
+ from jumeg_psycho_profile import JuMEG_Psycho_Profiler,install,uninstall
+ prof = install( JuMEG_Psycho_Profiler(trace=True) )
+ ... experiment ...
+ print(prof.summary())
+ prof.export_trace("run01_trace.json")
+ uninstall()
+
+ # own spans
+ with prof.span("load images"):
+      ...
+
+update 10.2026 fb
+"""
+
+import os,json,time,threading
+from collections import deque
+from contextlib import contextmanager
+
+__version__='2026-10-18-001'
+
+
+class JuMEG_Psycho_HdrHistogram(object):
+    """
+    log-linear histogram of integer values e.g. ns, constant relative resolution 2**-(sub_bits-1)
+    values < 2**sub_bits are counted exactly, above: 2**(sub_bits-1) buckets per power of two
+
+    :param sub_bits: resolution bits, 7: < 1.6 % error
+    """
+    def __init__(self,sub_bits=7):
+        super().__init__()
+        self.sub_bits = sub_bits
+        self._sub     = 1 << sub_bits
+        self._half    = self._sub >> 1
+        self._counts  = [0] * (self._sub + 64 * self._half)
+        self.reset()
+
+    def reset(self):
+        self._counts[:] = [0] * len(self._counts)
+        self.count = 0
+        self.total = 0
+        self.min   = None
+        self.max   = 0
+
+    def _index(self,v):
+        if v < self._sub:
+           return v
+        e = v.bit_length() - self.sub_bits
+        return self._sub + (e - 1) * self._half + (v >> e) - self._half
+
+    def _value(self,i):
+        """ lower bound of bucket <i> """
+        if i < self._sub:
+           return i
+        e,m = divmod(i - self._sub,self._half)
+        return (m + self._half) << (e + 1)
+
+    def record(self,v):
+        v = max(int(v),0)
+        self._counts[self._index(v)] += 1
+        self.count += 1
+        self.total += v
+        if self.min is None or v < self.min:
+           self.min = v
+        if v > self.max:
+           self.max = v
+
+    def percentile(self,q):
+        """ value at percentile <q>, lower bound of the bucket """
+        if not self.count:
+           return float("nan")
+        n = max(int(round(q / 100.0 * self.count)),1)
+        c = 0
+        for i,k in enumerate(self._counts):
+            c += k
+            if c >= n:
+               return min(max(self._value(i),self.min),self.max)
+        return self.max
+
+    @property
+    def mean(self): return self.total / self.count if self.count else float("nan")
+
+    def buckets(self):
+        """ list of (lower bound,count) of the filled buckets """
+        return [ (self._value(i),k) for i,k in enumerate(self._counts) if k ]
+
+
+class JuMEG_Psycho_HistogramCollector(object):
+    """ one JuMEG_Psycho_HdrHistogram of the durations in ns per phase name """
+    def __init__(self,sub_bits=7):
+        super().__init__()
+        self.sub_bits    = sub_bits
+        self._histograms = {}
+   #---
+    @property
+    def histograms(self): return self._histograms
+
+    def add(self,name,t0,t1,tid):
+        h = self._histograms.get(name)
+        if h is None:
+           h = self._histograms[name] = JuMEG_Psycho_HdrHistogram(self.sub_bits)
+        h.record(t1 - t0)
+
+    def reset(self):
+        self._histograms.clear()
+
+    def stats(self):
+        """
+        :return:
+          dict per phase: count, mean, p50, p90, p99, p99.9, max in us
+        """
+        return { k: {"count":h.count,"mean_us":h.mean * 1.0e-3,"p50_us":h.percentile(50) * 1.0e-3,
+                     "p90_us":h.percentile(90) * 1.0e-3,"p99_us":h.percentile(99) * 1.0e-3,
+                     "p999_us":h.percentile(99.9) * 1.0e-3,"max_us":h.max * 1.0e-3}
+                 for k,h in sorted(self._histograms.items()) }
+
+
+class JuMEG_Psycho_TraceCollector(object):
+    """
+    ring of spans for the Chrome trace / Perfetto JSON export
+
+    :param capacity: spans kept, the oldest are dropped
+    """
+    def __init__(self,capacity=200000):
+        super().__init__()
+        self._spans = deque(maxlen=capacity)
+        self._t0    = time.perf_counter_ns()
+   #---
+    @property
+    def spans(self): return self._spans
+
+    def add(self,name,t0,t1,tid):
+        self._spans.append( (name,t0,t1,tid) )
+
+    def reset(self):
+        self._spans.clear()
+
+    def to_dict(self):
+        """ Chrome trace event format: complete events (ph X), times in us """
+        pid = os.getpid()
+        names = { t.ident: t.name for t in threading.enumerate() }
+        ev = [ {"name":"thread_name","ph":"M","pid":pid,"tid":tid,"args":{"name":names.get(tid,str(tid))}}
+               for tid in sorted({s[3] for s in self._spans}) ]
+        ev.extend( {"name":name,"cat":name.split(".")[0],"ph":"X","pid":pid,"tid":tid,
+                    "ts":(t0 - self._t0) * 1.0e-3,"dur":(t1 - t0) * 1.0e-3} for name,t0,t1,tid in self._spans )
+        return {"traceEvents":ev,"displayTimeUnit":"ms"}
+
+    def export(self,fname):
+        with open(fname,"w") as f:
+             json.dump(self.to_dict(),f)
+        return fname
+
+
+class JuMEG_Psycho_Profiler(object):
+    """
+    hook object of the instrumented methods
+
+    :param histograms: add a JuMEG_Psycho_HistogramCollector
+    :param trace     : add a JuMEG_Psycho_TraceCollector, int: its capacity
+    :param collectors: further collectors with add(name,t0_ns,t1_ns,thread_id)
+    """
+    def __init__(self,histograms=True,trace=False,collectors=None):
+        super().__init__()
+        self.collectors = list(collectors or [])
+        self.histogram  = None
+        self.trace      = None
+        if histograms:
+           self.histogram = JuMEG_Psycho_HistogramCollector()
+           self.collectors.append(self.histogram)
+        if trace:
+           self.trace = JuMEG_Psycho_TraceCollector() if trace is True else JuMEG_Psycho_TraceCollector(capacity=trace)
+           self.collectors.append(self.trace)
+
+    mark = staticmethod(time.perf_counter_ns) # start time of a span
+
+    def record(self,name,t0):
+        """
+        span <name> from <t0> till now
+
+        :return:
+          end time, start of the next phase
+        """
+        t1  = time.perf_counter_ns()
+        tid = threading.get_ident()
+        for c in self.collectors:
+            c.add(name,t0,t1,tid)
+        return t1
+
+    @contextmanager
+    def span(self,name):
+        t0 = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.record(name,t0)
+
+    def reset(self):
+        for c in self.collectors:
+            c.reset()
+
+    def stats(self):
+        return self.histogram.stats() if self.histogram else {}
+
+    def summary(self):
+        s = ["---> profile [us]: {:<24} {:>8} {:>9} {:>9} {:>9} {:>9} {:>9}".format("phase","count","mean","p50","p99","p99.9","max")]
+        for k,v in self.stats().items():
+            s.append("  -> {:<37} {count:>8d} {mean_us:>9.1f} {p50_us:>9.1f} {p99_us:>9.1f} {p999_us:>9.1f} {max_us:>9.1f}".format(k,**v))
+        return "\n".join(s)
+
+    def export_trace(self,fname):
+        """ Chrome trace / Perfetto JSON, needs trace=True """
+        if self.trace is None:
+           raise RuntimeError("ERROR profiler without trace collector: JuMEG_Psycho_Profiler(trace=True)")
+        return self.trace.export(fname)
+
+
+def _classes():
+    from jumeg_psycho_eventcode import JuMEG_Psycho_EventCode
+    from jumeg_stim             import JuMEGStim,JuMEG_Psycho_IOD
+    return JuMEGStim,JuMEG_Psycho_IOD,JuMEG_Psycho_EventCode
+
+
+def install(profiler=None):
+    """
+    set <profiler> as class hook of JuMEGStim, JuMEG_Psycho_IOD and JuMEG_Psycho_EventCode
+    a single instance can be profiled by setting its <profiler> attribute
+
+    :return:
+      profiler, a new JuMEG_Psycho_Profiler if None
+    """
+    if profiler is None:
+       profiler = JuMEG_Psycho_Profiler()
+    for cls in _classes():
+        cls.profiler = profiler
+    return profiler
+
+
+def uninstall():
+    for cls in _classes():
+        cls.profiler = None
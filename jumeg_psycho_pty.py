@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+pseudo-terminal stand-in for the JuMEG Arduino eventcode box
+
+JuMEG_Psycho_EventCode can open <dev.port> like a /dev/ttyACM port,
+the stand-in parses the frames and answers vendor id and switch-off ACK
+
+Example:
+--------
+ from jumeg_psycho_pty import JuMEG_Psycho_PtyDevice
+ from jumeg_psycho_eventcode import JuMEG_Psycho_EventCode
+
+ dev = JuMEG_Psycho_PtyDevice()
+ dev.start()
+ evc = JuMEG_Psycho_EventCode()
+ evc.find_port = False
+ evc.open(port=dev.port,reset=False)
+ evc.send(16,100)
+ evc.close()
+ dev.stop()
+ print(dev.counts)
+
+update 10.2026 fb
+"""
+
+import os,select,threading,time,tty
+from collections import Counter
+
+from jumeg_psycho_frame import (FRAME_SIZE,ACK,SEQ_CREDIT,SEQ_DONE,SEQ_STREAM_CHUNK,
+                                SCHEDULE_DONE,SCHEDULE_LOAD,SCHEDULE_START,SCHEDULE_ENTRY_SIZE,PONG,CLOCK_PING,
+                                SWITCH_ON_AT,SWITCH_ON_AT_SIZE,PROTOCOL,NAK,V2_NEED,V2_OK,V2_BAD,V2_VENDOR_ID,parse_v2,
+                                BAUDRATE,BAUD_TEST,BAUD_ECHO)
+
+__version__='2026-10-18-001'
+
+
+class JuMEG_Psycho_PtyDevice(object):
+    """
+    minimal device on a pty: 7 byte frames, 211 seq frames, vendor id, switch-off ACK,
+    seq stream chunks are credited at once, a started schedule is done at once
+    protocol v2 after negotiation (219): frames are checked, NAK for header / CRC errors
+    baudrate (220) is acknowledged, burst tests (221) are echoed
+    overwrite process() for a different protocol e.g. JuMEG_Psycho_Emulator
+    overwrite idle() for work without received bytes, called every <poll_interval> s
+    """
+    def __init__(self,vendor_id_code=123,verbose=False):
+        super().__init__()
+        self._master  = None
+        self._slave   = None
+        self._port    = None
+        self._thread  = None
+        self._running = False
+        self._lock    = threading.Lock()
+        self._buffer  = bytearray()
+        self.vendor_id_code = vendor_id_code
+        self.verbose  = verbose
+        self.counts   = Counter()
+        self.nbytes   = 0
+        self.poll_interval = 0.05
+        self.protocol = 1
+   #---
+    @property
+    def port(self): return self._port
+   #---
+    @property
+    def isRunning(self): return self._running
+
+    def start(self):
+        """ open pty and start reader thread """
+        if self._running:
+           return self._port
+        self._master,self._slave = os.openpty()
+        tty.setraw(self._slave)
+        self._port    = os.ttyname(self._slave)
+        self._running = True
+        self._thread  = threading.Thread(target=self._run,name="JuMEG_Psycho_PtyDevice",daemon=True)
+        self._thread.start()
+        if self.verbose:
+           print(" --> pty device started: {}".format(self._port))
+        return self._port
+
+    def stop(self):
+        """ stop reader thread and close pty """
+        if not self._running:
+           return
+        self._running = False
+        self._thread.join(1.0)
+        for fd in (self._master,self._slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        self._master = self._slave = self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self,*args):
+        self.stop()
+
+    def write(self,data):
+        """ send bytes to the host """
+        with self._lock:
+             os.write(self._master,data)
+
+    def _run(self):
+        while self._running:
+              r,_,_ = select.select([self._master],[],[],self.poll_interval)
+              if not r:
+                 self.idle(time.monotonic_ns())
+                 continue
+              try:
+                  data = os.read(self._master,4096)
+              except OSError:
+                  break
+              self.receive(data,time.monotonic_ns())
+
+    def idle(self,t_ns):
+        """ no bytes received within <poll_interval> """
+        pass
+
+    def receive(self,data,t_ns):
+        """
+        bytes from the host, called in the reader thread
+
+        :param data: bytes
+        :param t_ns: receive time time.monotonic_ns()
+        """
+        self.nbytes += len(data)
+        self._buffer.extend(data)
+        while self._buffer:
+              n = self.process(self._buffer,t_ns)
+              if not n:
+                 break
+              del self._buffer[:n]
+
+    def process(self,buf,t_ns):
+        """
+        parse one command from the head of <buf>
+
+        :param buf : bytearray received, not processed bytes
+        :param t_ns: receive time time.monotonic_ns()
+        :return:
+          number of consumed bytes, 0: wait for more bytes
+        """
+        if self.protocol == 2:
+           status,used,body = parse_v2(buf,self.vendor_id_code)
+           if status == V2_OK:
+              self._process_frame(bytearray(body),t_ns)
+           elif status == V2_BAD:
+              self.counts[NAK[0]] += 1
+              self.write(NAK)
+           elif status == V2_VENDOR_ID:
+              self.protocol = 1
+              self.write( "{}\r\n".format(self.vendor_id_code).encode() )
+           return used
+        return self._process_frame(buf,t_ns)
+
+    def _process_frame(self,buf,t_ns):
+        """ v1 frame at the head of <buf>, see process() """
+        if len(buf) < FRAME_SIZE:
+           return 0
+        cmd = buf[0]
+        if cmd in (211,SEQ_STREAM_CHUNK,BAUD_TEST):
+           n = FRAME_SIZE + buf[1]
+           if len(buf) < n:
+              return 0
+           self.counts[cmd] += 1
+           if cmd == SEQ_STREAM_CHUNK:
+              self.write(SEQ_CREDIT + SEQ_DONE if buf[2] & 1 else SEQ_CREDIT)
+           elif cmd == BAUD_TEST:
+              self.write(BAUD_ECHO + bytes(buf[FRAME_SIZE:n]))
+           return n
+        if cmd == SCHEDULE_LOAD:
+           n = FRAME_SIZE + (buf[1] | (buf[2] << 8)) * SCHEDULE_ENTRY_SIZE
+           if len(buf) < n:
+              return 0
+           self.counts[cmd] += 1
+           self.write(ACK)
+           return n
+        if cmd == SWITCH_ON_AT:
+           if len(buf) < SWITCH_ON_AT_SIZE:
+              return 0
+           self.counts[cmd] += 1
+           return SWITCH_ON_AT_SIZE
+        self.counts[cmd] += 1
+        if cmd == self.vendor_id_code:
+           self.write( "{}\r\n".format(self.vendor_id_code).encode() )
+        elif cmd == 112 and buf[1] == 1:
+           self.write(ACK)
+        elif cmd == BAUDRATE:
+           self.write(ACK)
+        elif cmd == PROTOCOL and buf[1] in (1,2):
+           self.write(ACK)
+           self.protocol = buf[1]
+        elif cmd == SCHEDULE_START:
+           self.write(SCHEDULE_DONE)
+        elif cmd == CLOCK_PING: # micros() from the host clock
+           self.write(PONG + bytes((buf[1],)) + ((t_ns // 1000) & 0xFFFFFFFF).to_bytes(4,"little"))
+        return FRAME_SIZE
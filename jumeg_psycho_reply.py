@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+reply reader thread for the JuMEG Arduino eventcode box
+
+with clock pings and edge acks the Arduino sends packets (PONG, EDGE) between
+the single byte replies (ACK, SEQ_CREDIT, ...), the reader owns the input side
+of the serial port, hands packets to a callback and queues the single bytes
+for wait_for() / read()
+
+update 10.2026 fb
+"""
+
+import threading,time
+
+from jumeg_psycho_frame import PONG,EDGE,PONG_SIZE,EDGE_SIZE,NAK
+
+__version__='2026-10-18-001'
+
+PACKET_SIZES = { PONG[0]: PONG_SIZE, EDGE[0]: EDGE_SIZE }
+
+
+class JuMEG_Psycho_ReplyReader(object):
+    """
+    serial input parser thread
+
+    :param on_packet   : callback(packet bytes,t_ns time.monotonic_ns() of the read), called in the reader thread
+    :param packet_sizes: dict marker byte -> packet size
+    :param poll_timeout: serial read timeout in s
+    """
+    def __init__(self,on_packet=None,packet_sizes=None,poll_timeout=0.05):
+        super().__init__()
+        self.on_packet    = on_packet
+        self.packet_sizes = PACKET_SIZES if packet_sizes is None else packet_sizes
+        self.poll_timeout = poll_timeout
+        self._serial  = None
+        self._thread  = None
+        self._running = False
+        self._buffer  = bytearray()
+        self._bytes   = bytearray()
+        self._cond    = threading.Condition()
+        self._timeout = None
+        self.naks     = 0 # protocol v2 frames dropped by the Arduino
+   #---
+    @property
+    def isRunning(self): return self._running
+
+    def start(self,serial):
+        if self._running:
+           return
+        self._serial  = serial
+        self._timeout = serial.timeout
+        self._serial.timeout = self.poll_timeout
+        self._buffer.clear()
+        self.clear()
+        self._running = True
+        self._thread  = threading.Thread(target=self._run,name="JuMEG_Psycho_ReplyReader",daemon=True)
+        self._thread.start()
+
+    def stop(self,timeout=1.0):
+        if not self._running:
+           return
+        self._running = False
+        self._thread.join(timeout)
+        self._serial.timeout = self._timeout
+        self._thread = None
+
+    def _run(self):
+        ser = self._serial
+        while self._running:
+              try:
+                  data = ser.read( max(1,ser.in_waiting) )
+              except Exception:
+                  break
+              if data:
+                 self.receive(data,time.monotonic_ns())
+        self._running = False
+
+    def receive(self,data,t_ns):
+        """ parse bytes, packets -> on_packet, single bytes -> queue """
+        buf = self._buffer
+        buf.extend(data)
+        single = bytearray()
+        while buf:
+              n = self.packet_sizes.get(buf[0])
+              if n is None:
+                 single.append(buf[0])
+                 del buf[:1]
+                 continue
+              if len(buf) < n:
+                 break
+              pkt = bytes(buf[:n])
+              del buf[:n]
+              if self.on_packet:
+                 self.on_packet(pkt,t_ns)
+        if single:
+           self.naks += single.count(NAK)
+           with self._cond:
+                self._bytes.extend(single)
+                self._cond.notify_all()
+
+    def clear(self):
+        """ drop queued single byte replies """
+        with self._cond:
+             self._bytes.clear()
+
+    def wait_for(self,code,timeout):
+        """
+        wait for the single byte reply <code>, bytes up to <code> are removed
+
+        :param code   : bytes of length 1 e.g. ACK
+        :param timeout: timeout in s
+        :return:
+          True if received
+        """
+        t_end = time.monotonic() + timeout
+        with self._cond:
+             while True:
+                   i = self._bytes.find(code)
+                   if i >= 0:
+                      del self._bytes[:i + 1]
+                      return True
+                   self._bytes.clear()
+                   dt = t_end - time.monotonic()
+                   if dt <= 0 or not self._running:
+                      return False
+                   self._cond.wait(dt)
+
+    def read(self,timeout):
+        """
+        :return:
+          all queued single byte replies, waits up to <timeout> for at least one byte
+        """
+        t_end = time.monotonic() + timeout
+        with self._cond:
+             while not self._bytes:
+                   dt = t_end - time.monotonic()
+                   if dt <= 0 or not self._running:
+                      return b""
+                   self._cond.wait(dt)
+             data = bytes(self._bytes)
+             self._bytes.clear()
+             return data
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+whole-session trigger schedule for the JuMEG Arduino eventcode box
+
+a schedule is a list of (onset offset, eventcode, triggercode, duration) entries,
+uploaded once and played by the firmware against its own clock (Timer5, micros()),
+no USB latency, no host scheduling jitter per trial
+
+binary entry SCHEDULE_DTYPE, 8 bytes little endian as struct ScheduleEntry in the firmware:
+   onset_ms u32, eventcode u8, triggercode u8, duration_ms u16
+
+upload : 214,counts b0,b1,offset b0..b3,entries[counts] -> Arduino replies ACK
+         offset: first entry index, protocol v2 uploads in chunks of V2_SCHEDULE_ENTRIES
+start  : 215,0,0,delay_ms b0..b3                        -> Arduino replies SCHEDULE_DONE after the last code
+max SCHEDULE_MAX_ENTRIES entries, max block length 71 min (micros() wrap)
+
+Example:
+--------
+ from jumeg_psycho_schedule import JuMEG_Psycho_Schedule
+ sch = JuMEG_Psycho_Schedule()
+ sch.add(0,eventcode=16,duration_ms=100)
+ sch.add(1500,eventcode=32,triggercode=1,duration_ms=100)
+ sch = JuMEG_Psycho_Schedule.from_csv("block01.csv") # onset_ms,eventcode,triggercode,duration_ms
+
+ evc.sendSchedule(sch)
+ evc.startSchedule()
+ evc.waitSchedule()
+
+update 10.2026 fb
+"""
+
+import numpy as np
+
+from jumeg_psycho_frame import SCHEDULE_MAX_ENTRIES,parse_cmd
+
+__version__='2026-10-18-001'
+
+SCHEDULE_DTYPE = np.dtype([("onset_ms","<u4"),("eventcode","u1"),("triggercode","u1"),("duration_ms","<u2")])
+SCHEDULE_FIELDS= ("onset_ms","eventcode","triggercode","duration_ms")
+
+
+class JuMEG_Psycho_Schedule(object):
+    """
+    compiles trigger entries into the binary schedule format of the firmware
+    entries are sorted by onset, codes are checked against the 8/8/16/32 bit fields
+
+    :param entries: numpy structured array SCHEDULE_DTYPE, array or list see from_array()
+    """
+    def __init__(self,entries=None):
+        super().__init__()
+        self._entries = np.zeros(0,dtype=SCHEDULE_DTYPE)
+        if entries is not None:
+           self.entries = entries
+   #---
+    @property
+    def entries(self): return self._entries
+    @entries.setter
+    def entries(self,v):
+        self._entries = self.compile(v)
+   #---
+    @property
+    def counts(self): return len(self._entries)
+   #---
+    @property
+    def duration_ms(self):
+        """ end of the last code in ms """
+        if not self.counts:
+           return 0
+        e = self._entries
+        return int( np.max(e["onset_ms"].astype(np.int64) + e["duration_ms"]) )
+
+    def __len__(self):
+        return self.counts
+
+    @staticmethod
+    def compile(data):
+        """
+        :param data: structured array with SCHEDULE_FIELDS,
+                     N x 4 array onset_ms,eventcode,triggercode,duration_ms
+                     N x 3 array onset_ms,code (eventcode + triggercode<<8),duration_ms
+        :return:
+          numpy structured array SCHEDULE_DTYPE sorted by onset
+        """
+        if isinstance(data,JuMEG_Psycho_Schedule):
+           return data.entries.copy()
+        a = np.asarray(data)
+        if a.dtype.names:
+           cols = [ a[k] if k in a.dtype.names else np.zeros(len(a)) for k in SCHEDULE_FIELDS ]
+           if "code" in a.dtype.names and "eventcode" not in a.dtype.names:
+              code    = a["code"].astype(np.int64)
+              cols[1] = code & 0xFF
+              cols[2] = (code >> 8) & 0xFF
+        else:
+           a = np.atleast_2d(a) if a.size else np.zeros((0,4))
+           if a.shape[1] == 4:
+              cols = [a[:,i] for i in range(4)]
+           elif a.shape[1] == 3:
+              code = a[:,1].astype(np.int64)
+              cols = [a[:,0],code & 0xFF,(code >> 8) & 0xFF,a[:,2]]
+           else:
+              raise ValueError("ERROR schedule array: N x 3 or N x 4 columns, got: {}".format(a.shape))
+
+        limits = (0xFFFFFFFF,0xFF,0xFF,0xFFFF)
+        out = np.zeros(len(cols[0]),dtype=SCHEDULE_DTYPE)
+        for k,c,vmax in zip(SCHEDULE_FIELDS,cols,limits):
+            c = np.asarray(c,dtype=np.float64)
+            if c.size and ( c.min() < 0 or c.max() > vmax or np.any(c != np.round(c)) ):
+               raise ValueError("ERROR schedule {}: integer values 0 - {} expected".format(k,vmax))
+            out[k] = c
+        return out[ np.argsort(out["onset_ms"],kind="stable") ]
+
+    @classmethod
+    def from_array(cls,data):
+        return cls(data)
+
+    @classmethod
+    def from_csv(cls,fname,delimiter=","):
+        """
+        :param fname: csv with header line, columns onset_ms,eventcode,triggercode,duration_ms
+                      or onset_ms,code,duration_ms
+        """
+        data = np.genfromtxt(fname,delimiter=delimiter,names=True,dtype=np.float64,ndmin=1)
+        return cls(data)
+
+    @classmethod
+    def from_cmd_list(cls,cmd_list,onset_ms=0,duration_ms=200,duration_seq_ms=10,
+                      cmd_code_switch_on=111,cmd_code_switch_off=112,cmd_code_send_seq=211,hold_ms=None):
+        """
+        compile sendCmdList() strings, each command starts after the previous one
+
+        :param cmd_list: "111,code,dt" "211,dt,code,code,..." "112"
+                         list of strings or one string, commands separated by ";"
+                         111 with dt 0 (live: on till the next command) has no length in a schedule,
+                         it is compiled with <hold_ms> and the next command starts after it
+        :param onset_ms: onset of the first command
+        :param duration_ms    : default duration of 111
+        :param duration_seq_ms: default duration of each 211 code
+        :param hold_ms        : duration of 111 with dt 0, 1 - 0xFFFF ms, None: ValueError
+        """
+        if isinstance(cmd_list,str):
+           cmd_list = cmd_list.split(";")
+        rows = []
+        t    = int(onset_ms)
+        for cmd_str in cmd_list:
+            if not cmd_str.strip():
+               continue
+            cmd,args = parse_cmd(cmd_str)
+            if cmd == cmd_code_switch_on:
+               dt = args[1] if len(args) > 1 and args[1] >= 0 else duration_ms
+               if dt == 0:
+                  if not hold_ms:
+                     raise ValueError("ERROR schedule 111 with duration 0 (on till the next command), set hold_ms: {}".format(cmd_str))
+                  dt = hold_ms
+               rows.append( (t,args[0],dt) )
+               t += dt
+            elif cmd == cmd_code_send_seq:
+               dt = args[0] if args and args[0] > 0 else duration_seq_ms
+               for code in args[1:]:
+                   rows.append( (t,code,dt) )
+                   t += dt
+            elif cmd == cmd_code_switch_off:
+               rows.append( (t,0,0) )
+            else:
+               raise ValueError("ERROR schedule unknown command: {}".format(cmd_str))
+        return cls(np.array(rows,dtype=np.int64).reshape(-1,3))
+
+    def add(self,onset_ms,eventcode=0,triggercode=0,duration_ms=200):
+        """ add one entry """
+        e = np.array([(onset_ms,eventcode,triggercode,duration_ms)],dtype=np.int64)
+        self._entries = self.compile( np.concatenate( (self.as_array(),e) ) )
+        return self
+
+    def as_array(self):
+        """
+        :return:
+          N x 4 int64 array onset_ms,eventcode,triggercode,duration_ms
+        """
+        return np.stack([self._entries[k].astype(np.int64) for k in SCHEDULE_FIELDS],axis=1).reshape(-1,4)
+
+    def codes(self):
+        """ 16 bit codes eventcode + triggercode<<8 """
+        return self._entries["eventcode"].astype(np.uint16) | (self._entries["triggercode"].astype(np.uint16) << 8)
+
+    def tobytes(self):
+        """ binary schedule for the upload """
+        if self.counts > SCHEDULE_MAX_ENTRIES:
+           raise ValueError("ERROR schedule too long: {} entries, Arduino stores max {}".format(self.counts,SCHEDULE_MAX_ENTRIES))
+        return self._entries.tobytes()
+
+    def to_csv(self,fname):
+        np.savetxt(fname,self.as_array(),fmt="%d",delimiter=",",header=",".join(SCHEDULE_FIELDS),comments="")
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+background writer thread for the JuMEG Arduino eventcode box
+
+the render thread only appends a precompiled frame to a bounded deque,
+the writer thread owns the serial port, writes the frame and waits
+for the transmit to complete (tcdrain via serial.flush())
+
+update 10.2026 fb
+"""
+
+import threading,time
+from collections import deque,namedtuple
+from warnings import warn
+
+__version__='2026-10-18-001'
+
+#--- timestamps in ns from time.monotonic_ns()
+SendRecord = namedtuple("SendRecord",["seq","t_enqueue","t_write_start","t_write_done","nbytes","error"])
+
+
+def notify_error(callback,frame,error,t_enqueue=None):
+    """
+    call <callback> with a SendRecord for a frame that is not written e.g. queue full, link down
+    seq is -1, the write times are the time of the call, <error> is set
+
+    :return:
+      SendRecord
+    """
+    t   = time.monotonic_ns()
+    rec = SendRecord(-1,t if t_enqueue is None else t_enqueue,t,t,len(frame),error)
+    if callback:
+       try:
+           callback(rec)
+       except Exception as e:
+           warn("  -> ERROR JuMEG_Psycho_Sender callback: {}\n".format(e))
+    return rec
+
+
+class JuMEG_Psycho_Sender(object):
+    """
+    asynchronous frame writer
+    commands are put into a bounded deque (append/popleft are atomic, no lock in the hot path)
+    a dedicated thread writes them to the serial port and records
+    enqueue, write-start and write-complete times for each command
+
+    Example:
+    --------
+     from jumeg_psycho_sender import JuMEG_Psycho_Sender
+     sender = JuMEG_Psycho_Sender(maxsize=64)
+     sender.start(serial_port)
+     sender.put(b'o\\x10\\x00\\xc8\\x00\\x00\\x00')
+     sender.stop()
+     print(sender.records[-1])
+    """
+    def __init__(self,maxsize=256,drain=True,history=4096,verbose=False):
+        super().__init__()
+        self._serial   = None
+        self._queue    = deque()
+        self._wakeup   = threading.Event()
+        self._idle     = threading.Event()
+        self._thread   = None
+        self._running  = False
+        self._seq      = 0
+        self._seq_done = 0
+        self._records  = deque(maxlen=history)
+        self.maxsize   = maxsize
+        self.drain     = drain
+        self.verbose   = verbose
+        self.dropped   = 0
+        self.on_error  = None # callback(exception) in the writer thread e.g. link lost
+        self._idle.set()
+
+   #---
+    @property
+    def isRunning(self): return self._running
+   #---
+    @property
+    def records(self): return self._records
+   #---
+    @property
+    def pending(self): return len(self._queue)
+
+    def start(self,serial):
+        """
+        start writer thread
+
+        :param serial: open serial.Serial port, owned by the writer thread until stop()
+        :return:
+          True
+        """
+        if self._running:
+           return True
+        self._serial  = serial
+        self._running = True
+        self._thread  = threading.Thread(target=self._run,name="JuMEG_Psycho_Sender",daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self,timeout=2.0):
+        """
+        write all pending frames and stop writer thread
+
+        :param timeout: max time in s to wait for pending frames
+        :return:
+          True if all frames are written
+        """
+        if not self._running:
+           return True
+        done = self.wait(timeout=timeout)
+        self._running = False
+        self._wakeup.set()
+        self._thread.join(timeout)
+        self._thread = None
+        self._serial = None
+        return done
+
+    def wait(self,timeout=None):
+        """
+        wait till all pending frames are written
+
+        :param timeout: timeout in s
+        :return:
+          True if queue is empty
+        """
+        if self._seq_done >= self._seq:
+           return True
+        self._idle.clear()
+        if self._seq_done >= self._seq:
+           return True
+        return self._idle.wait(timeout)
+
+    def put(self,frame,callback=None):
+        """
+        enqueue frame, never blocks
+
+        :param frame   : bytes
+        :param callback: called in the writer thread with the SendRecord after writing,
+                         queue full: called at once with an error SendRecord
+        :return:
+          sequence id or -1 if queue is full
+        """
+        if len(self._queue) >= self.maxsize:
+           self.dropped += 1
+           warn("  -> ERROR JuMEG_Psycho_Sender queue is full => frame dropped\n")
+           notify_error(callback,frame,OverflowError("JuMEG_Psycho_Sender queue is full"))
+           return -1
+        self._seq += 1
+        self._queue.append( (self._seq,time.monotonic_ns(),frame,callback) )
+        self._wakeup.set()
+        return self._seq
+
+    def take(self):
+        """
+        remove all pending frames e.g. the link is lost
+
+        :return:
+          list of (seq,t_enqueue,frame,callback)
+        """
+        items = []
+        while True:
+              try:
+                  items.append( self._queue.popleft() )
+              except IndexError:
+                  break
+        if items:
+           self._seq_done = max(self._seq_done,items[-1][0])
+        return items
+
+    def _write(self,seq,t_enqueue,frame,callback):
+        err     = None
+        t_start = time.monotonic_ns()
+        try:
+            self._serial.write(frame)
+            if self.drain:
+               self._serial.flush() # waits for transmit completion, flushOutput() would discard
+        except Exception as e:
+            err = e
+            if self.on_error:
+               self.on_error(e)
+            else:
+               warn("  -> ERROR JuMEG_Psycho_Sender write bytes to Arduino: {}\n".format(e))
+        rec = SendRecord(seq,t_enqueue,t_start,time.monotonic_ns(),len(frame),err)
+        self._records.append(rec)
+        self._seq_done = max(self._seq_done,seq)
+        if callback:
+           try:
+               callback(rec)
+           except Exception as e:
+               warn("  -> ERROR JuMEG_Psycho_Sender callback: {}\n".format(e))
+        if self.verbose:
+           print(" --> sender: seq {} queued {:.3f} ms write {:.3f} ms".format(
+                 seq,(t_start-t_enqueue)*1.0e-6,(rec.t_write_done-t_start)*1.0e-6))
+
+    def _run(self):
+        q = self._queue
+        while self._running or q:
+              try:
+                  item = q.popleft()
+              except IndexError:
+                  self._idle.set()
+                  if not self._running:
+                     break
+                  self._wakeup.wait(0.5)
+                  self._wakeup.clear()
+                  continue
+              self._write(*item)
+        self._idle.set()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+link supervisor for the JuMEG Arduino eventcode box: hot-plug detection and background reconnect
+
+the supervisor thread polls the sysfs node of the port (/sys/class/tty/ttyACM0),
+no udev daemon needed, without a sysfs node e.g. a pty the device node is polled
+a write error reported by JuMEG_Psycho_EventCode marks the link as lost at once
+
+while the link is down the frames are buffered with their intended send time,
+after the reconnect they are replayed or dropped, the owner decides
+gaps and dropped / late frames are logged in the event journal with the cmd codes below
+
+Example:
+--------
+ from jumeg_psycho_supervisor import JuMEG_Psycho_Supervisor
+ sup = JuMEG_Psycho_Supervisor(reconnect=my_reconnect,on_lost=my_on_lost)
+ sup.start("/dev/ttyACM0")
+ ...
+ sup.stop()
+ sup.gaps
+  -> [(t_down_ns,t_up_ns),...]
+
+update 10.2026 fb
+"""
+
+import os,time,threading
+from collections import deque
+
+from jumeg_psycho_discovery import SYSFS_TTY_PATH
+
+__version__='2026-10-18-001'
+
+#--- journal cmd codes of link events, not used by the firmware
+LINK_DOWN     = 250 # t_ns: link lost
+LINK_UP       = 251 # t_ns: link up again, duration: gap in ms
+FRAME_DROPPED = 252 # t_ns: intended send time, code / duration of the dropped frame
+FRAME_LATE    = 253 # t_ns: intended send time, code of the replayed frame, duration: delay in us
+
+
+def sysfs_node(port):
+    """
+    :param port: e.g. /dev/ttyACM0
+    :return:
+      sysfs node of the tty e.g. /sys/class/tty/ttyACM0 or None
+    """
+    node = os.path.join(SYSFS_TTY_PATH,os.path.basename(port))
+    return node if os.path.exists(node) else None
+
+
+class JuMEG_Psycho_Supervisor(object):
+    """
+    polls the port and reconnects in the background
+
+    :param reconnect     : callable() -> port or None, called in the supervisor thread every <retry_interval>
+                           while the link is down, calls up(port) when the frames are replayed
+    :param on_lost       : callable(t_ns,reason) called in the supervisor thread when the link is lost
+    :param poll_interval : s, check of the port node
+    :param retry_interval: s, pause between reconnect attempts
+    :param buffer_size   : max frames buffered while the link is down, the oldest is dropped
+    """
+    def __init__(self,reconnect=None,on_lost=None,poll_interval=0.1,retry_interval=0.25,buffer_size=1024,verbose=False):
+        super().__init__()
+        self.reconnect      = reconnect
+        self.on_lost        = on_lost
+        self.poll_interval  = poll_interval
+        self.retry_interval = retry_interval
+        self.verbose        = verbose
+        self._buffer   = deque(maxlen=buffer_size)
+        self._port     = None
+        self._node     = None
+        self._thread   = None
+        self._running  = False
+        self._down     = False
+        self._t_down   = 0
+        self._reason   = None
+        self._wakeup   = threading.Event()
+        self._abort    = threading.Event()
+        self._gaps     = []
+   #---
+    @property
+    def isRunning(self): return self._running
+   #---
+    @property
+    def isDown(self): return self._down
+   #---
+    @property
+    def port(self): return self._port
+   #---
+    @property
+    def abort(self):
+        """ threading.Event set on stop(), e.g. abort a port probe """
+        return self._abort
+   #---
+    @property
+    def gaps(self):
+        """ list of (t_down,t_up) time.monotonic_ns() of each link loss, t_up: 0 while down """
+        return self._gaps + ([(self._t_down,0)] if self._down else [])
+   #---
+    @property
+    def pending(self): return len(self._buffer)
+
+    def start(self,port):
+        """ watch <port>, start the supervisor thread """
+        self.watch(port)
+        if self._running:
+           return
+        self._abort.clear()
+        self._running = True
+        self._thread  = threading.Thread(target=self._run,name="JuMEG_Psycho_Supervisor",daemon=True)
+        self._thread.start()
+
+    def stop(self,timeout=2.0):
+        if not self._running:
+           return
+        self._running = False
+        self._abort.set()
+        self._wakeup.set()
+        if self._thread is not threading.current_thread():
+           self._thread.join(timeout)
+        self._thread = None
+        self._down   = False
+        self._buffer.clear()
+
+    def watch(self,port):
+        """ port to poll, the sysfs node if it exists else the device node """
+        self._port = port
+        self._node = sysfs_node(port) or port
+
+    def alive(self):
+        """ True if the node of the watched port exists """
+        return os.path.exists(self._node)
+
+    def up(self,port):
+        """ link is up again on <port>, the gap is recorded """
+        if not self._down:
+           return
+        self.watch(port)
+        self._gaps.append( (self._t_down,time.monotonic_ns()) )
+        self._down = False
+        if self.verbose:
+           print(" --> supervisor: link up: {} gap {:.1f} ms".format(port,(self._gaps[-1][1] - self._t_down) * 1.0e-6))
+
+    def lost(self,reason=None):
+        """ link lost e.g. write error, callable from any thread """
+        if self._down:
+           return
+        self._t_down = time.monotonic_ns()
+        self._reason = reason
+        self._down   = True
+        self._wakeup.set()
+
+   #--- buffer, the owner serialises access while the link is down
+    def put(self,frame,callback=None,t_ns=None):
+        """
+        buffer a frame while the link is down
+
+        :param frame   : v1 frame bytes
+        :param callback: callback of the frame
+        :param t_ns    : intended send time time.monotonic_ns()
+        :return:
+          dropped (t_ns,frame,callback) if the buffer was full else None
+        """
+        dropped = self._buffer[0] if len(self._buffer) == self._buffer.maxlen else None
+        self._buffer.append( (time.monotonic_ns() if t_ns is None else t_ns,frame,callback) )
+        return dropped
+
+    def requeue(self,items):
+        """
+        put frames in front of the buffer e.g. pending frames of the writer thread
+
+        :param items: list of (t_ns,frame,callback), oldest first
+        :return:
+          dropped (t_ns,frame,callback), the oldest items which do not fit into the buffer
+        """
+        free = self._buffer.maxlen - len(self._buffer)
+        k    = max(len(items) - free,0)
+        for item in reversed(items[k:]):
+            self._buffer.appendleft(item)
+        return items[:k]
+
+    def take(self):
+        """ all buffered frames (t_ns,frame,callback), oldest first """
+        items = list(self._buffer)
+        self._buffer.clear()
+        return items
+
+    def _run(self):
+        lost_done = False
+        while self._running:
+              if not self._down:
+                 self._wakeup.wait(self.poll_interval)
+                 self._wakeup.clear()
+                 if self._running and not self._down and not self.alive():
+                    self.lost("port node removed: {}".format(self._node))
+                 continue
+              if not lost_done:
+                 lost_done = True
+                 if self.verbose:
+                    print(" --> supervisor: link lost: {} {}".format(self._port,self._reason))
+                 if self.on_lost:
+                    self.on_lost(self._t_down,self._reason)
+              port = self.reconnect() if self.reconnect and self._running else None
+              if port:
+                 self.up(port)
+                 lost_done = False
+                 continue
+              self._wakeup.wait(self.retry_interval)
+              self._wakeup.clear()
+        self._running = False
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+per-present timing table for JuMEGStim
+
+one row for each present(): flip time, frame interval, eventcode send times,
+IOD off flip, key wait and dropped-frame flag
+columns are preallocated numpy arrays, a row is a few scalar writes
+
+dropped frame: the IOD-on flip returned later than <drop_factor> x frame period after
+the flip was requested, the stimulus missed the refresh it was drawn for
+
+Example:
+--------
+ jSTIM = JuMEGStim(timing_summary_every=50)
+ ...
+ jSTIM.timing.to_csv("run01_timing.csv")
+ data = jSTIM.timing.to_numpy()
+ print(jSTIM.timing.summary())
+
+update 10.2026 fb
+"""
+
+import numpy as np
+
+__version__='2026-10-18-001'
+
+#--- times in s on the psychopy clock core.getTime()
+TIMING_DTYPE = np.dtype([("eventcode","<u2"),
+                         ("t_call","<f8"),          # flip requested
+                         ("t_flip","<f8"),          # IOD on flip
+                         ("frame_interval","<f8"),  # t_flip - previous flip
+                         ("t_send","<f8"),          # eventcode write start, nan: no eventcode
+                         ("t_send_done","<f8"),     # eventcode write done
+                         ("t_iod_off","<f8"),       # IOD off flip
+                         ("key_wait","<f8"),        # WaitForIODOnScreen duration
+                         ("iod_timeout","?"),       # no IOD toggle key within timeout
+                         ("dropped","?")])
+
+
+class JuMEG_Psycho_TimingTable(object):
+    """
+    columnar timing buffer, one array per TIMING_DTYPE field
+    the buffer doubles if full
+
+    :param capacity    : preallocated rows
+    :param frame_period: refresh period in s, e.g. win.monitorFramePeriod
+    :param drop_factor : flip wait > drop_factor x frame_period => dropped frame
+    """
+    def __init__(self,capacity=10000,frame_period=1.0/60.0,drop_factor=1.5):
+        super().__init__()
+        self.frame_period = frame_period
+        self.drop_factor  = drop_factor
+        self._n       = 0
+        self._columns = { k: np.zeros(capacity,dtype=TIMING_DTYPE[k]) for k in TIMING_DTYPE.names }
+        self._t_last_flip = np.nan
+   #---
+    @property
+    def counts(self): return self._n
+   #---
+    @property
+    def capacity(self): return len(self._columns["t_flip"])
+   #---
+    @property
+    def columns(self):
+        """ dict of column views of the valid rows """
+        return { k: v[:self._n] for k,v in self._columns.items() }
+
+    def __len__(self):
+        return self._n
+
+    def _grow(self):
+        for k,v in self._columns.items():
+            self._columns[k] = np.concatenate( (v,np.zeros_like(v)) )
+
+    def flip(self,t_flip):
+        """
+        register a flip without a row e.g. IOD off, frame intervals are measured between all flips
+
+        :return:
+          interval to the previous flip in s
+        """
+        dt = t_flip - self._t_last_flip
+        self._t_last_flip = t_flip
+        return dt
+
+    def add(self,eventcode,t_call,t_flip,t_send=None,t_send_done=None,t_iod_off=np.nan,key_wait=np.nan,iod_timeout=False):
+        """
+        add one row, frame interval and dropped flag are calculated
+
+        :return:
+          row index
+        """
+        i = self._n
+        if i >= self.capacity:
+           self._grow()
+        c = self._columns
+        c["eventcode"][i]      = eventcode or 0
+        c["t_call"][i]         = t_call
+        c["t_flip"][i]         = t_flip
+        c["frame_interval"][i] = self.flip(t_flip)
+        c["t_send"][i]         = np.nan if t_send is None else t_send
+        c["t_send_done"][i]    = np.nan if t_send_done is None else t_send_done
+        c["t_iod_off"][i]      = t_iod_off
+        c["key_wait"][i]       = key_wait
+        c["iod_timeout"][i]    = iod_timeout
+        c["dropped"][i]        = (t_flip - t_call) > self.drop_factor * self.frame_period
+        self._n = i + 1
+        if not np.isnan(t_iod_off):
+           self.flip(t_iod_off)
+        return i
+
+    def update(self,i,**kwargs):
+        """ set fields of row <i> e.g. t_iod_off after the IOD off flip """
+        for k,v in kwargs.items():
+            self._columns[k][i] = v
+        if "t_iod_off" in kwargs:
+           self.flip(kwargs["t_iod_off"])
+
+    def clear(self):
+        self._n = 0
+        self._t_last_flip = np.nan
+
+    def to_numpy(self):
+        """
+        :return:
+          copy of the valid rows as numpy structured array TIMING_DTYPE
+        """
+        out = np.zeros(self._n,dtype=TIMING_DTYPE)
+        for k,v in self._columns.items():
+            out[k] = v[:self._n]
+        return out
+
+    def to_csv(self,fname):
+        data = self.to_numpy()
+        fmt  = ["%d" if data.dtype[k].kind in "ub" else "%.6f" for k in TIMING_DTYPE.names]
+        np.savetxt(fname,np.column_stack([data[k].astype(np.float64) for k in TIMING_DTYPE.names]).reshape(-1,len(fmt)),
+                   fmt=fmt,delimiter=",",header=",".join(TIMING_DTYPE.names),comments="")
+
+    def stats(self,last=None):
+        """
+        :param last: statistics of the last N rows <all>
+        :return:
+          dict: rows, dropped frames, IOD timeouts, send - flip offset and jitter in ms, flip wait in ms
+        """
+        c  = self.columns
+        i0 = 0 if not last else max(self._n - last,0)
+        offset = (c["t_send"][i0:] - c["t_flip"][i0:]) * 1.0e3
+        offset = offset[~np.isnan(offset)]
+        wait   = (c["t_flip"][i0:] - c["t_call"][i0:]) * 1.0e3
+        return { "rows"        : self._n - i0,
+                 "dropped"     : int(np.count_nonzero(c["dropped"][i0:])),
+                 "iod_timeouts": int(np.count_nonzero(c["iod_timeout"][i0:])),
+                 "send_offset_mean_ms": float(np.mean(offset)) if offset.size else np.nan,
+                 "send_offset_std_ms" : float(np.std(offset))  if offset.size else np.nan,
+                 "flip_wait_mean_ms"  : float(np.mean(wait))   if wait.size else np.nan,
+                 "flip_wait_max_ms"   : float(np.max(wait))    if wait.size else np.nan }
+
+    def summary(self,last=None):
+        s = self.stats(last)
+        return ("---> timing: {rows} presents, dropped frames: {dropped}, IOD timeouts: {iod_timeouts}\n"
+                "  -> send - flip [ms] mean: {send_offset_mean_ms:.3f} jitter(std): {send_offset_std_ms:.3f}\n"
+                "  -> flip wait [ms] mean: {flip_wait_mean_ms:.3f} max: {flip_wait_max_ms:.3f}".format(**s))
@@ -0,0 +1,440 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+verification of a recorded MEG trigger channel against the event journal
+
+trigger channel: 16 bit, eventcode on bit 0-7 (Arduino port C), triggercode on bit 8-15 (port A)
+the file is memory-mapped and read in chunks, hours at kHz rates do not need to fit in RAM
+edges are found vectorized per chunk, the last sample of a chunk is carried into the next one
+
+port C and port A are written one after the other, a sample between the two writes shows
+a byte mix of the old and the new code: runs shorter than <glitch_samples> made of the bytes
+of their neighbours are given to the next code
+
+expected codes from the journal (jumeg_psycho_journal):
+   111 switch on, 218 switch on at (target time), 211 / 212 sequence: onset t_ns + index x (duration + tick / 2),
+   the firmware ends a sequence code at the first Timer5 tick after its end time, each code lasts up to one tick
+   longer, the match window of code <index> is widened by index x tick / 2
+   215 schedule: planned onsets, 112 switch off ends the running code
+   link events of the supervisor: FRAME_DROPPED codes are not expected,
+   FRAME_LATE codes are expected at t_ns + delay, missed codes within a link gap are counted apart
+
+alignment host time -> sample: offset from the best pairing of the first codes,
+refined by a linear fit of the matched single code onsets 111 / 218 / 215 (sampling clock drift),
+the tick lag of sequences is not fitted as drift
+without a common clock the constant part of the latency is absorbed by the alignment,
+latency is the jitter around the fit unless <t0_ns> (host time of sample 0) is given
+
+Example:
+--------
+ from jumeg_psycho_verify import JuMEG_Psycho_TriggerVerify,load_trigger_channel
+ data = load_trigger_channel("run01_trigger.raw",dtype="<u2")
+ ver  = JuMEG_Psycho_TriggerVerify(sfreq=1017.25)
+ res  = ver.verify(data,"session01.jnl")
+ print(ver.summary())
+ res["missed"],res["spurious"]
+ counts,edges = ver.histogram("latency_ms")
+
+ python jumeg_psycho_verify.py run01_trigger.raw session01.jnl --sfreq 1017.25
+
+update 10.2026 fb
+"""
+
+import sys,argparse
+import numpy as np
+
+from jumeg_psycho_journal    import load_journal
+from jumeg_psycho_frame      import SEQ_STREAM_START,SCHEDULE_START,SWITCH_ON_AT
+from jumeg_psycho_supervisor import LINK_DOWN,LINK_UP,FRAME_DROPPED,FRAME_LATE
+
+__version__='2026-10-18-001'
+
+#--- sample: onset sample, code: eventcode + triggercode<<8, n_samples: duration in samples
+EVENT_DTYPE    = np.dtype([("sample","<i8"),("code","<u2"),("n_samples","<i8")])
+#--- t_ns: expected onset host time, sample: aligned onset, duration: expected duration ms
+#    slack_ms: match window widening of sequence codes (tick rounding)
+EXPECTED_DTYPE = np.dtype([("t_ns","<i8"),("cmd","u1"),("code","<u2"),("duration","<f8"),("seq","<u8"),
+                           ("sample","<f8"),("in_gap","?"),("slack_ms","<f8")])
+
+
+def decode(codes):
+    """
+    :param codes: array of trigger channel values
+    :return:
+      eventcode (port C, bit 0-7), triggercode (port A, bit 8-15)
+    """
+    codes = np.asarray(codes,dtype=np.int64)
+    return codes & 0xFF,(codes >> 8) & 0xFF
+
+
+def load_trigger_channel(fname,dtype="<u2",n_channels=1,channel=0,offset=0):
+    """
+    memory-map a trigger channel from a raw file
+
+    :param fname     : raw file, samples x channels interleaved
+    :param dtype     : sample type e.g. <u2, <i2, <f4
+    :param n_channels: channels per sample
+    :param channel   : index of the trigger channel
+    :param offset    : header bytes
+    :return:
+      np.memmap view of the channel, nothing is read
+    """
+    data = np.memmap(fname,dtype=dtype,mode="r",offset=offset)
+    n    = len(data) // n_channels
+    return data[:n * n_channels].reshape(n,n_channels)[:,channel]
+
+
+class JuMEG_Psycho_TriggerVerify(object):
+    """
+    :param sfreq         : sampling rate of the trigger channel in Hz
+    :param chunk_size    : samples per chunk
+    :param code_mask     : bits of the trigger channel used by the eventcode box
+    :param glitch_samples: byte mix runs shorter than this are removed, 0: off
+    :param tolerance_ms  : expected onset - tolerance is the earliest match
+    :param max_latency_ms: latest match after the expected onset
+    :param duration_tol_ms: duration error above this is reported
+    :param t0_ns         : host time of sample 0 time.monotonic_ns(), None: estimated
+    :param drift         : fit the sampling clock drift
+    :param tick_us       : Timer5 tick of the firmware, a sequence code lasts up to one tick longer than its duration
+    """
+    def __init__(self,sfreq=1000.0,chunk_size=10000000,code_mask=0xFFFF,glitch_samples=2,tolerance_ms=5.0,
+                 max_latency_ms=50.0,duration_tol_ms=2.0,t0_ns=None,drift=True,tick_us=200.0,verbose=False):
+        super().__init__()
+        self.sfreq          = float(sfreq)
+        self.chunk_size     = int(chunk_size)
+        self.code_mask      = code_mask
+        self.glitch_samples = glitch_samples
+        self.tolerance_ms   = tolerance_ms
+        self.max_latency_ms = max_latency_ms
+        self.duration_tol_ms= duration_tol_ms
+        self.t0_ns          = t0_ns
+        self.drift          = drift
+        self.tick_us        = tick_us
+        self.verbose        = verbose
+        self.cmd_switch_on  = 111
+        self.cmd_switch_off = 112
+        self.cmd_seq        = 211
+        self._result        = None
+   #---
+    @property
+    def result(self): return self._result
+
+   #--- trigger channel
+    def find_changes(self,data):
+        """
+        value changes of the trigger channel, chunked
+
+        :param data: 1d array or memmap
+        :return:
+          sample index, new value, number of samples
+        """
+        n    = len(data)
+        prev = 0
+        idx,val = [],[]
+        for i0 in range(0,n,self.chunk_size):
+            x = np.asarray(data[i0:i0 + self.chunk_size])
+            if x.dtype.kind == "f":
+               x = np.rint(x)
+            x = x.astype(np.int64) & self.code_mask
+            d = np.empty(len(x),dtype=bool)
+            d[0]  = x[0] != prev
+            d[1:] = x[1:] != x[:-1]
+            k = np.flatnonzero(d)
+            idx.append(k + i0)
+            val.append(x[k])
+            prev = x[-1]
+            if self.verbose:
+               print("  -> trigger channel: {:.1f} %".format(100.0 * min(i0 + self.chunk_size,n) / n),end="\r")
+        if self.verbose and n:
+           print()
+        if not idx:
+           return np.zeros(0,np.int64),np.zeros(0,np.int64),n
+        return np.concatenate(idx),np.concatenate(val),n
+
+    def _remove_glitches(self,idx,val,n):
+        """ drop runs < glitch_samples made of the low / high byte of their neighbours """
+        if self.glitch_samples and len(idx) > 1:
+           length = np.diff(np.append(idx,n))
+           v  = np.concatenate(([0],val)) # channel is 0 before the first change
+           lo,hi = v & 0xFF,v >> 8
+           m = np.zeros(len(idx),dtype=bool)
+           mix = ( (lo[1:-1] == lo[2:]) & (hi[1:-1] == hi[:-2]) ) | ( (lo[1:-1] == lo[:-2]) & (hi[1:-1] == hi[2:]) )
+           m[:-1] = (length[:-1] < self.glitch_samples) & mix
+           g = np.flatnonzero(m)
+           idx = idx.copy()
+           idx[g + 1] = idx[g] # the transition starts with the glitch
+           idx,val = idx[~m],val[~m]
+           keep = np.ones(len(idx),dtype=bool) # merge equal neighbours left by a glitch
+           keep[1:] = val[1:] != val[:-1]
+           idx,val = idx[keep],val[keep]
+        return idx,val
+
+    def find_events(self,data):
+        """
+        :param data: trigger channel, 1d array or memmap
+        :return:
+          np.array EVENT_DTYPE: one event per run of a nonzero value, sequences are runs without zero in between
+        """
+        idx,val,n = self.find_changes(data)
+        idx,val   = self._remove_glitches(idx,val,n)
+        length    = np.diff(np.append(idx,n))
+        m = val != 0
+        ev = np.zeros(np.count_nonzero(m),dtype=EVENT_DTYPE)
+        ev["sample"],ev["code"],ev["n_samples"] = idx[m],val[m],length[m]
+        return ev
+
+   #--- journal
+    def expected(self,journal):
+        """
+        expected codes from the journal
+
+        :param journal: journal file or array JOURNAL_DTYPE
+        :return:
+          np.array EXPECTED_DTYPE sorted by t_ns, number of dropped frames, number of late frames
+        """
+        jnl = load_journal(journal) if isinstance(journal,str) else np.asarray(journal)
+        cmd = jnl["cmd"]
+        t   = jnl["t_ns"].astype(np.int64)
+        dur = jnl["duration"].astype(np.float64)
+       #--- sequences: records of one block share t_ns, onset = t_ns + index x (duration + tick / 2)
+        slack = np.zeros(len(jnl))
+        seq = np.isin(cmd,(self.cmd_seq,SEQ_STREAM_START))
+        if np.any(seq):
+           i  = np.flatnonzero(seq)
+           start = np.ones(len(i),dtype=bool)
+           start[1:] = (np.diff(i) != 1) | (t[i][1:] != t[i][:-1])
+           block = np.cumsum(start) - 1
+           first = i[start]
+           k = i - first[block]
+           t = t.copy()
+           t[i] += (k * (dur[i] * 1.0e6 + self.tick_us * 500.0)).astype(np.int64)
+           slack[i] = k * self.tick_us * 0.5e-3
+        on  = np.isin(cmd,(self.cmd_switch_on,SWITCH_ON_AT,SCHEDULE_START)) | seq
+        exp = np.zeros(np.count_nonzero(on),dtype=EXPECTED_DTYPE)
+        exp["t_ns"],exp["cmd"],exp["code"],exp["duration"],exp["seq"] = t[on],cmd[on],jnl["code"][on],dur[on],jnl["seq"][on]
+        exp["slack_ms"] = slack[on]
+       #--- link events
+        drop = np.flatnonzero(cmd == FRAME_DROPPED)
+        late = np.flatnonzero(cmd == FRAME_LATE)
+        tol  = int(self.tolerance_ms * 1.0e6)
+        keep = np.ones(len(exp),dtype=bool)
+        for j in drop:
+            k = np.flatnonzero( (np.abs(exp["t_ns"] - t[j]) <= tol) & keep &
+                                ( (exp["code"] == jnl["code"][j]) | np.isin(exp["cmd"],(self.cmd_seq,SEQ_STREAM_START)) ) )
+            keep[k[:1]] = False
+        for j in late:
+            k = np.flatnonzero( (np.abs(exp["t_ns"] - t[j]) <= tol) & keep & (exp["code"] == jnl["code"][j]) )
+            exp["t_ns"][k[:1]] += int(dur[j]) * 1000
+        exp = exp[keep]
+       #--- gaps
+        down,up = t[cmd == LINK_DOWN],t[cmd == LINK_UP]
+        for t_down in down:
+            t_up = up[up >= t_down]
+            t_up = t_up[0] if len(t_up) else np.iinfo(np.int64).max
+            exp["in_gap"] |= (exp["t_ns"] >= t_down) & (exp["t_ns"] <= t_up)
+        exp = exp[np.argsort(exp["t_ns"],kind="stable")]
+       #--- duration: cut by the next code or a switch off
+        t_end = exp["t_ns"] + (exp["duration"] * 1.0e6).astype(np.int64)
+        t_next = np.append(exp["t_ns"][1:],np.iinfo(np.int64).max)
+        off = np.sort(t[cmd == self.cmd_switch_off])
+        if len(off):
+           k = np.searchsorted(off,exp["t_ns"],side="right")
+           t_off = np.append(off,np.iinfo(np.int64).max)[k]
+           t_next = np.minimum(t_next,t_off)
+        forever = exp["duration"] == 0
+        t_end = np.where(forever,t_next,np.minimum(t_end,t_next))
+        exp["duration"] = np.where(t_end == np.iinfo(np.int64).max,np.nan,(t_end - exp["t_ns"]) * 1.0e-6)
+        return exp,len(drop),len(late)
+
+   #--- alignment
+    def _count_matches(self,s_exp,c_exp,det,tol):
+        k = np.clip(np.searchsorted(det["sample"],s_exp),1,max(len(det) - 1,1))
+        d0 = np.abs(det["sample"][k - 1] - s_exp)
+        d1 = np.abs(det["sample"][k] - s_exp)
+        j  = np.where(d0 <= d1,k - 1,k)
+        return np.count_nonzero( (np.minimum(d0,d1) <= tol) & (det["code"][j] == c_exp) )
+
+    def align(self,exp,det,n_first=20):
+        """
+        :return:
+          t0_ns, samples per ns: sample = (t_ns - t0_ns) * scale
+        """
+        scale = self.sfreq * 1.0e-9
+        if self.t0_ns is not None or not len(det) or not len(exp):
+           return (self.t0_ns or 0),scale
+        tol  = max(self.max_latency_ms * 1.0e-3 * self.sfreq,1.0)
+        best = (-1,0)
+        for e in exp[:n_first]:
+            for s in det["sample"][:n_first][det["code"][:n_first] == e["code"]]:
+                t0 = e["t_ns"] - s / scale
+                n  = self._count_matches((exp["t_ns"] - t0) * scale,exp["code"],det,tol)
+                if n > best[0]:
+                   best = (n,t0)
+        return int(best[1]),scale
+
+    def _fit(self,exp,det,i_exp,i_det,t0,scale):
+        """ linear fit of matched single code onsets: drift and offset, sequences lag by the tick rounding """
+        single = np.isin(exp["cmd"][i_exp],(self.cmd_switch_on,SWITCH_ON_AT,SCHEDULE_START))
+        i_exp,i_det = i_exp[single],i_det[single]
+        if not self.drift or len(i_exp) < 10:
+           return t0,scale
+        x = (exp["t_ns"][i_exp] - t0).astype(np.float64)
+        p = np.polyfit(x,det["sample"][i_det].astype(np.float64),1)
+        return t0 - p[1] / p[0],p[0]
+
+   #--- matching
+    def match(self,exp,det,t0,scale):
+        """
+        one to one: an expected code takes the first free event with the same code
+        in [onset - tolerance - slack, onset + max latency + slack]
+
+        :return:
+          index of the matched event for each expected code, -1: missed
+        """
+        exp["sample"] = (exp["t_ns"] - t0) * scale
+        slack = exp["slack_ms"] * 1.0e-3 * self.sfreq
+        lo  = np.floor(exp["sample"] - self.tolerance_ms * 1.0e-3 * self.sfreq - slack).astype(np.int64)
+        hi  = exp["sample"] + self.max_latency_ms * 1.0e-3 * self.sfreq + slack
+        order = np.lexsort((det["sample"],det["code"]))
+        key   = (det["code"][order].astype(np.int64) << 40) | det["sample"][order]
+        k     = np.searchsorted(key,(exp["code"].astype(np.int64) << 40) | np.maximum(lo,0))
+        out   = np.full(len(exp),-1,dtype=np.int64)
+        free  = np.arange(len(exp))
+        used  = np.zeros(len(det),dtype=bool)
+        while len(free):
+              kk = k[free]
+              ok = kk < len(key)
+              j  = order[np.minimum(kk,len(key) - 1)]
+              ok &= (det["code"][j] == exp["code"][free]) & (det["sample"][j] <= hi[free])
+              free,kk,j = free[ok],kk[ok],j[ok]
+              first = ~used[j]
+              _,u = np.unique(j,return_index=True) # the earliest expected code takes the event
+              win = np.zeros(len(j),dtype=bool)
+              win[u] = True
+              win &= first
+              out[free[win]] = j[win]
+              used[j[win]] = True
+              free = free[~win]
+              k[free] += 1
+        return out
+
+    def verify(self,data,journal):
+        """
+        :param data   : trigger channel, 1d array / memmap or raw file name (<u2, one channel)
+        :param journal: journal file or array JOURNAL_DTYPE
+        :return:
+          dict: events, expected, matched pairs, latency_ms, duration_error_ms, missed, missed_in_gap,
+                spurious, dropped / late frame counts
+        """
+        if isinstance(data,str):
+           data = load_trigger_channel(data)
+        det = self.find_events(data)
+        exp,n_drop,n_late = self.expected(journal)
+        t0,scale = self.align(exp,det)
+        hit = self.match(exp,det,t0,scale)
+        if self.t0_ns is None:
+           t0,scale = self._fit(exp,det,np.flatnonzero(hit >= 0),hit[hit >= 0],t0,scale)
+           hit = self.match(exp,det,t0,scale)
+        m   = hit >= 0
+        i_det = hit[m]
+        latency  = (det["sample"][i_det] - exp["sample"][m]) / self.sfreq * 1.0e3
+        dur_err  = det["n_samples"][i_det] / self.sfreq * 1.0e3 - exp["duration"][m]
+        used = np.zeros(len(det),dtype=bool)
+        used[i_det] = True
+        self._result = {"events"           : det,
+                        "expected"         : exp,
+                        "t0_ns"            : t0,
+                        "samples_per_ns"   : scale,
+                        "match"            : hit,
+                        "latency_ms"       : latency,
+                        "duration_error_ms": dur_err,
+                        "duration_errors"  : exp[m][np.abs(dur_err) > self.duration_tol_ms],
+                        "missed"           : exp[~m & ~exp["in_gap"]],
+                        "missed_in_gap"    : exp[~m & exp["in_gap"]],
+                        "spurious"         : det[~used],
+                        "frames_dropped"   : n_drop,
+                        "frames_late"      : n_late}
+        return self._result
+
+    def histogram(self,key="latency_ms",bin_ms=0.5):
+        """
+        :param key   : latency_ms or duration_error_ms
+        :param bin_ms: bin width
+        :return:
+          counts, bin edges in ms
+        """
+        v = self._result[key]
+        v = v[~np.isnan(v)]
+        if not v.size:
+           return np.zeros(0,np.int64),np.zeros(1)
+        lo = np.floor(v.min() / bin_ms) * bin_ms
+        hi = max(np.ceil(v.max() / bin_ms) * bin_ms,lo + bin_ms)
+        return np.histogram(v,bins=np.arange(lo,hi + bin_ms / 2,bin_ms))
+
+    def stats(self):
+        r  = self._result
+        la = r["latency_ms"]
+        de = r["duration_error_ms"]
+        de = de[~np.isnan(de)]
+        return {"expected"     : len(r["expected"]),
+                "detected"     : len(r["events"]),
+                "matched"      : len(la),
+                "missed"       : len(r["missed"]),
+                "missed_in_gap": len(r["missed_in_gap"]),
+                "spurious"     : len(r["spurious"]),
+                "dropped"      : r["frames_dropped"],
+                "late"         : r["frames_late"],
+                "duration_errors": len(r["duration_errors"]),
+                "latency_mean_ms": float(np.mean(la)) if la.size else np.nan,
+                "latency_std_ms" : float(np.std(la))  if la.size else np.nan,
+                "latency_p99_ms" : float(np.percentile(np.abs(la),99)) if la.size else np.nan,
+                "duration_error_max_ms": float(np.max(np.abs(de))) if de.size else np.nan,
+                "drift_ppm"    : (r["samples_per_ns"] / (self.sfreq * 1.0e-9) - 1.0) * 1.0e6}
+
+    def summary(self):
+        s = self.stats()
+        return ("---> trigger verify: expected {expected}, detected {detected}, matched {matched}\n"
+                "  -> missed: {missed}, missed in link gaps: {missed_in_gap}, spurious: {spurious}\n"
+                "  -> frames dropped: {dropped}, replayed late: {late}, duration errors: {duration_errors}\n"
+                "  -> latency [ms] mean: {latency_mean_ms:.3f} std: {latency_std_ms:.3f} |p99|: {latency_p99_ms:.3f}\n"
+                "  -> duration error max [ms]: {duration_error_max_ms:.3f}  clock drift [ppm]: {drift_ppm:.1f}".format(**s))
+
+
+def get_args(argv=None):
+    opt = argparse.ArgumentParser(description="JuMEG verify a trigger channel against the event journal")
+    opt.add_argument("trigger",help="raw trigger channel file")
+    opt.add_argument("journal",help="event journal file")
+    opt.add_argument("--sfreq",type=float,required=True,help="sampling rate in Hz")
+    opt.add_argument("--dtype",default="<u2",help="sample type")
+    opt.add_argument("--channels",type=int,default=1,help="channels per sample in the raw file")
+    opt.add_argument("--channel",type=int,default=0,help="trigger channel index")
+    opt.add_argument("--offset",type=int,default=0,help="header bytes")
+    opt.add_argument("--mask",type=lambda v: int(v,0),default=0xFFFF,help="code bits of the channel")
+    opt.add_argument("--max-latency-ms",type=float,default=50.0)
+    opt.add_argument("--list",action="store_true",help="print missed and spurious codes")
+    opt.add_argument("-v","--verbose",action="store_true")
+    return opt.parse_args(argv)
+
+
+def main(argv=None):
+    args = get_args(argv)
+    data = load_trigger_channel(args.trigger,dtype=args.dtype,n_channels=args.channels,channel=args.channel,offset=args.offset)
+    ver  = JuMEG_Psycho_TriggerVerify(sfreq=args.sfreq,code_mask=args.mask,max_latency_ms=args.max_latency_ms,verbose=args.verbose)
+    res  = ver.verify(data,args.journal)
+    print(ver.summary())
+    counts,edges = ver.histogram("latency_ms")
+    print(" --> latency histogram [ms]:")
+    for c,e in zip(counts,edges):
+        print("  -> {:8.2f} {:8d}".format(e,c))
+    if args.list:
+       print(" --> missed: t_ns, cmd, code")
+       for e in res["missed"]:
+           print("  -> {} {} {}".format(e["t_ns"],e["cmd"],e["code"]))
+       print(" --> spurious: sample, code, samples")
+       for e in res["spurious"]:
+           print("  -> {} {} {}".format(e["sample"],e["code"],e["n_samples"]))
+    return 0 if not (len(res["missed"]) or len(res["spurious"])) else 1
+
+
+if __name__ == "__main__":
+   sys.exit( main() )
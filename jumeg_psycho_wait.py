@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+hybrid sleep/spin precision wait for inter-stimulus intervals
+
+coarse time.sleep() in slices of the key poll interval till the deadline is
+<spin_sec> away, then busy-wait on the clock for the rest
+CPU is idle for most of the interval, timing accuracy is the spin phase
+
+every wait is recorded: overshoot after the deadline, spin time and CPU time
+
+Example:
+--------
+ from jumeg_psycho_wait import JuMEG_Psycho_PrecisionWait
+ pw = JuMEG_Psycho_PrecisionWait(poll_hz=100)
+ pw.wait(1.5,poll=lambda: bool(event.getKeys(["escape"])))
+ print(pw.last.overshoot * 1.0e6,"us")
+ print(pw.summary())
+
+update 10.2026 fb
+"""
+
+import time
+from collections import deque,namedtuple
+
+__version__='2026-10-18-001'
+
+#--- times in s: target deadline on the clock, overshoot after the deadline, spin phase, CPU time of the thread
+WaitRecord = namedtuple("WaitRecord",["t_target","overshoot","t_spin","t_cpu","aborted"])
+
+
+def percentile(v,q):
+    """ percentile <q> of the values <v>, nearest rank, nan if empty; shared by the jumeg_psycho statistics """
+    if not len(v):
+       return float("nan")
+    v = sorted(v)
+    return v[ min(len(v) - 1,int(round(q / 100.0 * (len(v) - 1)))) ]
+
+
+class JuMEG_Psycho_PrecisionWait(object):
+    """
+    sleep coarsely, spin the last few hundred us
+
+    :param clock   : function returning the time in s <time.perf_counter> e.g. psychopy core.Clock().getTime
+    :param spin_sec: minimum spin phase before the deadline in s
+    :param poll_hz : rate of the poll function e.g. key check, 0: poll only once per wait
+    :param history : number of wait records kept
+    """
+    def __init__(self,clock=None,spin_sec=0.0005,poll_hz=100.0,history=4096):
+        super().__init__()
+        self.clock     = clock if clock else time.perf_counter
+        self.spin_sec  = spin_sec
+        self.poll_hz   = poll_hz
+        self._records  = deque(maxlen=history)
+        self._sleep_late = 0.0 # EWMA of time.sleep() lateness, widens the spin phase
+   #---
+    @property
+    def records(self): return self._records
+   #---
+    @property
+    def last(self): return self._records[-1] if self._records else None
+   #---
+    @property
+    def spin_margin(self):
+        """ spin phase used for the next wait in s """
+        return max(self.spin_sec,2.0 * self._sleep_late)
+
+    def wait(self,twait,tstart=None,poll=None):
+        """
+        wait till tstart + twait on the clock
+
+        :param twait : time to wait in s
+        :param tstart: start time on the clock <now>
+        :param poll  : function, called at <poll_hz>, returns True to abort the wait
+        :return:
+          True if the deadline was reached, False if aborted by poll
+        """
+        clock    = self.clock
+        cpu0     = time.thread_time()
+        if tstart is None:
+           tstart = clock()
+        deadline = tstart + twait
+        dt_poll  = 1.0 / self.poll_hz if ( poll and self.poll_hz ) else float("inf")
+        margin   = self.spin_margin
+        t_poll   = clock()
+
+        if poll and poll():
+           return self._record(deadline,clock(),0.0,cpu0,True)
+        t_poll += dt_poll
+       #--- coarse sleep, wake up for polling
+        while True:
+              now = clock()
+              if poll and now >= t_poll:
+                 if poll():
+                    return self._record(deadline,clock(),0.0,cpu0,True)
+                 t_poll = now + dt_poll
+              dt = min(deadline - margin,t_poll) - now
+              if deadline - now <= margin:
+                 break
+              if dt > 0:
+                 time.sleep(dt)
+                 late = clock() - now - dt
+                 self._sleep_late += 0.1 * (max(late,0.0) - self._sleep_late)
+       #--- spin
+        t_spin = clock()
+        while True:
+              now = clock()
+              if now >= deadline:
+                 break
+        return self._record(deadline,now,now - t_spin,cpu0,False)
+
+    def _record(self,deadline,now,t_spin,cpu0,aborted):
+        self._records.append( WaitRecord(deadline,now - deadline,t_spin,time.thread_time() - cpu0,aborted) )
+        return not aborted
+
+    def clear(self):
+        self._records.clear()
+
+    def stats(self):
+        """
+        :return:
+          dict: number of waits, overshoot mean/p50/p99/max in us, spin and CPU time mean in ms
+        """
+        recs = [r for r in self._records if not r.aborted]
+        os_us = [r.overshoot * 1.0e6 for r in recs]
+        n = max(len(recs),1)
+        return { "waits"        : len(recs),
+                 "aborted"      : len(self._records) - len(recs),
+                 "overshoot_mean_us": sum(os_us) / n if recs else float("nan"),
+                 "overshoot_p50_us" : percentile(os_us,50),
+                 "overshoot_p99_us" : percentile(os_us,99),
+                 "overshoot_max_us" : max(os_us) if recs else float("nan"),
+                 "spin_mean_ms" : sum(r.t_spin for r in recs) / n * 1.0e3,
+                 "cpu_mean_ms"  : sum(r.t_cpu for r in recs) / n * 1.0e3 }
+
+    def summary(self):
+        s = self.stats()
+        return ("---> precision wait: {waits} waits, {aborted} aborted\n"
+                "  -> overshoot [us] mean: {overshoot_mean_us:.1f} p50: {overshoot_p50_us:.1f} "
+                "p99: {overshoot_p99_us:.1f} max: {overshoot_max_us:.1f}\n"
+                "  -> spin [ms] mean: {spin_mean_ms:.3f}  CPU [ms] mean: {cpu_mean_ms:.3f}".format(**s))
+
+
+if __name__ == "__main__":
+   pw = JuMEG_Psycho_PrecisionWait()
+   for i in range(20):
+       pw.wait(0.05)
+   print(pw.summary())
@@ -1,20 +1,67 @@
 #!/usr/bin/env python3
 
 
+import gc,math,time
 from contextlib import contextmanager
-from psychopy import visual, core, event
+from collections import deque,namedtuple
 
 #--- MEG FB send eventcode ia arduino
 from jumeg_psycho_eventcode  import JuMEG_Psycho_EventCode 
+from jumeg_psycho_group      import JuMEG_Psycho_EventCodeGroup
+from jumeg_psycho_wait       import JuMEG_Psycho_PrecisionWait
+
+#--- psychopy and numpy (timing table) are imported with the first JuMEG_Psycho_IOD / JuMEGStim
+visual = core = event = None
+
+def import_psychopy(keep_dryrun=True):
+    """
+    import psychopy visual, core, event into the module namespace
+    stand-ins of a dry-run are replaced if the dry-run is finished or not <keep_dryrun> e.g. a JuMEGStim without dry-run
+    """
+    global visual,core,event
+    dry = getattr(core,"dry_run",None)
+    if core is None or ( dry is not None and not ( keep_dryrun and dry.isActive ) ):
+       from psychopy import visual as _visual, core as _core, event as _event
+       visual,core,event = _visual,_core,_event
+
+def import_dryrun(dryrun):
+    """
+    psychopy stand-ins of <dryrun> JuMEG_Psycho_DryRun into the module namespace
+
+    :return:
+      previous visual, core, event for restore_psychopy()
+    """
+    global visual,core,event
+    saved = (visual,core,event)
+    dryrun.isActive += 1
+    visual,core,event = dryrun.visual,dryrun.core,dryrun.event
+    return saved
+
+def restore_psychopy(saved,dryrun):
+    """ undo import_dryrun(<dryrun>), the module namespace is only reset if it still holds the stand-ins of <dryrun> """
+    global visual,core,event
+    dryrun.isActive = max(dryrun.isActive - 1,0)
+    if core is dryrun.core:
+       visual,core,event = saved
 
 __version__="2020-02-11-001"
 
+#--- psychopy core.getTime() [s]: flip time, eventcode write start / done
+DispatchRecord = namedtuple("DispatchRecord",["eventcode","t_flip","t_send","t_send_done","flip_locked"])
+
+#--- run_schedule: one row per trial, times in s core.getTime(), nan: not shown (aborted)
+SCHEDULE_TRIAL_DTYPE = [("stim","<i4"),("code","<u2"),("onset_frame","<i8"),("duration_frames","<i8"),
+                        ("t_flip","<f8"),("t_send","<f8"),("t_send_done","<f8"),("dropped","<i4")]
+
 class JuMEG_Psycho_IOD(object):
     """ Image Onset Detection (IOD)
         white rectangle at the screen bottom left or right
     """
+    profiler = None # profiling hook, see jumeg_psycho_profile.install()
+
     def __init__(self,**kwargs):
         super().__init__()
+        import_psychopy()
         self._win     = None
         self._img     = None
         self._img_back= None
@@ -86,6 +133,8 @@ class JuMEG_Psycho_IOD(object):
         :param autoDraw:
         :return:
         """
+        prof = self.profiler
+        if prof: t_p = prof.mark()
         if not self._isInit:
            self.init(**kwargs)
         
@@ -94,6 +143,7 @@ class JuMEG_Psycho_IOD(object):
         self._img.setAutoDraw(autoDraw)
         self._img.draw()
         self._isOn = True
+        if prof: prof.record("iod.draw",t_p)
         
     def hide(self,autoDraw=True,**kwargs):
         """
@@ -105,6 +155,8 @@ class JuMEG_Psycho_IOD(object):
         :param autoDraw:
         :return:
         """
+        prof = self.profiler
+        if prof: t_p = prof.mark()
         if not self._isInit:
            self.init(**kwargs)
         self._img.setAutoDraw(False)
@@ -112,6 +164,12 @@ class JuMEG_Psycho_IOD(object):
         self._img_back.setAutoDraw(autoDraw)
         self._img_back.draw()
         self._isOn = False
+        if prof: prof.record("iod.hide",t_p)
+
+    def draw_frame(self,on):
+        """ draw IOD on / off for the next flip only, no autoDraw changes e.g. in a frame loop """
+        (self._img if on else self._img_back).draw()
+        self._isOn = on
        
         
     def _calc_auto_position(self):
@@ -226,17 +284,54 @@ class JuMEGStim(object):
     
          jSTIM.close()
          core.quit()  
+
+     dry_run: JuMEG_Psycho_DryRun or True, virtual clock, stub window and null device,
+              present(), WaitForSec(), WaitForIODOnScreen() advance the simulated time
+        dry   = JuMEG_Psycho_DryRun(refresh_hz=120,render_ms=4.0)
+        jSTIM = JuMEGStim(dry_run=dry)
+        ...
+        print(dry.summary())
          
     """
+    dry_run_default = None # set by JuMEG_Psycho_DryRun.run()
+    profiler        = None # profiling hook of present(), see jumeg_psycho_profile.install()
+
     def __init__(self,**kwargs):
         super().__init__()
+        self._dry_run = kwargs.get("dry_run",self.dry_run_default)
+        if self._dry_run is True:
+           from jumeg_psycho_dryrun import JuMEG_Psycho_DryRun
+           self._dry_run = JuMEG_Psycho_DryRun()
+        self._psychopy_saved = None
+        if self._dry_run:
+           self._psychopy_saved = import_dryrun(self._dry_run)
+        else:
+           import_psychopy(keep_dryrun=False)
+        from jumeg_psycho_timing import JuMEG_Psycho_TimingTable
         self._IOD     = JuMEG_Psycho_IOD(ToggleOffKey="8")
-        self._EVC     = JuMEG_Psycho_EventCode()
+        self._EVC     = kwargs.get("EventCode")
+        if isinstance(self._EVC,(list,tuple)): # e.g. MEG and EEG box
+           self._EVC  = JuMEG_Psycho_EventCodeGroup(devices=self._EVC)
+        if self._EVC is None:
+           self._EVC  = self._dry_run.device if self._dry_run else JuMEG_Psycho_EventCode()
         self.ExitKeys = ["q","esc","escape"]
         self.clock    = core.Clock()
         self.timeout_sec = 0.50
         self._status     = False
         self.duration_ms = 200
+        self.key_poll_hz = 100.0  # exit key polling in WaitForSec
+        self.spin_sec    = 0.0005 # busy-wait before the deadline in WaitForSec
+        if self._dry_run:
+           self._waiter  = self._dry_run.waiter(clock=self.clock.getTime)
+        else:
+           self._waiter  = JuMEG_Psycho_PrecisionWait(clock=self.clock.getTime)
+        self.flip_locked = False  # True: send eventcode in win.callOnFlip, False: before win.flip()
+        self.send_at     = False  # send eventcode ahead, fired by the Arduino at the predicted flip (needs syncClock)
+        self.send_at_offset = 0.0 # s added to the predicted flip time e.g. display input lag
+        self._dispatch_records = deque(maxlen=100000)
+        self._t_send     = None
+        self.timing_summary_every = 0 # print timing summary every N presents, 0: off
+        self._timing     = JuMEG_Psycho_TimingTable()
         self._win        = None
         self._size       = [1920,1200]
         self._parameter  = {"monitor":"MEG","units":"pix","fullscr":True,"screen":1,
@@ -255,13 +350,32 @@ class JuMEGStim(object):
     @property
     def EventCode(self): return self._EVC
     @property
+    def dry_run(self):
+        """ JuMEG_Psycho_DryRun or None """
+        return self._dry_run
+    @property
     def IOD(self): return self._IOD
+    @property
+    def waiter(self):
+        """ precision wait of WaitForSec, overshoot per wait in <waiter.records> """
+        return self._waiter
+    @property
+    def timing(self):
+        """ JuMEG_Psycho_TimingTable: one row per present() """
+        return self._timing
+    @property
+    def dispatch_records(self):
+        """ DispatchRecord for each eventcode sent in present() """
+        return self._dispatch_records
     
     def close(self):
         try:
           self._win.close()
         except:
           print("---> ERROR in JuMEGStim Class => can not close WIN")
+        if self._psychopy_saved is not None: # dry-run: psychopy back for later instances
+           restore_psychopy(self._psychopy_saved,self._dry_run)
+           self._psychopy_saved = None
           
     def _update_from_kwargs(self,**kwargs):
         """
@@ -279,6 +393,12 @@ class JuMEGStim(object):
         """
         self.duration_ms= kwargs.get("duration_ms",self.duration_ms)
         self.timeout_sec= kwargs.get("timeout_sec",self.timeout_sec)
+        self.key_poll_hz= kwargs.get("key_poll_hz",self.key_poll_hz)
+        self.spin_sec   = kwargs.get("spin_sec",self.spin_sec)
+        self.flip_locked= kwargs.get("flip_locked",self.flip_locked)
+        self.send_at    = kwargs.get("send_at",self.send_at)
+        self.send_at_offset = kwargs.get("send_at_offset",self.send_at_offset)
+        self.timing_summary_every = kwargs.get("timing_summary_every",self.timing_summary_every)
         self._size      = kwargs.get("size",self._size)
         for k in self._parameter.keys():
             self._parameter[k] = kwargs.get(k,self._parameter[k])
@@ -315,7 +435,7 @@ class JuMEGStim(object):
         
         event.clearEvents()
         
-        if self.EventCode.open():
+        if self.EventCode.isConnected or self.EventCode.open():
            self.EventCode.sendEventCode(eventcode=255,duration_ms=5000)
         if "win" in kwargs:
            self._win = kwargs.get("win")
@@ -323,6 +443,7 @@ class JuMEGStim(object):
            self._init_win(**kwargs)
                 
         kwargs["win"] = self.win
+        self._timing.frame_period = kwargs.get("frame_period",getattr(self.win,"monitorFramePeriod",None) or self._timing.frame_period)
         self.IOD.init( **kwargs )
         
         self.IOD.hide()
@@ -333,6 +454,11 @@ class JuMEGStim(object):
     
     
     def WaitForIODOnScreen(self):
+        """
+        wait for the IOD toggle key e.g. from the photodiode box
+        :return:
+          True if the toggle key was pressed, False on timeout or exit key
+        """
         t0 = self.clock.getTime()
       #--- wait for till image is on screen ...
         keys=[self.IOD.ToggleOffKey]
@@ -346,12 +472,199 @@ class JuMEGStim(object):
            if self.IOD.ToggleOffKey not in pressedKeys:
               print("---> <WaitForIODOnScreen> key pressed: {}".format(pressedKeys))
               self._status = False
-        else:
-           print("---> TimeOut")
+              return False
+           return True
+        print("---> TimeOut")
+        return False
         
+    def _send_on_flip(self,frame):
+        """ win.callOnFlip callback: one write of the pre-encoded frame """
+        t0 = core.getTime()
+        self.EventCode.sendFrame(frame)
+        self._t_send = (t0,core.getTime())
+
+    def predict_flip(self,t_now=None):
+        """
+        next vsync on the psychopy clock from the last flip and the frame period
+        at least 1 ms ahead, the frame has to reach the Arduino before the target
+
+        :return:
+          predicted flip time in s core.getTime()
+        """
+        if t_now is None:
+           t_now = core.getTime()
+        period = self._timing.frame_period
+        t_last = self._timing._t_last_flip
+        if t_last != t_last: # nan, no flip yet
+           return t_now + period
+        t_pred = t_last + max(math.ceil( (t_now - t_last) / period ),1) * period
+        if t_pred - t_now < 0.001:
+           t_pred += period
+        return t_pred
+
+    def _send_at_flip(self,eventcode,duration_ms=None):
+        """
+        send eventcode ahead with the predicted flip time as target
+        :return:
+          True if sent, False: clock not synced
+        """
+        t_now  = core.getTime()
+        t_pred = self.predict_flip(t_now) + self.send_at_offset
+        t_ns   = time.monotonic_ns() + int( (t_pred - t_now) * 1.0e9 )
+        if self.EventCode.send_at(eventcode=eventcode,t_ns=t_ns,duration_ms=duration_ms or self.duration_ms) is None:
+           return False
+        self._t_send = (t_pred,core.getTime())
+        return True
+
+    def dispatch_offset(self):
+        """
+        :return:
+          list of eventcode send time - flip time in ms
+        """
+        return [ (r.t_send - r.t_flip) * 1000.0 for r in self._dispatch_records ]
+
+    def _poll_exit(self):
+        return self.ExitOnKeyPress() or not self.status
+
+    def run_schedule(self,stimuli,onset_frames,duration_frames,codes=None,stim_index=None,duration_ms=None,iod_frames=2,
+                     key_check_frames=None,disable_gc=True):
+        """
+        frame-locked trial loop driven by arrays: one flip per frame, no key wait per stimulus
+        stimulus, IOD and eventcode of every frame are computed before the loop,
+        the loop draws, registers the pre-encoded eventcode frame in win.callOnFlip and flips
+
+        :param stimuli         : preloaded stimulus objects with draw() e.g. visual.ImageStim
+        :param onset_frames    : array, onset of each trial in frames after the first flip of the loop
+        :param duration_frames : array or scalar, frames each trial is shown, a later trial overwrites overlapping frames
+        :param codes           : array or scalar, eventcode of each trial, 0: no eventcode <None>
+        :param stim_index      : array, index in <stimuli> of each trial <trial number>
+        :param duration_ms     : eventcode pulse duration <duration_ms>, shorter than the trial onset interval
+        :param iod_frames      : IOD on for the first <iod_frames> frames of a trial (at most duration - 1
+                                 if trials follow back to back), 0: no IOD
+        :param key_check_frames: exit keys polled every N frames <refresh rate / 10>
+        :param disable_gc      : no garbage collection during the loop
+        :return:
+          dict: trials np.array SCHEDULE_TRIAL_DTYPE, flips: flip time of each frame,
+                dropped: frames with an interval > drop_factor x frame period, aborted: exit key pressed
+
+        Example:
+        --------
+         imgs   = [visual.ImageStim(jSTIM.win,image=f) for f in files]
+         onsets = np.arange(len(imgs)) * 12             # 10 Hz at 120 Hz refresh
+         res    = jSTIM.run_schedule(imgs,onsets,6,codes=np.arange(len(imgs)) % 250 + 1,duration_ms=50)
+         res["trials"]["t_flip"]
+        """
+        import numpy as np
+        onset = np.asarray(onset_frames,dtype=np.int64).ravel()
+        n     = len(onset)
+        dur   = np.broadcast_to( np.asarray(duration_frames,dtype=np.int64),(n,) )
+        codes = np.broadcast_to( np.asarray(0 if codes is None else codes,dtype=np.int64),(n,) )
+        stim  = np.arange(n) if stim_index is None else np.asarray(stim_index,dtype=np.int64).ravel()
+        trials = np.zeros(n,dtype=SCHEDULE_TRIAL_DTYPE)
+        trials["stim"],trials["code"],trials["onset_frame"],trials["duration_frames"] = stim,codes,onset,dur
+        trials["t_flip"] = trials["t_send"] = trials["t_send_done"] = np.nan
+        if not n:
+           return {"trials":trials,"flips":np.zeros(0),"dropped":np.zeros(0,np.int64),"aborted":False}
+        if np.any(onset < 0) or np.any(dur < 1) or len(stim) != n or np.any((stim < 0) | (stim >= len(stimuli))):
+           raise ValueError("ERROR run_schedule: onset frames >= 0, duration >= 1 frame, stim_index in stimuli")
+       #--- per frame tables, later trials overwrite earlier ones
+        order    = np.argsort(onset,kind="stable")
+        n_frames = int(np.max(onset + dur))
+        tr       = np.repeat(order,dur[order])
+        fr       = onset[tr] + ( np.arange(len(tr)) - np.repeat(np.cumsum(dur[order]) - dur[order],dur[order]) )
+        frame_trial = np.full(n_frames,-1,dtype=np.int64)
+        frame_trial[fr] = tr
+        frame_stim  = np.where(frame_trial >= 0,stim[np.maximum(frame_trial,0)],-1)
+        first = np.full(n_frames,-1,dtype=np.int64) # trial with its onset in this frame
+        first[onset[order]] = order
+        if iod_frames:
+           iod_len = np.minimum(iod_frames,np.maximum(dur - 1,1))
+           k   = np.arange(n_frames)
+           last_onset = np.maximum.accumulate(np.where(first >= 0,k,-1))
+           t_on = np.where(last_onset >= 0,first[np.maximum(last_onset,0)],0)
+           frame_iod = (last_onset >= 0) & (k - last_onset < iod_len[t_on])
+        else:
+           frame_iod = np.zeros(n_frames,dtype=bool)
+        if duration_ms is None:
+           duration_ms = self.duration_ms
+        enc = { int(c): self.EventCode.encode(eventcode=int(c),duration_ms=duration_ms) for c in np.unique(codes) if c }
+       #--- loop: python lists, no numpy scalars
+        frame_stim  = frame_stim.tolist()
+        frame_iod   = frame_iod.tolist()
+        first       = first.tolist()
+        codes_l     = codes.tolist()
+        flips       = np.full(n_frames + 1,np.nan)
+        t_send      = [None] * n
+        if key_check_frames is None:
+           key_check_frames = max(int(round(0.1 / self._timing.frame_period)),1)
+        win,iod,draw = self.win,self.IOD,[s.draw for s in stimuli]
+        iod.autoDraw = False
+        if iod.isInit:
+           iod._img_back.setAutoDraw(False)
+        aborted = False
+        prof    = self.profiler
+        gc_was_enabled = gc.isenabled()
+        if disable_gc:
+           gc.collect()
+           gc.disable()
+        t_p = prof.mark() if prof else 0
+        try:
+            for f in range(n_frames):
+                s = frame_stim[f]
+                if s >= 0:
+                   draw[s]()
+                if iod_frames and iod.isInit:
+                   iod.draw_frame(frame_iod[f])
+                i = first[f]
+                self._t_send = None
+                if i >= 0 and codes_l[i]:
+                   if self.send_at and self._send_at_flip(codes_l[i],duration_ms):
+                      pass
+                   else:
+                      win.callOnFlip(self._send_on_flip,enc[codes_l[i]])
+                if prof: t_p = prof.record("schedule.draw",t_p)
+                t = win.flip() or core.getTime()
+                if prof: t_p = prof.record("schedule.flip",t_p)
+                flips[f] = t
+                self._timing.flip(t)
+                if i >= 0:
+                   t_send[i] = self._t_send
+                if not f % key_check_frames and self._poll_exit():
+                   aborted = True
+                   break
+           #--- blank frame after the last trial
+            if iod_frames and iod.isInit:
+               iod.draw_frame(False)
+            flips[n_frames] = win.flip() or core.getTime()
+            self._timing.flip(flips[n_frames])
+        finally:
+            if disable_gc and gc_was_enabled:
+               gc.enable()
+       #--- results
+        shown = onset < n_frames if not aborted else onset <= f
+        trials["t_flip"][shown] = flips[onset[shown]]
+        for i in np.flatnonzero(shown):
+            if t_send[i]:
+               trials["t_send"][i],trials["t_send_done"][i] = t_send[i]
+               self._dispatch_records.append( DispatchRecord(codes_l[i],flips[onset[i]],t_send[i][0],t_send[i][1],True) )
+        period  = self._timing.frame_period
+        dt      = np.diff(flips)
+        dropped = np.flatnonzero(dt > self._timing.drop_factor * period) + 1
+        cs = np.zeros(n_frames + 2,dtype=np.int64) # cs[f + 1]: late flips in frames 0..f
+        cs[dropped + 1] = 1
+        cs = np.cumsum(cs)
+        trials["dropped"] = cs[np.minimum(onset + dur,n_frames)] - cs[onset]
+        if iod.isInit:
+           iod.hide()
+        if aborted:
+           self._status = False
+        return {"trials":trials,"flips":flips,"dropped":dropped,"aborted":aborted}
+
     def WaitForSec(self,twait,tstart=None):
         """
-        
+        hybrid sleep/spin wait: sleeps till <spin_sec> before the deadline, spins the rest
+        exit keys are polled with <key_poll_hz>
+        overshoot, spin and CPU time of each wait in <self.waiter.records>, print(self.waiter.summary())
 
         Parameters
         ----------
@@ -363,18 +676,14 @@ class JuMEGStim(object):
         Returns
         -------
         bool
-            DESCRIPTION.
+            DESCRIPTION. False if exit key pressed or status is False
 
         """
         if not tstart:
            tstart = self.clock.getTime()
-        while True:
-              if (self.clock.getTime() - tstart > twait):
-                 return True
-              if self.ExitOnKeyPress():     
-                 return False
-              if not self.status:
-                 return False
+        self._waiter.spin_sec = self.spin_sec
+        self._waiter.poll_hz  = self.key_poll_hz
+        return self._waiter.wait(twait,tstart=tstart,poll=self._poll_exit)
             
     @contextmanager
     def present(self,eventcode=None,duration_ms=200,wait=None):
@@ -391,6 +700,14 @@ class JuMEGStim(object):
         finalflip : TYPE, optional
             DESCRIPTION. The default is True.
 
+        flip_locked=True (opt-in): the eventcode frame is encoded before the flip and written
+        in win.callOnFlip right after the buffer swap, send and flip times in <dispatch_records>
+        flip_locked=False: the eventcode is sent right before win.flip()
+        send_at=True: the eventcode is sent before the flip with the predicted flip time,
+        the Arduino switches it on at that time (EventCode.syncClock() first),
+        t_send in <dispatch_records> is the target time, not synced: falls back to win.callOnFlip as flip_locked=True
+        DispatchRecord.flip_locked: the mode used, True for send_at and win.callOnFlip
+
         Yields
         ------
         TYPE
@@ -428,29 +745,62 @@ class JuMEGStim(object):
        
         """
                 
+        prof = self.profiler
+        if prof: t_p = t_start = prof.mark()
         event.clearEvents()
         
         yield # do your stuff here
         
+        if prof: t_p = prof.record("present.stimulus",t_p)
         self.IOD.draw(autoDraw=True)
+        self._t_send = None
+        locked = True
         if eventcode:
            # print(" --> sending eventcode:  {}".format(eventcode) )
-           self.EventCode.sendEventCode(eventcode=eventcode,duration_ms=self.duration_ms)
+           if self.send_at and self._send_at_flip(eventcode):
+              pass # fired by the Arduino at the predicted flip
+           elif self.flip_locked or self.send_at:
+             #--- frame is encoded now, the flip callback only writes it
+              self.win.callOnFlip(self._send_on_flip,self.EventCode.encode(eventcode=eventcode,duration_ms=self.duration_ms))
+           else:
+              locked = False
+              t = core.getTime()
+              self.EventCode.sendEventCode(eventcode=eventcode,duration_ms=self.duration_ms)
+              self._t_send = (t,core.getTime())
            
-        self.win.flip() # show images & IOD pattern
+        if prof: t_p = prof.record("present.dispatch",t_p)
+        t_call = core.getTime()
+        t_flip = self.win.flip() or core.getTime() # show images & IOD pattern
+        if prof: t_p = prof.record("present.flip",t_p)
         t0 = self.clock.getTime()
-        self.WaitForIODOnScreen()
+        t_send = self._t_send or (None,None)
+        if self._t_send:
+           self._dispatch_records.append( DispatchRecord(eventcode,t_flip,self._t_send[0],self._t_send[1],locked) )
+        row = self._timing.add(eventcode,t_call,t_flip,t_send=t_send[0],t_send_done=t_send[1])
+
+        t_key = core.getTime()
+        iod   = self.WaitForIODOnScreen()
+        key_wait = core.getTime() - t_key
+        if prof: t_p = prof.record("present.iod_wait",t_p)
         
         self.IOD.hide() # draw IOD pattern in black
         
-        self.win.flip() # remove IOD pattern
+        t_off = self.win.flip() or core.getTime() # remove IOD pattern
+        if prof: t_p = prof.record("present.iod_off",t_p)
+        self._timing.update(row,t_iod_off=t_off,key_wait=key_wait,iod_timeout=not iod and self.status)
+        if self.timing_summary_every and not self._timing.counts % self.timing_summary_every:
+           print( self._timing.summary(last=self.timing_summary_every) )
       
         if wait:
            self.WaitForSec(wait,tstart=t0)
+        if prof:
+           prof.record("present.wait",t_p)
+           prof.record("present",t_start)
           
             
 def test():   
     """ run test """         
+    import_psychopy()
     clock = core.Clock()
 
     jSTIM = JuMEGStim()